@@ -0,0 +1,5 @@
+import os
+from dotenv import load_dotenv
+
+# Settings are read from the environment; backend/.env fills in anything unset
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
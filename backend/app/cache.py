@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from .serializers import dumps
+
+# Read-through cache for encoded (JSON bytes) memo / consumable payloads.
+#
+# Keys:
+#   memo:<id>:gen                    generation counter for one memo
+#   memo:<id>:<gen>                  payload of GET /memos/<id>
+#   memos:gen                        generation counter for memo lists
+#   memos:list:<gen>:<query>         payload of GET /memos/?<query>
+#   consumables:gen / consumables:list:<gen>:<query>
+#
+# Writers invalidate by bumping a generation: one memo's, and the lists'.
+# A reader builds its key (reading the generation) before loading, so a load
+# that raced a write stores its stale payload under the old generation,
+# where it is never read again; stale entries age out through the TTL / LRU.
+
+DEFAULT_TTL = 300
+
+class LRUBackend:
+    """In-process LRU with per-entry TTL. Local to one worker."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            value = int(value) + 1
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RedisBackend:
+    """Shared cache across workers, backed by a redis client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def clear(self):
+        self.client.flushdb()
+
+class FakeRedis:
+    """Minimal in-memory stand-in for redis.Redis, for tests."""
+
+    def __init__(self):
+        self._data = {}
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, name):
+        item = self._alive(name)
+        return item[0] if item else None
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def incr(self, name, amount=1):
+        item = self._alive(name)
+        value = int(item[0]) + amount if item else amount
+        self._data[name] = (str(value).encode(), item[1] if item else None)
+        return value
+
+    def flushdb(self):
+        self._data.clear()
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+class PayloadCache:
+    def __init__(self, backend, ttl: int = DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, backend, ttl: int = None):
+        self.backend = backend
+        if ttl is not None:
+            self.ttl = ttl
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def get_or_set(self, key, loader):
+        """
+        Returns the cached payload for key as encoded JSON bytes, or calls
+        loader() and caches its encoded result. A None result (e.g. not
+        found) is returned but not cached.
+        """
+        raw = self._lookup(key)
+        if raw is not None:
+            return raw
+        return self._store(key, loader())
+
+    async def aget_or_set(self, key, loader):
+        """get_or_set for an async loader (a coroutine function)."""
+        raw = self._lookup(key)
+        if raw is not None:
+            return raw
+        return self._store(key, await loader())
+
+    def _lookup(self, key):
+        raw = self.backend.get(key)
+        if raw is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return raw
+
+    def _store(self, key, payload):
+        if payload is None:
+            return None
+        raw = dumps(payload)
+        self.backend.set(key, raw, self.ttl)
+        return raw
+
+    def _generation(self, namespace):
+        gen = self.backend.get(f"{namespace}:gen") or 0
+        return gen.decode() if isinstance(gen, bytes) else gen
+
+    # Keys
+    def memo_key(self, memo_id: int):
+        return f"memo:{memo_id}:{self._generation(f'memo:{memo_id}')}"
+
+    def memo_list_key(self, **params):
+        return self._list_key("memos", params)
+
+    def consumable_list_key(self, **params):
+        return self._list_key("consumables", params)
+
+    def _list_key(self, namespace, params):
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{namespace}:list:{self._generation(namespace)}:{query}"
+
+    # Invalidation, called by crud writers after commit
+    def invalidate_memo(self, memo_id: int):
+        if memo_id is not None:
+            self.backend.delete(self.memo_key(memo_id))
+            self.backend.incr(f"memo:{memo_id}:gen")
+        self.backend.incr("memos:gen")
+
+    def invalidate_consumables(self):
+        self.backend.incr("consumables:gen")
+
+def _backend_from_env():
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "redis":
+        return RedisBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if kind == "none":
+        return NullBackend()
+    return LRUBackend(int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+
+cache = PayloadCache(_backend_from_env(), int(os.getenv("CACHE_TTL", str(DEFAULT_TTL))))
@@ -0,0 +1,249 @@
+import os
+from datetime import timedelta
+from sqlalchemy import and_, case, func, insert, select
+from sqlalchemy.orm import Session, selectinload
+from . import models
+
+# Replacement-interval statistics over ConsumableLog.
+#
+# consumable_stats keeps running sums per consumable: the number of
+# intervals, their total, and their total weighted by ordinal (1 for the
+# first interval, 2 for the second, ...). That is enough for the mean and a
+# least-squares trend without reading the logs, and record_log() updates it
+# in O(1) as each replacement is logged. Medians need the intervals
+# themselves and are only computed for the analytics endpoint, in SQL.
+#
+# An interval of 0 days (or km) means unknown - the first replacement of an
+# item with no previous date, or one logged without mileage - and is left
+# out.
+
+# Logs included in each list payload, newest first
+CONSUMABLE_LOG_LIMIT = int(os.getenv("CONSUMABLE_LOG_LIMIT", "5"))
+# Trends below this fraction of the mean interval per replacement are "stable"
+TREND_TOLERANCE = 0.05
+
+METRICS = ("days", "km")
+
+def _log_value(log, metric):
+    return log.days_since_last if metric == "days" else log.km_since_last
+
+def record_log(db: Session, consumable, log):
+    """
+    Adds a new log's intervals to the consumable's running sums (no commit).
+    Ordinals follow replaced_at, so a backdated log - older than one already
+    recorded - shifts later ordinals and the sums are rebuilt instead.
+    """
+    Log = models.ConsumableLog
+    db.flush()
+    backdated = db.query(Log.id).filter(
+        Log.consumable_id == consumable.id, Log.id != log.id, Log.replaced_at > log.replaced_at
+    ).first()
+    if backdated is not None:
+        rebuild(db, consumable_id=consumable.id)
+        if consumable.stats is not None:
+            db.expire(consumable.stats)
+        db.expire(consumable, ["stats"])
+        return
+
+    stats = consumable.stats
+    if stats is None:
+        stats = consumable.stats = models.ConsumableStats(
+            log_count=0, days_count=0, days_sum=0, days_weighted_sum=0, km_count=0, km_sum=0, km_weighted_sum=0
+        )
+    stats.log_count += 1
+    for metric in METRICS:
+        value = _log_value(log, metric)
+        if value and value > 0:
+            count = getattr(stats, f"{metric}_count") + 1
+            setattr(stats, f"{metric}_count", count)
+            setattr(stats, f"{metric}_sum", getattr(stats, f"{metric}_sum") + value)
+            setattr(stats, f"{metric}_weighted_sum", getattr(stats, f"{metric}_weighted_sum") + count * value)
+
+def rebuild(db: Session, after_id: int = 0, consumable_id: int = None):
+    """
+    Recomputes the sums of consumables with id > after_id (or of just
+    consumable_id) from their logs, with one aggregate query (no commit).
+    Used after imports, migrations and backdated logs.
+    """
+    def scope(column):
+        return column == consumable_id if consumable_id is not None else column > after_id
+
+    Log = models.ConsumableLog
+    window = {"partition_by": Log.consumable_id, "order_by": (Log.replaced_at, Log.id)}
+    columns = [Log.consumable_id]
+    for metric in METRICS:
+        value = getattr(Log, f"{metric}_since_last")
+        valid = case((value > 0, 1), else_=0)
+        columns += [
+            (valid * value).label(metric),
+            # Running count of valid intervals = each interval's ordinal
+            (valid * func.sum(valid).over(**window)).label(f"{metric}_ordinal"),
+        ]
+    ordered = select(*columns).where(scope(Log.consumable_id)).subquery()
+
+    sums = [func.count().label("log_count")]
+    for metric in METRICS:
+        value, ordinal = ordered.c[metric], ordered.c[f"{metric}_ordinal"]
+        sums += [
+            func.sum(case((value > 0, 1), else_=0)).label(f"{metric}_count"),
+            func.sum(value).label(f"{metric}_sum"),
+            func.sum(value * ordinal).label(f"{metric}_weighted_sum"),
+        ]
+    rows = db.execute(select(ordered.c.consumable_id, *sums).group_by(ordered.c.consumable_id)).mappings().all()
+
+    db.query(models.ConsumableStats).filter(scope(models.ConsumableStats.consumable_id)).delete(
+        synchronize_session=False
+    )
+    if rows:
+        db.execute(insert(models.ConsumableStats), [
+            {key: int(value or 0) for key, value in row.items()} for row in rows
+        ])
+    return len(rows)
+
+def interval_stats(count: int, total: int, weighted: int, median=None):
+    """Mean, trend and next predicted interval from the running sums."""
+    if not count:
+        return {
+            "intervals": 0, "mean": None, "median": median, "trend": None, "direction": None,
+            "predicted_interval": None,
+        }
+    mean = total / count
+    slope = None
+    predicted = mean
+    if count >= 2:
+        # Least-squares slope of interval against ordinal 1..n
+        n = count
+        sum_x = n * (n + 1) / 2
+        sum_x2 = n * (n + 1) * (2 * n + 1) / 6
+        slope = (n * weighted - sum_x * total) / (n * sum_x2 - sum_x * sum_x)
+        if count >= 3:
+            # The fitted line at ordinal n + 1
+            predicted = max(mean + slope * (n + 1) / 2, 1)
+    return {
+        "intervals": count,
+        "mean": round(mean, 1),
+        "median": median,
+        "trend": round(slope, 2) if slope is not None else None,
+        "direction": _direction(slope, mean),
+        "predicted_interval": round(predicted),
+    }
+
+def _direction(slope, mean):
+    if slope is None:
+        return None
+    if abs(slope) <= TREND_TOLERANCE * mean:
+        return "stable"
+    return "longer" if slope > 0 else "shorter"
+
+def summary(consumable, medians: dict = None):
+    """Statistics for one consumable, with predicted next replacement date and mileage."""
+    stats = consumable.stats
+    medians = medians or {}
+    result = {"replacements": stats.log_count if stats else 0}
+    for metric in METRICS:
+        result[metric] = interval_stats(
+            getattr(stats, f"{metric}_count", 0) if stats else 0,
+            getattr(stats, f"{metric}_sum", 0) if stats else 0,
+            getattr(stats, f"{metric}_weighted_sum", 0) if stats else 0,
+            medians.get(metric),
+        )
+    days, km = result["days"]["predicted_interval"], result["km"]["predicted_interval"]
+    result["predicted_next_at"] = (
+        (consumable.last_replaced + timedelta(days=days)).isoformat()
+        if days and consumable.last_replaced else None
+    )
+    result["predicted_next_km"] = consumable.mileage + km if km and consumable.mileage is not None else None
+    return result
+
+def _medians(db: Session, metric: str, key):
+    """Median of the valid intervals per key (a ConsumableLog or Consumable column)."""
+    Log = models.ConsumableLog
+    value = getattr(Log, f"{metric}_since_last")
+    ranked = (
+        select(
+            key.label("key"),
+            value.label("value"),
+            func.row_number().over(partition_by=key, order_by=value).label("rn"),
+            func.count().over(partition_by=key).label("n"),
+        )
+        .select_from(Log).join(models.Consumable, models.Consumable.id == Log.consumable_id)
+        .where(value > 0)
+        .subquery()
+    )
+    # The middle row, or the two middle rows when n is even
+    middle = and_(2 * ranked.c.rn >= ranked.c.n, 2 * ranked.c.rn <= ranked.c.n + 2)
+    rows = db.execute(
+        select(ranked.c.key, func.avg(ranked.c.value)).where(middle).group_by(ranked.c.key)
+    )
+    return {key: round(float(median), 1) for key, median in rows}
+
+def analytics(db: Session, category: str = None):
+    """Per-consumable and per-category interval statistics."""
+    query = db.query(models.Consumable).options(selectinload(models.Consumable.stats)).order_by(models.Consumable.id)
+    if category is not None:
+        query = query.filter(models.Consumable.category == category)
+    consumables = query.all()
+
+    per_consumable = {m: _medians(db, m, models.ConsumableLog.consumable_id) for m in METRICS}
+    per_category = {m: _medians(db, m, models.Consumable.category) for m in METRICS}
+
+    items = []
+    for c in consumables:
+        items.append({
+            "id": c.id,
+            "name": c.name,
+            "category": c.category,
+            **summary(c, {m: per_consumable[m].get(c.id) for m in METRICS}),
+        })
+
+    Stats = models.ConsumableStats
+    totals = (
+        db.query(
+            models.Consumable.category,
+            func.count(models.Consumable.id),
+            func.coalesce(func.sum(Stats.log_count), 0),
+            *[func.coalesce(func.sum(getattr(Stats, f"{m}_{part}")), 0) for m in METRICS for part in ("count", "sum")],
+        )
+        .outerjoin(Stats, Stats.consumable_id == models.Consumable.id)
+        .group_by(models.Consumable.category)
+        .order_by(models.Consumable.category)
+    )
+    if category is not None:
+        totals = totals.filter(models.Consumable.category == category)
+
+    categories = []
+    for name, consumable_count, replacements, days_count, days_sum, km_count, km_sum in totals:
+        entry = {"category": name, "consumables": consumable_count, "replacements": int(replacements)}
+        for metric, count, total in (("days", days_count, days_sum), ("km", km_count, km_sum)):
+            entry[metric] = {
+                "intervals": int(count),
+                "mean": round(total / count, 1) if count else None,
+                "median": per_category[metric].get(name),
+            }
+        categories.append(entry)
+    return {"consumables": items, "categories": categories}
+
+def load_latest_logs(db: Session, consumables, limit: int = CONSUMABLE_LOG_LIMIT):
+    """
+    Sets consumable.latest_logs to each consumable's newest logs, at most
+    limit each, with one windowed query instead of loading every log.
+    """
+    if not consumables:
+        return consumables
+    Log = models.ConsumableLog
+    rn = func.row_number().over(
+        partition_by=Log.consumable_id, order_by=(Log.replaced_at.desc(), Log.id.desc())
+    ).label("rn")
+    ranked = select(Log.id, rn).where(Log.consumable_id.in_([c.id for c in consumables])).subquery()
+    logs = (
+        db.query(Log).join(ranked, ranked.c.id == Log.id)
+        .filter(ranked.c.rn <= limit)
+        .order_by(Log.consumable_id, ranked.c.rn)
+        .all()
+    )
+    by_consumable = {c.id: [] for c in consumables}
+    for log in logs:
+        by_consumable[log.consumable_id].append(log)
+    for c in consumables:
+        c.latest_logs = by_consumable[c.id]
+    return consumables
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, or_
+from sqlalchemy.orm import Session
+from . import models
+from .cache import cache
+from .serializers import CN_TZ
+
+# Consumable status, derived from when (and at what mileage) each item is due.
+#
+# Every write stores next_due_at (the earlier of last_replaced + lifespan
+# days and expiry_date) and next_due_km (mileage + lifespan_km), and sets
+# status from them. Mileage only changes on writes, so after a write only
+# the passage of time can move a row to another status; sweep() catches
+# those rows with a range scan on next_due_at instead of recomputing every
+# row. Items with no due date or distance keep whatever status was set.
+# status_rank mirrors status as the list sort key (STATUS_RANK; any other
+# status ranks 0 and sorts first), so the list pages on an (int, id) index.
+
+STATUS_NORMAL = "正常"
+STATUS_DUE_SOON = "即将到期"
+STATUS_OVERDUE = "已过期"
+STATUS_RANK = {STATUS_NORMAL: 1, STATUS_DUE_SOON: 2, STATUS_OVERDUE: 3}
+
+DUE_SOON_DAYS = int(os.getenv("CONSUMABLE_DUE_SOON_DAYS", "7"))
+DUE_SOON_KM = int(os.getenv("CONSUMABLE_DUE_SOON_KM", "500"))
+
+def _naive(dt):
+    # Stored times are naive China time, like memo deadlines
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(CN_TZ).replace(tzinfo=None)
+    return dt
+
+def next_due(consumable):
+    """Returns (next_due_at, next_due_km) for a consumable's current fields."""
+    candidates = []
+    if consumable.last_replaced is not None and consumable.lifespan:
+        candidates.append(_naive(consumable.last_replaced) + timedelta(days=consumable.lifespan))
+    if consumable.expiry_date is not None:
+        candidates.append(_naive(consumable.expiry_date))
+    due_at = min(candidates) if candidates else None
+
+    due_km = None
+    if consumable.mileage is not None and consumable.lifespan_km:
+        due_km = consumable.mileage + consumable.lifespan_km
+    return due_at, due_km
+
+def compute_status(due_at, due_km, current_mileage, now: datetime = None):
+    if due_at is None and due_km is None:
+        return None
+    now = now or datetime.now()
+    mileage = current_mileage or 0
+    if (due_at is not None and due_at <= now) or (due_km is not None and mileage >= due_km):
+        return STATUS_OVERDUE
+    if (due_at is not None and due_at <= now + timedelta(days=DUE_SOON_DAYS)) or \
+            (due_km is not None and mileage >= due_km - DUE_SOON_KM):
+        return STATUS_DUE_SOON
+    return STATUS_NORMAL
+
+def refresh(consumable, now: datetime = None):
+    """Recomputes a consumable's due columns and status in place (no commit)."""
+    for field in ("last_replaced", "expiry_date"):
+        setattr(consumable, field, _naive(getattr(consumable, field)))
+    consumable.next_due_at, consumable.next_due_km = next_due(consumable)
+    status = compute_status(consumable.next_due_at, consumable.next_due_km, consumable.current_mileage, now)
+    if status is not None:
+        consumable.status = status
+    consumable.status_rank = STATUS_RANK.get(consumable.status, 0)
+
+def rank_expression(status):
+    """SQL CASE mapping a status expression to its status_rank."""
+    return case(STATUS_RANK, value=status, else_=0)
+
+def refresh_batch(db: Session, after_id: int = 0, limit: int = 500, now: datetime = None):
+    """
+    Refreshes up to limit consumables with id > after_id, in id order, and
+    flushes. Returns the rows refreshed; an empty list means none are left.
+    """
+    rows = (
+        db.query(models.Consumable)
+        .filter(models.Consumable.id > after_id)
+        .order_by(models.Consumable.id)
+        .limit(limit).all()
+    )
+    for consumable in rows:
+        refresh(consumable, now)
+    db.flush()
+    return rows
+
+def status_expression(now: datetime, mileage=None):
+    """
+    SQL CASE computing the status of rows that have a due date or distance.
+    mileage replaces current_mileage, for an UPDATE that also sets it (MySQL
+    evaluates SET clauses left to right, so the column would be ambiguous).
+    """
+    Consumable = models.Consumable
+    if mileage is None:
+        mileage = Consumable.current_mileage
+    km_due = Consumable.next_due_km.isnot(None)
+    return case(
+        (or_(Consumable.next_due_at <= now, and_(km_due, mileage >= Consumable.next_due_km)), STATUS_OVERDUE),
+        (or_(
+            Consumable.next_due_at <= now + timedelta(days=DUE_SOON_DAYS),
+            and_(km_due, mileage >= Consumable.next_due_km - DUE_SOON_KM),
+        ), STATUS_DUE_SOON),
+        else_=STATUS_NORMAL,
+    )
+
+def sweep(db: Session, now: datetime = None, since: datetime = None):
+    """
+    Moves rows whose due date is now inside the due-soon window, or past,
+    to the matching status. With since (the previous sweep's now), only rows
+    that can have crossed a threshold after it are checked. Commits, and
+    returns (id, new status) for the rows that changed.
+    """
+    now = now or datetime.now()
+    Consumable = models.Consumable
+    # Only rows not yet overdue can change; the range on next_due_at keeps
+    # this to the rows near or past their due date
+    candidates = and_(
+        Consumable.next_due_at <= now + timedelta(days=DUE_SOON_DAYS),
+        Consumable.status != STATUS_OVERDUE,
+    )
+    if since is not None:
+        # Both thresholds lie at or before next_due_at, so a row that crossed
+        # one within (since, now] is due after since
+        candidates = and_(candidates, Consumable.next_due_at > since)
+    expr = status_expression(now)
+    changed = [
+        tuple(row) for row in
+        db.query(Consumable.id, expr).filter(candidates, Consumable.status != expr).order_by(Consumable.id)
+    ]
+    if changed:
+        db.query(Consumable).filter(Consumable.id.in_([i for i, _ in changed])).update(
+            {Consumable.status: expr, Consumable.status_rank: rank_expression(expr)}, synchronize_session=False
+        )
+    db.commit()
+    if changed:
+        cache.invalidate_consumables()
+    return changed
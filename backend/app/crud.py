@@ -1,55 +1,127 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, case, func, insert, select, true, update
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timezone, timedelta, date
-from . import models, schemas
+from typing import List
+from . import models, schemas, search, storage, consumable_status, consumable_analytics, scheduler, recurrence
+from .cache import cache
+from .ordering import initial_keys, plan_keys, key_between, is_dense
+from .pagination import InvalidCursor, encode_cursor, decode_cursor, dump_datetime, load_datetime
 
 CN_TZ = timezone(timedelta(hours=8))
 
-def _sync_memo_status(db: Session, memo: models.Memo):
+def _sync_memo_status(db: Session, memo_id: int):
     """
     Updates memo completion status based on subtasks.
     If subtasks exist:
     - All completed -> Memo completed (time = max subtask completion time)
     - Any incomplete -> Memo active (completed_at = None)
+
+    Runs inside the caller's transaction; the caller commits.
     """
     # Flush to ensure subtask changes are in DB (but not committed yet)
     db.flush()
-    
-    # Query subtasks directly to get the latest state
-    subtasks = db.query(models.SubTask).filter(models.SubTask.memo_id == memo.id).all()
-    
-    if not subtasks:
+
+    # One aggregate over the memo's subtasks instead of loading every row
+    row = (
+        db.query(
+            models.Memo.completed_at,
+            func.count(models.SubTask.id),
+            func.sum(case((models.SubTask.is_completed.is_(True), 0), else_=1)),
+            func.max(models.SubTask.completed_at),
+        )
+        .select_from(models.Memo)
+        .outerjoin(models.SubTask, models.SubTask.memo_id == models.Memo.id)
+        .filter(models.Memo.id == memo_id)
+        .group_by(models.Memo.id, models.Memo.completed_at)
+        .first()
+    )
+    if row is None:
         return
 
-    all_done = all(st.is_completed for st in subtasks)
-    
-    if all_done:
-        # Find the latest completion time
-        latest = None
-        for st in subtasks:
-            if st.completed_at:
-                # Ensure we are comparing aware/naive consistently if needed, 
-                # but DB returns consistent types usually.
-                if latest is None or st.completed_at > latest:
-                    latest = st.completed_at
-        
+    current, total, incomplete, latest = row
+    if not total:
+        return
+
+    if incomplete == 0:
         # If strictly all are completed but some lack timestamp, use now
-        memo.completed_at = latest or datetime.now()
+        completed_at = latest or datetime.now()
     else:
-        memo.completed_at = None
+        completed_at = None
+
+    if completed_at != current:
+        db.query(models.Memo).filter(models.Memo.id == memo_id).update(
+            {models.Memo.completed_at: completed_at}, synchronize_session=False
+        )
 
-def get_memo(db: Session, memo_id: int):
-    return db.query(models.Memo).filter(models.Memo.id == memo_id).first()
+def _memo_load_options():
+    # Load subtasks and their attachments with one SELECT ... IN per level,
+    # so a page of memos costs a fixed number of queries instead of N+1.
+    # Subtask ordering comes from the relationship's order_by.
+    return (
+        selectinload(models.Memo.subtasks).selectinload(models.SubTask.attachments),
+    )
+
+def _consumable_load_options():
+    # Logs are not loaded in full; see consumable_analytics.load_latest_logs
+    return (selectinload(models.Consumable.stats),)
+
+def get_memo(db: Session, memo_id: int, eager: bool = False):
+    query = db.query(models.Memo)
+    if eager:
+        query = query.options(*_memo_load_options())
+    return query.filter(models.Memo.id == memo_id).first()
 
-def get_memos(db: Session, skip: int = 0, limit: int = 100, category: str = None):
+def _memo_list_query(db: Session, category: str = None, eager: bool = True):
     query = db.query(models.Memo)
+    if eager:
+        query = query.options(*_memo_load_options())
     if category and category != 'all':
         query = query.filter(models.Memo.category == category)
+    return query
+
+def get_memos(db: Session, skip: int = 0, limit: int = 100, category: str = None, eager: bool = True):
+    query = _memo_list_query(db, category, eager)
     
     # Sort by deadline: non-nulls first (asc), then nulls
-    query = query.order_by(models.Memo.deadline.is_(None), models.Memo.deadline.asc())
+    query = query.order_by(models.Memo.deadline.is_(None), models.Memo.deadline.asc(), models.Memo.id.asc())
     
     return query.offset(skip).limit(limit).all()
 
+def get_memos_page(db: Session, cursor: str = None, limit: int = 100, category: str = None, eager: bool = True):
+    """
+    Keyset variant of get_memos. Returns (memos, next_cursor); next_cursor is
+    None on the last page. Raises InvalidCursor for a malformed cursor.
+    """
+    query = _memo_list_query(db, category, eager)
+    Memo = models.Memo
+    key = decode_cursor(cursor) if cursor else None
+    deadline = load_datetime(key.get("deadline")) if key else None
+
+    # Memos with a deadline (ascending), then the rest by id. Each segment is
+    # its own range seek on ix_memos_category_deadline_id (ix_memos_deadline
+    # without a category), so neither needs a sort
+    memos = []
+    if key is None or deadline is not None:
+        dated = query.filter(Memo.deadline.isnot(None))
+        if key is not None:
+            dated = query.filter(or_(
+                Memo.deadline > deadline,
+                and_(Memo.deadline == deadline, Memo.id > key["id"]),
+            ))
+        memos = dated.order_by(Memo.deadline, Memo.id).limit(limit + 1).all()
+    if len(memos) <= limit:
+        undated = query.filter(Memo.deadline.is_(None))
+        if key is not None and deadline is None:
+            undated = undated.filter(Memo.id > key["id"])
+        memos += undated.order_by(Memo.id).limit(limit + 1 - len(memos)).all()
+
+    next_cursor = None
+    if len(memos) > limit:
+        memos = memos[:limit]
+        last = memos[-1]
+        next_cursor = encode_cursor({"deadline": dump_datetime(last.deadline), "id": last.id})
+    return memos, next_cursor
+
 def create_memo(db: Session, memo: schemas.MemoCreate):
     db_memo = models.Memo(
         title=memo.title, 
@@ -70,16 +142,93 @@ def create_memo(db: Session, memo: schemas.MemoCreate):
     db.add(db_memo)
     db.flush() # Flush to get the ID
     
-    for index, subtask in enumerate(memo.subtasks):
+    for key, subtask in zip(initial_keys(len(memo.subtasks)), memo.subtasks):
         subtask_data = subtask.dict()
-        subtask_data['order'] = index
+        subtask_data['order'] = key
         db_subtask = models.SubTask(**subtask_data, memo_id=db_memo.id)
         db.add(db_subtask)
-        
+
+    search.index_memo(db, db_memo.id)
     db.commit()
     db.refresh(db_memo)
+    cache.invalidate_memo(db_memo.id)
     return db_memo
 
+def _sync_subtasks(db: Session, memo_id: int, subtasks: List[schemas.SubTaskCreate]):
+    """
+    Makes the memo's subtasks match `subtasks` (list position = order) with
+    the fewest statements: one bulk INSERT for new rows, one DELETE for
+    removed rows and UPDATEs carrying only the fields that changed. Subtasks
+    that keep their relative position keep their order key. Returns
+    (reindex, removed, unused_paths): the ids of subtasks added or with
+    edited text, whether any subtask was removed, and the attachment files
+    the removed subtasks leave unused (see _release_blobs).
+    """
+    columns = ('content', 'note', 'is_completed', 'order', 'created_at', 'start_time', 'completed_at')
+    existing = {
+        row.id: row for row in
+        db.query(models.SubTask.id, *(getattr(models.SubTask, c) for c in columns))
+        .filter(models.SubTask.memo_id == memo_id)
+    }
+
+    kept, matched = set(), []
+    for st_data in subtasks:
+        is_existing = bool(st_data.id) and st_data.id in existing and st_data.id not in kept
+        if is_existing:
+            kept.add(st_data.id)
+        matched.append(is_existing)
+    keys = plan_keys([existing[st.id].order if m else None for st, m in zip(subtasks, matched)])
+
+    inserts, updates = [], []
+    for st_data, is_existing, key in zip(subtasks, matched, keys):
+        # If ID exists and is in current subtasks, update it
+        if is_existing:
+            desired = {
+                'content': st_data.content,
+                'is_completed': st_data.is_completed,
+                'order': key,
+                'start_time': st_data.start_time,
+                'completed_at': st_data.completed_at,
+            }
+            if st_data.created_at: desired['created_at'] = st_data.created_at
+            if st_data.note is not None: desired['note'] = st_data.note
+
+            current = existing[st_data.id]
+            changed = {k: v for k, v in desired.items() if getattr(current, k) != v}
+            if changed:
+                updates.append({'id': st_data.id, **changed})
+        else:
+            # Create new subtask; let the DB assign id and default created_at
+            st_dict = st_data.dict(exclude={'id'})
+            if st_dict['created_at'] is None:
+                del st_dict['created_at']
+            st_dict['order'] = key
+            st_dict['memo_id'] = memo_id
+            inserts.append(st_dict)
+
+    removed = [st_id for st_id in existing if st_id not in kept]
+    unused_paths = []
+    if removed:
+        # Bulk DELETE bypasses the ORM delete-orphan cascade, so clear attachments first
+        removed_attachments = db.query(models.SubtaskAttachment).filter(
+            models.SubtaskAttachment.subtask_id.in_(removed)
+        )
+        unused_paths = _release_blobs(db, removed_attachments)
+        removed_attachments.delete(synchronize_session=False)
+        db.query(models.SubTask).filter(models.SubTask.id.in_(removed)).delete(synchronize_session=False)
+    reindex = [u['id'] for u in updates if 'content' in u or 'note' in u]
+    if inserts:
+        db.execute(insert(models.SubTask), inserts)
+        # Without RETURNING (MySQL) the new ids are read back; they are the
+        # memo's ids above every existing one
+        query = db.query(models.SubTask.id).filter(models.SubTask.memo_id == memo_id)
+        if existing:
+            query = query.filter(models.SubTask.id > max(existing))
+        reindex += [st_id for (st_id,) in query]
+    if updates:
+        db.execute(update(models.SubTask), updates)
+    return reindex, bool(removed), unused_paths
+
 def update_memo(db: Session, memo_id: int, memo: schemas.MemoUpdate):
     db_memo = get_memo(db, memo_id)
     if not db_memo:
@@ -107,44 +256,35 @@ def update_memo(db: Session, memo_id: int, memo: schemas.MemoUpdate):
             db_memo.deadline = dt.replace(tzinfo=None)
         
     # Handle subtasks update if provided
+    reindex_memo = 'title' in update_data or 'content' in update_data
+    reindex, unused_paths = [], []
     if memo.subtasks is not None:
-        # Map existing subtasks by ID
-        existing_subtasks = {st.id: st for st in db_memo.subtasks}
-        new_subtasks_list = []
-        
-        for index, st_data in enumerate(memo.subtasks):
-            # If ID exists and is in current subtasks, update it
-            if st_data.id and st_data.id in existing_subtasks:
-                st = existing_subtasks[st_data.id]
-                st.content = st_data.content
-                st.is_completed = st_data.is_completed
-                st.order = index
-                if st_data.created_at: st.created_at = st_data.created_at
-                st.start_time = st_data.start_time
-                st.completed_at = st_data.completed_at
-                if st_data.note is not None: st.note = st_data.note
-                new_subtasks_list.append(st)
-            else:
-                # Create new subtask
-                # Exclude id from dict to let DB assign it (though SubTaskCreate has id=None default)
-                st_dict = st_data.dict(exclude={'id'})
-                st_dict['order'] = index
-                new_st = models.SubTask(**st_dict, memo_id=db_memo.id)
-                new_subtasks_list.append(new_st)
-        
-        # Assigning the list will trigger SQLAlchemy to delete orphans (those not in new_subtasks_list)
-        # because cascade="all, delete-orphan" is set on the relationship.
-        db_memo.subtasks = new_subtasks_list
+        reindex, removed, unused_paths = _sync_subtasks(db, memo_id, memo.subtasks)
+        reindex_memo = reindex_memo or removed
 
+    # Subtask edits re-index just those subtasks; memo text changes and
+    # removals rebuild the memo's entries
+    if reindex_memo:
+        search.index_memo(db, memo_id)
+    elif reindex:
+        search.index_subtasks(db, reindex)
     db.commit()
+    _remove_files(unused_paths)
     db.refresh(db_memo)
+    cache.invalidate_memo(memo_id)
     return db_memo
 
 def delete_memo(db: Session, memo_id: int):
     db_memo = get_memo(db, memo_id)
     if db_memo:
+        unused_paths = _release_blobs(db, db.query(models.SubtaskAttachment).join(models.SubTask).filter(
+            models.SubTask.memo_id == memo_id
+        ))
         db.delete(db_memo)
+        search.remove_memo(db, memo_id)
         db.commit()
+        _remove_files(unused_paths)
+        cache.invalidate_memo(memo_id)
     return db_memo
 
 def create_template(db: Session, template: schemas.TemplateCreate):
@@ -156,10 +296,10 @@ def create_template(db: Session, template: schemas.TemplateCreate):
     db.add(db_template)
     db.flush()
     
-    for index, subtask in enumerate(template.subtasks):
+    for key, subtask in zip(initial_keys(len(template.subtasks)), template.subtasks):
         db_subtask = models.TemplateSubTask(
             content=subtask.content,
-            order=index,
+            order=key,
             template_id=db_template.id
         )
         db.add(db_subtask)
@@ -169,11 +309,127 @@ def create_template(db: Session, template: schemas.TemplateCreate):
     return db_template
 
 def get_templates(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Template).offset(skip).limit(limit).all()
+    return (
+        db.query(models.Template)
+        .options(selectinload(models.Template.subtasks))
+        .order_by(models.Template.id)
+        .offset(skip).limit(limit).all()
+    )
+
+def _to_cn_naive(dt):
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(CN_TZ).replace(tzinfo=None)
+    return dt
+
+def instantiate_template(db: Session, template_id: int, data: schemas.TemplateInstantiate):
+    """
+    Creates memos from a template in one transaction: a single memo, or one
+    per date of data.recurrence. The template's subtasks are copied to every
+    new memo with one INSERT ... SELECT. Returns the memos, or None if the
+    template does not exist; raises ValueError for a bad recurrence.
+    """
+    template = db.query(models.Template).filter(models.Template.id == template_id).first()
+    if not template:
+        return None
+
+    title = data.title or template.title
+    if data.recurrence:
+        start = _to_cn_naive(data.start) or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        dates = recurrence.occurrences(data.recurrence, start, _to_cn_naive(data.until), data.count)
+        if not dates:
+            raise ValueError("Recurrence produces no dates")
+        memos = [
+            models.Memo(title=f"{title} {d:%Y-%m-%d}", content=template.content, category=template.category, deadline=d)
+            for d in dates
+        ]
+    else:
+        memos = [models.Memo(
+            title=title, content=template.content, category=template.category, deadline=_to_cn_naive(data.deadline)
+        )]
+    db.add_all(memos)
+    db.flush()
+    memo_ids = [memo.id for memo in memos]
+
+    # Every template subtask x every new memo, keeping the template's order keys
+    copies = (
+        select(models.TemplateSubTask.content, models.TemplateSubTask.order, models.Memo.id)
+        .select_from(models.TemplateSubTask)
+        .join(models.Memo, true())
+        .where(models.TemplateSubTask.template_id == template_id, models.Memo.id.in_(memo_ids))
+    )
+    db.execute(insert(models.SubTask).from_select(["content", "order", "memo_id"], copies))
+
+    search.index_memos(db, memo_ids)
+    db.commit()
+    cache.invalidate_memo(None)
+    return (
+        db.query(models.Memo).options(*_memo_load_options())
+        .filter(models.Memo.id.in_(memo_ids)).order_by(models.Memo.id).all()
+    )
 
 # Consumables CRUD
-def get_consumables(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Consumable).order_by(models.Consumable.status == '已过期', models.Consumable.status == '即将到期', models.Consumable.status == '正常').offset(skip).limit(limit).all()
+# The consumables list sorts by status_rank (consumable_status.STATUS_RANK;
+# other statuses rank 0 and sort first, matching the original
+# boolean-expression ordering), then id.
+def get_consumables(db: Session, skip: int = 0, limit: int = 100, eager: bool = True):
+    query = db.query(models.Consumable)
+    if eager:
+        query = query.options(*_consumable_load_options())
+    consumables = query.order_by(models.Consumable.status_rank, models.Consumable.id).offset(skip).limit(limit).all()
+    if eager:
+        consumable_analytics.load_latest_logs(db, consumables)
+    return consumables
+
+def get_consumables_page(db: Session, cursor: str = None, limit: int = 100, eager: bool = True):
+    """
+    Keyset variant of get_consumables. Returns (consumables, next_cursor).
+    """
+    Consumable = models.Consumable
+    query = db.query(Consumable)
+    if eager:
+        query = query.options(*_consumable_load_options())
+
+    if cursor:
+        key = decode_cursor(cursor)
+        last_rank = key.get("rank")
+        if not isinstance(last_rank, int):
+            raise InvalidCursor("Invalid cursor")
+        # A range seek on ix_consumables_status_rank_id
+        query = query.filter(or_(
+            Consumable.status_rank > last_rank,
+            and_(Consumable.status_rank == last_rank, Consumable.id > key["id"]),
+        ))
+
+    consumables = query.order_by(Consumable.status_rank, Consumable.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(consumables) > limit:
+        consumables = consumables[:limit]
+        last = consumables[-1]
+        next_cursor = encode_cursor({"rank": last.status_rank, "id": last.id})
+    if eager:
+        consumable_analytics.load_latest_logs(db, consumables)
+    return consumables, next_cursor
+
+def get_due_consumables(db: Session, within_days: int = consumable_status.DUE_SOON_DAYS, limit: int = 100):
+    """Consumables due by date within within_days (or overdue), soonest first."""
+    deadline = datetime.now() + timedelta(days=within_days)
+    consumables = (
+        db.query(models.Consumable)
+        .options(*_consumable_load_options())
+        .filter(models.Consumable.next_due_at <= deadline)
+        .order_by(models.Consumable.next_due_at, models.Consumable.id)
+        .limit(limit).all()
+    )
+    return consumable_analytics.load_latest_logs(db, consumables)
+
+def get_consumable_logs(db: Session, consumable_id: int, skip: int = 0, limit: int = 100):
+    return (
+        db.query(models.ConsumableLog)
+        .filter(models.ConsumableLog.consumable_id == consumable_id)
+        .order_by(models.ConsumableLog.replaced_at.desc(), models.ConsumableLog.id.desc())
+        .offset(skip).limit(limit).all()
+    )
 
 def get_consumable(db: Session, consumable_id: int):
     return db.query(models.Consumable).filter(models.Consumable.id == consumable_id).first()
@@ -182,11 +438,16 @@ def create_consumable(db: Session, consumable: schemas.ConsumableCreate):
     db_consumable = models.Consumable(**consumable.dict())
     if db_consumable.mileage is not None and db_consumable.current_mileage is None:
         db_consumable.current_mileage = db_consumable.mileage
+    consumable_status.refresh(db_consumable)
     db.add(db_consumable)
     db.commit()
     db.refresh(db_consumable)
+    cache.invalidate_consumables()
     return db_consumable
 
+def get_subtask(db: Session, subtask_id: int):
+    return db.query(models.SubTask).filter(models.SubTask.id == subtask_id).first()
+
 def update_subtask_status(db: Session, subtask_id: int, is_completed: bool):
     subtask = db.query(models.SubTask).filter(models.SubTask.id == subtask_id).first()
     if not subtask:
@@ -198,67 +459,211 @@ def update_subtask_status(db: Session, subtask_id: int, is_completed: bool):
     else:
         subtask.completed_at = None
         
+    # Update parent memo completion status in the same transaction
+    _sync_memo_status(db, subtask.memo_id)
     db.commit()
     db.refresh(subtask)
-    
-    # Update parent memo completion status
-    memo = db.query(models.Memo).filter(models.Memo.id == subtask.memo_id).first()
-    if memo:
-        _sync_memo_status(db, memo)
-        db.commit()
+    cache.invalidate_memo(subtask.memo_id)
         
     return subtask
 
+def move_subtask(db: Session, subtask_id: int, before_id: int = None, after_id: int = None):
+    """
+    Moves a subtask between two siblings by giving it a key between theirs;
+    only the moved row is written. Returns (subtask, dense) where dense means
+    the neighbours' keys are close enough that the memo should be rebalanced,
+    or None if the subtask does not exist. Raises ValueError for bad neighbours.
+    """
+    subtask = db.query(models.SubTask).filter(models.SubTask.id == subtask_id).first()
+    if not subtask:
+        return None
+    if before_id is None and after_id is None:
+        raise ValueError("before_id or after_id is required")
+    if subtask_id in (before_id, after_id):
+        raise ValueError("A subtask cannot be its own neighbour")
+
+    siblings = db.query(models.SubTask.order).filter(
+        models.SubTask.memo_id == subtask.memo_id, models.SubTask.id != subtask_id
+    )
+
+    def neighbour_key(neighbour_id):
+        key = siblings.filter(models.SubTask.id == neighbour_id).scalar()
+        if key is None:
+            raise ValueError(f"Subtask {neighbour_id} is not in memo {subtask.memo_id}")
+        return key
+
+    lo = neighbour_key(after_id) if after_id is not None else None
+    hi = neighbour_key(before_id) if before_id is not None else None
+    if lo is None:
+        lo = siblings.filter(models.SubTask.order < hi).with_entities(func.max(models.SubTask.order)).scalar()
+    elif hi is None:
+        hi = siblings.filter(models.SubTask.order > lo).with_entities(func.min(models.SubTask.order)).scalar()
+    elif lo >= hi:
+        raise ValueError("after_id must come before before_id")
+
+    subtask.order = key_between(lo, hi)
+    db.commit()
+    db.refresh(subtask)
+    cache.invalidate_memo(subtask.memo_id)
+    return subtask, is_dense(lo, subtask.order) or is_dense(subtask.order, hi)
+
+def rebalance_subtask_order(db: Session, memo_id: int):
+    """Renumbers a memo's subtask keys to evenly spaced values, keeping their order."""
+    ids = [row.id for row in db.query(models.SubTask.id).filter(
+        models.SubTask.memo_id == memo_id
+    ).order_by(models.SubTask.order, models.SubTask.id)]
+    if ids:
+        db.execute(update(models.SubTask), [
+            {'id': st_id, 'order': key} for st_id, key in zip(ids, initial_keys(len(ids)))
+        ])
+        db.commit()
+        cache.invalidate_memo(memo_id)
+    return len(ids)
+
+def _normalize_subtask_times(update_data: dict):
+    # Handle timezones if present
+    for field in ('start_time', 'completed_at'):
+        dt = update_data.get(field)
+        if dt:
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(CN_TZ)
+            update_data[field] = dt.replace(tzinfo=None)
+    return update_data
+
 def update_subtask(db: Session, subtask_id: int, subtask_update: schemas.SubTaskUpdate):
     db_subtask = db.query(models.SubTask).filter(models.SubTask.id == subtask_id).first()
     if not db_subtask:
         return None
     
-    update_data = subtask_update.dict(exclude_unset=True)
-    
-    # Handle timezones if present
-    if 'start_time' in update_data and update_data['start_time']:
-         dt = update_data['start_time']
-         if dt.tzinfo is not None:
-             dt = dt.astimezone(CN_TZ)
-         update_data['start_time'] = dt.replace(tzinfo=None)
-         
-    if 'completed_at' in update_data and update_data['completed_at']:
-         dt = update_data['completed_at']
-         if dt.tzinfo is not None:
-             dt = dt.astimezone(CN_TZ)
-         update_data['completed_at'] = dt.replace(tzinfo=None)
+    update_data = _normalize_subtask_times(subtask_update.dict(exclude_unset=True))
 
     for key, value in update_data.items():
         setattr(db_subtask, key, value)
         
+    # Update parent memo completion status if completion status or time changed
+    if 'is_completed' in update_data or 'completed_at' in update_data:
+        _sync_memo_status(db, db_subtask.memo_id)
+    if 'content' in update_data or 'note' in update_data:
+        search.index_subtasks(db, [subtask_id])
     db.commit()
     db.refresh(db_subtask)
-    
-    # Update parent memo completion status if completion status or time changed
-    memo = db.query(models.Memo).filter(models.Memo.id == db_subtask.memo_id).first()
-    if memo:
-        _sync_memo_status(db, memo)
-        db.commit()
+    cache.invalidate_memo(db_subtask.memo_id)
         
     return db_subtask
 
+def batch_update_subtasks(db: Session, memo_id: int, changes: List[schemas.SubTaskBatchItem]):
+    """
+    Applies many subtask changes with bulk UPDATEs in one transaction and
+    recomputes memo completion once. Returns None if the memo does not exist;
+    raises ValueError if a change targets a subtask outside the memo.
+    """
+    if not db.query(models.Memo.id).filter(models.Memo.id == memo_id).first():
+        return None
+
+    ids = [c.id for c in changes]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate subtask id in batch")
+    owned = {
+        row.id for row in
+        db.query(models.SubTask.id).filter(models.SubTask.memo_id == memo_id, models.SubTask.id.in_(ids))
+    }
+    unknown = set(ids) - owned
+    if unknown:
+        raise ValueError(f"Subtasks not in memo {memo_id}: {sorted(unknown)}")
+
+    rows = []
+    for change in changes:
+        row = _normalize_subtask_times(change.dict(exclude_unset=True))
+        # Checking off without an explicit time stamps it now, like update_subtask_status
+        if 'is_completed' in row and 'completed_at' not in row:
+            row['completed_at'] = datetime.now() if row['is_completed'] else None
+        if len(row) > 1:
+            rows.append(row)
+
+    if rows:
+        # ORM bulk UPDATE by primary key; rows with the same keys share one executemany
+        db.execute(update(models.SubTask), rows)
+
+    if any('is_completed' in r or 'completed_at' in r for r in rows):
+        _sync_memo_status(db, memo_id)
+    search.index_subtasks(db, [r['id'] for r in rows if 'content' in r or 'note' in r])
+    db.commit()
+    cache.invalidate_memo(memo_id)
+    db.expire_all()
+    return get_memo(db, memo_id, eager=True)
+
+def get_blob(db: Session, sha256: str):
+    return db.query(models.AttachmentBlob).filter(models.AttachmentBlob.sha256 == sha256).first()
+
+def _release_blobs(db: Session, attachments_query):
+    """
+    Drops one reference per attachment in attachments_query (before it is
+    deleted) and deletes the blobs nothing references any more. Returns the
+    files those attachments leave unused; unlink them with _remove_files
+    after the commit.
+    """
+    Blob = models.AttachmentBlob
+    counts = (
+        attachments_query.filter(models.SubtaskAttachment.sha256.isnot(None))
+        .with_entities(models.SubtaskAttachment.sha256, func.count(models.SubtaskAttachment.id))
+        .group_by(models.SubtaskAttachment.sha256)
+        .all()
+    )
+    for sha256, count in counts:
+        db.query(Blob).filter(Blob.sha256 == sha256).update(
+            {Blob.ref_count: Blob.ref_count - count},
+            synchronize_session=False
+        )
+    # Legacy attachments own their file outright
+    unused = [
+        path for (path,) in
+        attachments_query.filter(models.SubtaskAttachment.sha256.is_(None))
+        .with_entities(models.SubtaskAttachment.file_path)
+    ]
+    if counts:
+        released = Blob.sha256.in_([sha256 for sha256, _ in counts]) & (Blob.ref_count <= 0)
+        unused += [path for (path,) in db.query(Blob.file_path).filter(released)]
+        db.query(Blob).filter(released).delete(synchronize_session=False)
+    return unused
+
+def _remove_files(paths):
+    # After the commit; failures are left for storage.collect_garbage
+    for path in paths:
+        storage.remove_attachment_file(path)
+
 def create_subtask_attachment(db: Session, attachment: schemas.SubtaskAttachmentCreate, subtask_id: int):
+    # The blob reference was already counted by storage.commit_blob
     db_attachment = models.SubtaskAttachment(**attachment.dict(), subtask_id=subtask_id)
     db.add(db_attachment)
     db.commit()
     db.refresh(db_attachment)
+    cache.invalidate_memo(_attachment_memo_id(db, db_attachment))
     return db_attachment
 
+def _attachment_memo_id(db: Session, attachment: models.SubtaskAttachment):
+    return db.query(models.SubTask.memo_id).filter(models.SubTask.id == attachment.subtask_id).scalar()
+
 def get_subtask_attachment(db: Session, attachment_id: int):
     return db.query(models.SubtaskAttachment).filter(models.SubtaskAttachment.id == attachment_id).first()
 
 def delete_subtask_attachment(db: Session, attachment_id: int):
+    """
+    Deletes the attachment row. Returns (attachment, unused_path) where
+    unused_path is the file nothing references any more (the legacy file, or
+    the blob when this was its last reference), or None.
+    """
     db_attachment = get_subtask_attachment(db, attachment_id)
-    if db_attachment:
-        db.delete(db_attachment)
-        db.commit()
-    return db_attachment
+    if not db_attachment:
+        return None, None
+
+    memo_id = _attachment_memo_id(db, db_attachment)
+    unused_paths = _release_blobs(db, db.query(models.SubtaskAttachment).filter(
+        models.SubtaskAttachment.id == attachment_id
+    ))
+    db.delete(db_attachment)
+    db.commit()
+    cache.invalidate_memo(memo_id)
+    return db_attachment, unused_paths[0] if unused_paths else None
 
 def update_subtask_attachment(db: Session, attachment_id: int, attachment: schemas.SubtaskAttachmentUpdate):
     db_attachment = get_subtask_attachment(db, attachment_id)
@@ -270,6 +675,7 @@ def update_subtask_attachment(db: Session, attachment_id: int, attachment: schem
         
     db.commit()
     db.refresh(db_attachment)
+    cache.invalidate_memo(_attachment_memo_id(db, db_attachment))
     return db_attachment
 
 def update_consumable(db: Session, consumable_id: int, consumable: schemas.ConsumableUpdate):
@@ -279,9 +685,11 @@ def update_consumable(db: Session, consumable_id: int, consumable: schemas.Consu
     
     for key, value in consumable.dict(exclude_unset=True).items():
         setattr(db_consumable, key, value)
+    consumable_status.refresh(db_consumable)
         
     db.commit()
     db.refresh(db_consumable)
+    cache.invalidate_consumables()
     return db_consumable
 
 def delete_consumable(db: Session, consumable_id: int):
@@ -289,8 +697,51 @@ def delete_consumable(db: Session, consumable_id: int):
     if db_consumable:
         db.delete(db_consumable)
         db.commit()
+        cache.invalidate_consumables()
     return db_consumable
 
+def record_mileage(db: Session, category: str, mileage: int):
+    """
+    Sets current_mileage of every consumable in category with one UPDATE,
+    recomputing status in the same statement. Returns (rows updated, the
+    consumables whose status changed).
+    """
+    if mileage < 0:
+        raise ValueError("Mileage must not be negative")
+    Consumable = models.Consumable
+    now = datetime.now()
+    has_due = or_(Consumable.next_due_at.isnot(None), Consumable.next_due_km.isnot(None))
+    # Items with no due date or distance keep their manual status
+    new_status = case((has_due, consumable_status.status_expression(now, mileage=mileage)), else_=Consumable.status)
+    new_rank = case((has_due, consumable_status.rank_expression(new_status)), else_=Consumable.status_rank)
+
+    # Locks the category's rows on MySQL until the UPDATE commits
+    changed = dict(
+        db.query(Consumable.id, new_status)
+        .filter(Consumable.category == category, Consumable.status != new_status)
+        .with_for_update()
+    )
+    updated = db.query(Consumable).filter(Consumable.category == category).update(
+        {Consumable.current_mileage: mileage, Consumable.status: new_status, Consumable.status_rank: new_rank},
+        synchronize_session=False
+    )
+    db.commit()
+    cache.invalidate_consumables()
+
+    for status, event in scheduler.CONSUMABLE_EVENTS.items():
+        ids = sorted(i for i, s in changed.items() if s == status)
+        if ids:
+            scheduler.emit(event, ids)
+
+    consumables = []
+    if changed:
+        consumables = (
+            db.query(Consumable).options(*_consumable_load_options())
+            .filter(Consumable.id.in_(changed)).order_by(Consumable.id).all()
+        )
+        consumable_analytics.load_latest_logs(db, consumables)
+    return updated, consumables
+
 def replace_consumable(db: Session, consumable_id: int, replaced_at: datetime, mileage: int = None, note: str = None):
     # Ensure replaced_at is datetime (naive) for DB compatibility
     if isinstance(replaced_at, date) and not isinstance(replaced_at, datetime):
@@ -327,6 +778,7 @@ def replace_consumable(db: Session, consumable_id: int, replaced_at: datetime, m
         note=note
     )
     db.add(log)
+    consumable_analytics.record_log(db, db_consumable, log)
     
     # Update Consumable
     db_consumable.last_replaced = replaced_at
@@ -334,9 +786,12 @@ def replace_consumable(db: Session, consumable_id: int, replaced_at: datetime, m
         db_consumable.mileage = mileage
         db_consumable.current_mileage = mileage
     
-    # Reset status to normal? Or let user/logic handle it. Usually replacing makes it 'Normal'
+    # Replacing usually makes it 'Normal'; items with a due date or distance
+    # get the derived status instead
     db_consumable.status = '正常'
+    consumable_status.refresh(db_consumable)
     
     db.commit()
     db.refresh(db_consumable)
+    cache.invalidate_consumables()
     return db_consumable
@@ -1,26 +1,62 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, timezone, timedelta
-import shutil
+from typing import List, Optional, Union
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+import logging
 import os
-import uuid
+from starlette.concurrency import run_in_threadpool
 from . import crud, models, schemas
-from .database import SessionLocal, engine
+from .pagination import InvalidCursor
+from .cache import cache
+from .serializers import JSONBytesResponse, dumps, to_cn_time, attachment_to_dict, memo_to_dict, consumable_to_dict, consumable_log_to_dict
+from . import storage, previews, transfer, search, migrations, metrics, consumable_status, consumable_analytics
+from .scheduler import SCHEDULER_ENABLED, scheduler
+from .storage import UPLOAD_DIR
+from .database import SessionLocal, get_engine, get_async_engine, dispose_engines, run_in_session
+from .pool import pool_status
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# What each worker does with the schema when it starts (SCHEMA_CHECK):
+#   create  create missing tables (default, convenient for development)
+#   verify  refuse to start until `python migrate.py` has been run
+#   skip    nothing; the first request opens the first connection
+# Deploys run migrate.py once and start workers with verify or skip.
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "create").lower()
 
-# Create uploads directory if not exists
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+def _prepare_schema():
+    if SCHEMA_CHECK == "skip":
+        return
+    engine = get_engine()
+    if SCHEMA_CHECK == "verify":
+        pending = migrations.pending_migrations(engine)
+        if pending:
+            raise RuntimeError(f"{len(pending)} schema migration(s) pending; run `python migrate.py`")
+    else:
+        models.Base.metadata.create_all(bind=engine)
 
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    await run_in_threadpool(_prepare_schema)
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    previews.shutdown()
+    await dispose_engines()
 
+app = FastAPI(lifespan=lifespan)
+
+# The directory is created by lifespan, so don't require it at import
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,66 +72,46 @@ def get_db():
     finally:
         db.close()
 
-CN_TZ = timezone(timedelta(hours=8))
-
-def to_cn_time(dt):
-    if not dt:
-        return None
-    if dt.tzinfo is None:
-        return dt.strftime("%Y-%m-%d %H:%M")
-    return dt.astimezone(CN_TZ).strftime("%Y-%m-%d %H:%M")
-
-# Memos
-def memo_to_dict(memo):
-    return {
-        "id": memo.id,
-        "title": memo.title,
-        "content": memo.content,
-        "category": memo.category,
-        "created_at": to_cn_time(memo.created_at),
-        "updated_at": to_cn_time(memo.updated_at),
-        "completed_at": to_cn_time(memo.completed_at),
-        "deadline": to_cn_time(memo.deadline),
-        "subtasks": [
-            {
-                "id": st.id,
-                "content": st.content,
-                "is_completed": st.is_completed,
-                "order": st.order,
-                "created_at": to_cn_time(st.created_at),
-                "start_time": to_cn_time(st.start_time),
-                "completed_at": to_cn_time(st.completed_at),
-                "note": st.note,
-                "attachments": [
-                    {
-                        "id": att.id,
-                        "filename": att.filename,
-                        "file_path": att.file_path,
-                        "file_size": att.file_size,
-                        "content_type": att.content_type,
-                        "created_at": to_cn_time(att.created_at)
-                    } for att in st.attachments
-                ]
-            } for st in sorted(memo.subtasks, key=lambda x: x.order)
-        ]
-    }
-
 @app.post("/memos/", response_model=dict)
 def create_memo(memo: schemas.MemoCreate, db: Session = Depends(get_db)):
     db_memo = crud.create_memo(db, memo)
     return memo_to_dict(db_memo)
 
-@app.get("/memos/", response_model=List[dict])
-def read_memos(skip: int = 0, limit: int = 100, category: str = None, db: Session = Depends(get_db)):
-    memos = crud.get_memos(db, skip=skip, limit=limit, category=category)
-    return [memo_to_dict(memo) for memo in memos]
+# Read routes are async: cache hits never leave the event loop, and misses
+# go through run_in_session (AsyncSession with DB_ASYNC=1, else thread pool).
+@app.get("/memos/", response_model=Union[List[dict], dict])
+async def read_memos(skip: int = 0, limit: int = 100, category: str = None, cursor: Optional[str] = None):
+    # Passing `cursor` (empty for the first page) switches to keyset pagination
+    # and wraps the page as {"items": [...], "next_cursor": ...}.
+    if cursor is not None:
+        def load_page(db: Session):
+            memos, next_cursor = crud.get_memos_page(db, cursor=cursor, limit=limit, category=category)
+            return {"items": [memo_to_dict(memo) for memo in memos], "next_cursor": next_cursor}
+        try:
+            return JSONBytesResponse(await cache.aget_or_set(
+                cache.memo_list_key(cursor=cursor, limit=limit, category=category),
+                lambda: run_in_session(load_page)
+            ))
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def load_list(db: Session):
+        memos = crud.get_memos(db, skip=skip, limit=limit, category=category)
+        return [memo_to_dict(memo) for memo in memos]
+    return JSONBytesResponse(await cache.aget_or_set(
+        cache.memo_list_key(skip=skip, limit=limit, category=category),
+        lambda: run_in_session(load_list)
+    ))
 
 @app.get("/memos/{memo_id}", response_model=dict)
-def read_memo(memo_id: int, db: Session = Depends(get_db)):
-    db_memo = crud.get_memo(db, memo_id)
-    if db_memo is None:
+async def read_memo(memo_id: int):
+    def load(db: Session):
+        db_memo = crud.get_memo(db, memo_id, eager=True)
+        return memo_to_dict(db_memo) if db_memo else None
+    raw = await cache.aget_or_set(cache.memo_key(memo_id), lambda: run_in_session(load))
+    if raw is None:
         raise HTTPException(status_code=404, detail="Memo not found")
-    return memo_to_dict(db_memo)
+    return JSONBytesResponse(raw)
 
 @app.put("/memos/{memo_id}", response_model=dict)
 def update_memo(memo_id: int, memo: schemas.MemoUpdate, db: Session = Depends(get_db)):
@@ -126,6 +142,42 @@ def update_subtask_status(subtask_id: int, status: schemas.SubTaskUpdate, db: Se
         "completed_at": to_cn_time(db_subtask.completed_at)
     }
 
+@app.patch("/memos/{memo_id}/subtasks:batch", response_model=dict)
+def batch_update_subtasks(memo_id: int, changes: List[schemas.SubTaskBatchItem], db: Session = Depends(get_db)):
+    try:
+        db_memo = crud.batch_update_subtasks(db, memo_id, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_memo is None:
+        raise HTTPException(status_code=404, detail="Memo not found")
+    return memo_to_dict(db_memo)
+
+def _rebalance_subtask_order(memo_id: int):
+    # Runs after the response, so it needs its own session
+    db = SessionLocal()
+    try:
+        crud.rebalance_subtask_order(db, memo_id)
+    finally:
+        db.close()
+
+@app.post("/subtasks/{subtask_id}/move", response_model=dict)
+def move_subtask(subtask_id: int, move: schemas.SubTaskMove, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    try:
+        result = crud.move_subtask(db, subtask_id, before_id=move.before_id, after_id=move.after_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Subtask not found")
+
+    db_subtask, dense = result
+    if dense:
+        background_tasks.add_task(_rebalance_subtask_order, db_subtask.memo_id)
+    return {
+        "id": db_subtask.id,
+        "memo_id": db_subtask.memo_id,
+        "order": db_subtask.order
+    }
+
 @app.put("/subtasks/{subtask_id}", response_model=dict)
 def update_subtask(subtask_id: int, subtask: schemas.SubTaskUpdate, db: Session = Depends(get_db)):
     db_subtask = crud.update_subtask(db, subtask_id, subtask)
@@ -141,121 +193,303 @@ def update_subtask(subtask_id: int, subtask: schemas.SubTaskUpdate, db: Session
         "completed_at": to_cn_time(db_subtask.completed_at)
     }
 
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
 @app.post("/subtasks/{subtask_id}/attachments", response_model=dict)
-async def upload_subtask_attachment(subtask_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_subtask_attachment(subtask_id: int, request: Request, db: Session = Depends(get_db)):
     # Verify subtask exists
-    subtask = db.query(models.SubTask).filter(models.SubTask.id == subtask_id).first()
+    subtask = await run_in_threadpool(crud.get_subtask, db, subtask_id)
     if not subtask:
         raise HTTPException(status_code=404, detail="Subtask not found")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > storage.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail="File too large")
 
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # The multipart body is parsed as it arrives (not spooled like File(...)),
+    # and saved in chunks off the event loop, hashing as we write
+    file = {}
+    tmp_path = storage.new_temp_path()
+    try:
+        file_size, sha256 = await storage.save_stream(
+            storage.multipart_file(request.stream(), request.headers.get("content-type", ""), "file", file),
+            tmp_path, max_size=storage.MAX_UPLOAD_SIZE
+        )
+    except storage.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    except storage.InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Identical content is stored once
+    file_path = await run_in_threadpool(storage.commit_blob, db, tmp_path, sha256, file["filename"], file_size)
 
     # Create DB record
     attachment_data = schemas.SubtaskAttachmentCreate(
-        filename=file.filename,
+        filename=file["filename"],
         file_path=file_path,
-        file_size=os.path.getsize(file_path),
-        content_type=file.content_type or "application/octet-stream"
+        file_size=file_size,
+        content_type=file["content_type"] or "application/octet-stream",
+        sha256=sha256
     )
     
-    db_attachment = crud.create_subtask_attachment(db, attachment_data, subtask_id)
+    db_attachment = await run_in_threadpool(crud.create_subtask_attachment, db, attachment_data, subtask_id)
+    # Thumbnail / PDF preview is generated in the background
+    previews.schedule_preview(db_attachment.file_path, db_attachment.content_type)
+
+    return attachment_to_dict(db_attachment)
 
+# Resumable uploads: start with the declared size, then PATCH chunks at the
+# current offset until complete. GET returns the offset to resume from.
+def upload_state_to_dict(state):
     return {
-        "id": db_attachment.id,
-        "filename": db_attachment.filename,
-        "file_path": db_attachment.file_path,
-        "file_size": db_attachment.file_size,
-        "content_type": db_attachment.content_type,
-        "created_at": to_cn_time(db_attachment.created_at)
+        "upload_id": state["upload_id"],
+        "subtask_id": state["subtask_id"],
+        "filename": state["filename"],
+        "size": state["size"],
+        "offset": state["offset"]
     }
 
+@app.post("/subtasks/{subtask_id}/uploads", response_model=dict)
+def start_attachment_upload(subtask_id: int, upload: schemas.AttachmentUploadStart, db: Session = Depends(get_db)):
+    if not crud.get_subtask(db, subtask_id):
+        raise HTTPException(status_code=404, detail="Subtask not found")
+    try:
+        state = storage.start_upload(subtask_id, upload.filename, upload.content_type, upload.size)
+    except storage.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    return upload_state_to_dict(state)
+
+@app.get("/attachment-uploads/{upload_id}", response_model=dict)
+def read_attachment_upload(upload_id: str):
+    try:
+        return upload_state_to_dict(storage.get_upload(upload_id))
+    except storage.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.patch("/attachment-uploads/{upload_id}", response_model=dict)
+async def append_attachment_upload(upload_id: str, offset: int, request: Request, db: Session = Depends(get_db)):
+    # One request at a time per upload, from the append through completion
+    try:
+        with storage.upload_lock(upload_id):
+            return await _append_attachment_upload(upload_id, offset, request, db)
+    except storage.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except storage.UploadBusy:
+        raise HTTPException(status_code=409, detail="Upload in progress")
+
+async def _append_attachment_upload(upload_id: str, offset: int, request: Request, db: Session):
+    try:
+        state = await storage.append_upload(upload_id, offset, request.stream())
+    except storage.UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": e.offset})
+    except storage.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Chunk exceeds declared upload size")
+
+    result = upload_state_to_dict(state)
+    if state["offset"] < state["size"]:
+        return result
+
+    finished = await run_in_threadpool(storage.finish_upload, state)
+    if finished is None:
+        # Another request completed it
+        raise storage.UploadNotFound(upload_id)
+    data_path, file_size, sha256 = finished
+    file_path = await run_in_threadpool(storage.commit_blob, db, data_path, sha256, state["filename"], file_size)
+    attachment_data = schemas.SubtaskAttachmentCreate(
+        filename=state["filename"],
+        file_path=file_path,
+        file_size=file_size,
+        content_type=state["content_type"] or "application/octet-stream",
+        sha256=sha256
+    )
+    db_attachment = await run_in_threadpool(crud.create_subtask_attachment, db, attachment_data, state["subtask_id"])
+    previews.schedule_preview(db_attachment.file_path, db_attachment.content_type)
+    result["attachment"] = attachment_to_dict(db_attachment)
+    return result
+
+@app.delete("/attachment-uploads/{upload_id}", response_model=dict)
+def cancel_attachment_upload(upload_id: str):
+    try:
+        with storage.upload_lock(upload_id):
+            state = storage.get_upload(upload_id)
+            storage.cancel_upload(upload_id)
+    except storage.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except storage.UploadBusy:
+        raise HTTPException(status_code=409, detail="Upload in progress")
+    return upload_state_to_dict(state)
+
 @app.delete("/attachments/{attachment_id}", response_model=dict)
 def delete_attachment(attachment_id: int, db: Session = Depends(get_db)):
-    # Get attachment to find file path
-    db_attachment = crud.get_subtask_attachment(db, attachment_id)
-    if not db_attachment:
+    # Delete DB record; the file is shared with other attachments of the same content
+    deleted_attachment, unused_path = crud.delete_subtask_attachment(db, attachment_id)
+    if not deleted_attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
-    
-    # Delete file from disk
-    if db_attachment.file_path and os.path.exists(db_attachment.file_path):
-        try:
-            os.remove(db_attachment.file_path)
-        except Exception as e:
-            print(f"Error deleting file {db_attachment.file_path}: {e}")
-            # Continue to delete DB record even if file deletion fails
-            
-    # Delete DB record
-    deleted_attachment = crud.delete_subtask_attachment(db, attachment_id)
+
+    # Delete file from disk once nothing references it.
+    # Continue even if file deletion fails; storage.collect_garbage cleans up.
+    storage.remove_attachment_file(unused_path)
     
     return {
         "id": deleted_attachment.id,
         "filename": deleted_attachment.filename
     }
 
+# Attachment content is immutable per id, so clients may cache it indefinitely
+ATTACHMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def _not_modified(request: Request, etag: str, stat_result):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since.timestamp()
+    return False
+
+@app.api_route("/attachments/{attachment_id}/content", methods=["GET", "HEAD"])
+def download_attachment(attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    db_attachment = crud.get_subtask_attachment(db, attachment_id)
+    if not db_attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    try:
+        stat_result = os.stat(db_attachment.file_path)
+    except (OSError, TypeError):
+        raise HTTPException(status_code=404, detail="Attachment file missing")
+
+    # Strong ETag from the content hash; legacy rows fall back to size + mtime
+    if db_attachment.sha256:
+        etag = f'"{db_attachment.sha256}"'
+    else:
+        etag = f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        "etag": etag,
+        "cache-control": ATTACHMENT_CACHE_CONTROL,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+
+    if _not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse serves Range / If-Range and uses zero-copy pathsend when the server supports it
+    return FileResponse(
+        db_attachment.file_path,
+        headers=headers,
+        media_type=db_attachment.content_type,
+        filename=db_attachment.filename,
+        stat_result=stat_result,
+        content_disposition_type="inline",
+    )
+
+@app.api_route("/attachments/{attachment_id}/preview", methods=["GET", "HEAD"])
+def preview_attachment(attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    db_attachment = crud.get_subtask_attachment(db, attachment_id)
+    if not db_attachment or not previews.is_previewable(db_attachment.content_type):
+        raise HTTPException(status_code=404, detail="Preview not available")
+
+    path = storage.preview_path(db_attachment.file_path)
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        # Not generated yet (or lost); queue it and let the client retry
+        previews.schedule_preview(db_attachment.file_path, db_attachment.content_type)
+        raise HTTPException(status_code=404, detail="Preview not ready")
+
+    etag = f'"{db_attachment.sha256}-preview"' if db_attachment.sha256 else f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        "etag": etag,
+        "cache-control": ATTACHMENT_CACHE_CONTROL,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    if _not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers, media_type="image/jpeg", stat_result=stat_result)
+
 @app.put("/attachments/{attachment_id}", response_model=dict)
 def update_attachment(attachment_id: int, attachment: schemas.SubtaskAttachmentUpdate, db: Session = Depends(get_db)):
     db_attachment = crud.update_subtask_attachment(db, attachment_id, attachment)
     if not db_attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
     
-    return {
-        "id": db_attachment.id,
-        "filename": db_attachment.filename,
-        "file_path": db_attachment.file_path,
-        "file_size": db_attachment.file_size,
-        "content_type": db_attachment.content_type,
-        "created_at": to_cn_time(db_attachment.created_at)
-    }
+    return attachment_to_dict(db_attachment)
 
 # Templates
 @app.post("/templates/", response_model=schemas.Template)
 def create_template(template: schemas.TemplateCreate, db: Session = Depends(get_db)):
     return crud.create_template(db, template)
 
+@app.post("/templates/{template_id}/instantiate", response_model=List[dict])
+def instantiate_template(template_id: int, data: schemas.TemplateInstantiate, db: Session = Depends(get_db)):
+    try:
+        memos = crud.instantiate_template(db, template_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if memos is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return JSONBytesResponse(dumps([memo_to_dict(m) for m in memos]))
+
 @app.get("/templates/", response_model=List[schemas.Template])
-def read_templates(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_templates(db, skip=skip, limit=limit)
+async def read_templates(skip: int = 0, limit: int = 100):
+    def load(db: Session):
+        return [schemas.Template.model_validate(t) for t in crud.get_templates(db, skip=skip, limit=limit)]
+    return await run_in_session(load)
 
 # Consumables
-def consumable_to_dict(c):
-    return {
-        "id": c.id,
-        "name": c.name,
-        "tag": c.tag,
-        "category": c.category,
-        "model_spec": c.model_spec,
-        "status": c.status,
-        "last_replaced": c.last_replaced.isoformat() if c.last_replaced else None,
-        "lifespan": c.lifespan,
-        "expiry_date": c.expiry_date.isoformat() if c.expiry_date else None,
-        "mileage": c.mileage,
-        "current_mileage": c.current_mileage,
-        "created_at": to_cn_time(c.created_at),
-        "updated_at": to_cn_time(c.updated_at),
-        "logs": [
-            {
-                "id": l.id,
-                "replaced_at": l.replaced_at.isoformat(),
-                "mileage": l.mileage,
-                "days_since_last": l.days_since_last,
-                "km_since_last": l.km_since_last,
-                "note": l.note,
-                "created_at": to_cn_time(l.created_at)
-            } for l in sorted(c.logs, key=lambda x: x.replaced_at, reverse=True)
-        ]
-    }
+@app.get("/consumables/", response_model=Union[List[dict], dict])
+async def read_consumables(skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    if cursor is not None:
+        def load_page(db: Session):
+            consumables, next_cursor = crud.get_consumables_page(db, cursor=cursor, limit=limit)
+            return {"items": [consumable_to_dict(c) for c in consumables], "next_cursor": next_cursor}
+        try:
+            return JSONBytesResponse(await cache.aget_or_set(
+                cache.consumable_list_key(cursor=cursor, limit=limit),
+                lambda: run_in_session(load_page)
+            ))
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def load_list(db: Session):
+        consumables = crud.get_consumables(db, skip=skip, limit=limit)
+        return [consumable_to_dict(c) for c in consumables]
+    return JSONBytesResponse(await cache.aget_or_set(
+        cache.consumable_list_key(skip=skip, limit=limit),
+        lambda: run_in_session(load_list)
+    ))
 
-@app.get("/consumables/", response_model=List[dict])
-def read_consumables(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    consumables = crud.get_consumables(db, skip=skip, limit=limit)
-    return [consumable_to_dict(c) for c in consumables]
+@app.get("/consumables/due", response_model=List[dict])
+async def read_due_consumables(days: int = consumable_status.DUE_SOON_DAYS, limit: int = 100):
+    # Relative to now, so not served from the payload cache
+    def load(db: Session):
+        return [consumable_to_dict(c) for c in crud.get_due_consumables(db, within_days=days, limit=limit)]
+    return JSONBytesResponse(dumps(await run_in_session(load)))
+
+@app.get("/consumables/analytics", response_model=dict)
+async def read_consumable_analytics(category: Optional[str] = None):
+    return JSONBytesResponse(await cache.aget_or_set(
+        cache.consumable_list_key(view="analytics", category=category),
+        lambda: run_in_session(consumable_analytics.analytics, category=category)
+    ))
+
+@app.get("/consumables/{consumable_id}/logs", response_model=List[dict])
+def read_consumable_logs(consumable_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.get_consumable(db, consumable_id) is None:
+        raise HTTPException(status_code=404, detail="Consumable not found")
+    return [consumable_log_to_dict(l) for l in crud.get_consumable_logs(db, consumable_id, skip=skip, limit=limit)]
+
+@app.post("/consumables/mileage", response_model=dict)
+def record_mileage(reading: schemas.ConsumableMileage, db: Session = Depends(get_db)):
+    try:
+        updated, changed = crud.record_mileage(db, reading.category, reading.mileage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"updated": updated, "changed": [consumable_to_dict(c) for c in changed]}
 
 @app.post("/consumables/", response_model=dict)
 def create_consumable(consumable: schemas.ConsumableCreate, db: Session = Depends(get_db)):
@@ -282,9 +516,10 @@ def replace_consumable(consumable_id: int, replace_data: schemas.ConsumableRepla
         if not db_consumable:
             raise HTTPException(status_code=404, detail="Consumable not found")
         return consumable_to_dict(db_consumable)
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Replacing consumable %s failed", consumable_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/consumables/{consumable_id}", response_model=dict)
@@ -293,3 +528,76 @@ def delete_consumable(consumable_id: int, db: Session = Depends(get_db)):
     if not db_consumable:
         raise HTTPException(status_code=404, detail="Consumable not found")
     return consumable_to_dict(db_consumable)
+
+# Search
+@app.get("/search", response_model=dict)
+def search_memos(q: str, limit: int = search.DEFAULT_LIMIT, db: Session = Depends(get_db)):
+    return {"query": q, "results": search.search(db, q, limit)}
+
+# Export / import
+IMPORT_MAX_SIZE = int(os.getenv("IMPORT_MAX_SIZE", str(4 * 1024 * 1024 * 1024)))
+
+@app.get("/export")
+def export_data():
+    # The stream outlives the request dependencies, so it owns its session
+    def generate():
+        db = SessionLocal()
+        try:
+            yield from transfer.export_ndjson(db)
+        finally:
+            db.close()
+
+    filename = f"notebook-export-{datetime.now():%Y%m%d-%H%M%S}.ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"content-disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _import_file(db: Session, path: str):
+    with open(path, "rb") as f:
+        return transfer.import_ndjson(db, f)
+
+@app.post("/import", response_model=dict)
+async def import_data(request: Request, db: Session = Depends(get_db)):
+    # Spool the body to disk so memory stays flat, then import on the thread pool
+    tmp_path = storage.new_temp_path()
+    try:
+        try:
+            await storage.save_stream(request.stream(), tmp_path, max_size=IMPORT_MAX_SIZE)
+        except storage.UploadTooLarge:
+            raise HTTPException(status_code=413, detail="Import too large")
+        try:
+            counts = await run_in_threadpool(_import_file, db, tmp_path)
+        except transfer.InvalidImport as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except transfer.ImportConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        storage.remove_file(tmp_path)
+    return {"imported": counts}
+
+# Metrics
+@app.get("/metrics")
+def read_metrics():
+    return Response(
+        metrics.render(pool=pool_status(get_engine()), cache_stats=cache.stats()),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+# Debug
+@app.get("/debug/cache", response_model=dict)
+def read_cache_stats():
+    return cache.stats()
+
+@app.get("/debug/storage", response_model=dict)
+def read_storage_stats(db: Session = Depends(get_db)):
+    return storage.storage_stats(db)
+
+@app.get("/debug/pool", response_model=dict)
+def read_pool_status():
+    status = pool_status(get_engine())
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine)
+    return status
@@ -0,0 +1,271 @@
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Per-request timing and SQL profiling.
+#
+# MetricsMiddleware times every request, and SQLAlchemy cursor events (on
+# every Engine, async engines included) add each statement's time to the
+# request's RequestStats, found through a context variable, which is copied
+# into thread-pool calls and run_sync greenlets. Each response gets a
+# Server-Timing header. Aggregates are rendered in the Prometheus text
+# format by render(); they are per worker process, so scrape every worker.
+#
+# A request that runs one statement more than N_PLUS_ONE_THRESHOLD times is
+# flagged as a likely N+1 (a lazy load in a loop) and logged.
+#
+# With PROFILING_ENABLED=1, adding ?profile=1 or an "X-Profile: 1" header
+# samples the stacks of app code while the request runs and returns them in
+# folded format (for flamegraph.pl or speedscope) instead of the response.
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        return [(sql, n) for sql, n in self.statements.most_common() if n > threshold]
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+def current_stats():
+    return _current.get()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_start")
+    if starts:
+        stats.sql_seconds += time.perf_counter() - starts.pop()
+    stats.queries += 1
+    stats.statements[statement] += 1
+
+# Prometheus metrics
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+class Histogram:
+    def __init__(self, name, help, label_names, buckets):
+        self.name, self.help = name, help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, (counts, count, total) in items:
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': repr(float(bound))})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+class CounterMetric:
+    def __init__(self, name, help, label_names):
+        self.name, self.help = name, help
+        self.label_names = label_names
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *label_values):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(dict(zip(self.label_names, label_values)))} {value}")
+        return lines
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+SQL_SECONDS = CounterMetric("db_query_seconds_total", "Time spent in SQL statements.", ("method", "route"))
+N_PLUS_ONE = CounterMetric(
+    "db_n_plus_one_requests_total", "Requests that repeated one statement more than the N+1 threshold.",
+    ("method", "route")
+)
+METRICS = [REQUEST_SECONDS, REQUEST_QUERIES, SQL_SECONDS, N_PLUS_ONE]
+
+def _gauge(name, help, value, kind="gauge"):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+def render(pool=None, cache_stats=None):
+    """Prometheus text exposition of the request metrics plus pool and cache state."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    if pool:
+        if "checked_out" in pool:
+            lines += _gauge("db_pool_checked_out", "Connections in use.", pool["checked_out"])
+            lines += _gauge("db_pool_overflow", "Connections beyond pool_size.", pool["overflow"])
+            lines += _gauge("db_pool_size", "Configured pool_size.", pool["size"])
+        if "checkouts" in pool:
+            lines += _gauge("db_pool_checkouts_total", "Connection checkouts.", pool["checkouts"], "counter")
+            lines += _gauge("db_pool_timeouts_total", "Checkouts that timed out.", pool["timeouts"], "counter")
+            lines += _gauge("db_pool_wait_seconds_total", "Time spent waiting for a connection.",
+                            pool["wait_seconds_total"], "counter")
+    if cache_stats:
+        lines += _gauge("cache_hits_total", "Payload cache hits.", cache_stats["hits"], "counter")
+        lines += _gauge("cache_misses_total", "Payload cache misses.", cache_stats["misses"], "counter")
+    return "\n".join(lines) + "\n"
+
+# Sampling profiler
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class StackSampler:
+    """Samples other threads' stacks that pass through app code, every interval seconds."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack, in_app = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(APP_DIR)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_app:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+# Middleware
+def _wants_profile(scope):
+    if not PROFILING_ENABLED:
+        return False
+    if b"profile=1" in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(k == b"x-profile" and v == b"1" for k, v in scope.get("headers", []))
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = (f'app;dur={total_ms:.1f}, '
+                          f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"')
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"timing-allow-origin", b"*"),
+                ]
+            await send(message)
+
+        try:
+            if _wants_profile(scope):
+                await self._profile(scope, receive, send)
+            else:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._record(scope, status, time.perf_counter() - start, stats)
+
+    async def _profile(self, scope, receive, send):
+        async def discard(message):
+            pass
+
+        with StackSampler() as sampler:
+            await self.app(scope, receive, discard)
+        body = sampler.folded().encode() or b"no samples\n"
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+        await send({"type": "http.response.body", "body": body})
+
+    def _record(self, scope, status, seconds, stats):
+        # Route templates, not raw paths, keep label cardinality bounded
+        route = getattr(scope.get("route"), "path", "unmatched")
+        method = scope["method"]
+        REQUEST_SECONDS.observe(seconds, method, route, str(status))
+        REQUEST_QUERIES.observe(stats.queries, method, route)
+        SQL_SECONDS.inc(stats.sql_seconds, method, route)
+
+        repeated = stats.repeated_statements()
+        if repeated:
+            N_PLUS_ONE.inc(1, method, route)
+            sql, count = repeated[0]
+            logger.warning("Possible N+1 on %s %s: statement ran %d times: %s",
+                           method, route, count, " ".join(sql.split())[:200])
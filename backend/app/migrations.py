@@ -0,0 +1,348 @@
+import time
+from sqlalchemy import Float, inspect, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+from . import models, search, consumable_status, consumable_analytics
+from .ordering import ORDER_STEP
+
+# Versioned schema migrations.
+#
+# Each step is a function registered with @migration(version, name) and is
+# written to be idempotent: it inspects the live schema and only issues the
+# DDL that is missing, so it is safe on databases that ran the old one-off
+# scripts by hand and on fresh databases built by create_all. Applied
+# versions are recorded in schema_version; `python migrate.py` runs the
+# pending ones in order, and --dry-run prints the statements instead.
+#
+# Backfills run in primary-key batches of BACKFILL_BATCH_SIZE rows, one
+# short transaction each, so they hold row locks briefly instead of
+# locking a whole table for one long UPDATE.
+
+BACKFILL_BATCH_SIZE = 5000
+
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    def register(fn):
+        assert all(m[0] < version for m in MIGRATIONS), "migrations must be registered in order"
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+class MigrationContext:
+    def __init__(self, engine, dry_run: bool = False, batch_size: int = BACKFILL_BATCH_SIZE,
+                 batch_pause: float = 0.0, log=print):
+        self.engine = engine
+        self.dialect = engine.dialect
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.log = log
+        self.statements = []
+        # Tables create_all is about to make (dry run only); steps skip them
+        self.created_tables = set()
+
+    # Schema inspection; a fresh inspector each time so earlier DDL is seen
+    def has_table(self, table: str):
+        return table in self.created_tables or inspect(self.engine).has_table(table)
+
+    def has_column(self, table: str, column: str):
+        if table in self.created_tables:
+            return True
+        if not self.has_table(table):
+            return False
+        return any(c["name"] == column for c in inspect(self.engine).get_columns(table))
+
+    def column_type(self, table: str, column: str):
+        return next(c["type"] for c in inspect(self.engine).get_columns(table) if c["name"] == column)
+
+    def has_index(self, table: str, columns):
+        """True if any index (including one backing a foreign key) starts with columns."""
+        columns = list(columns)
+        return any(
+            ix["column_names"][:len(columns)] == columns
+            for ix in inspect(self.engine).get_indexes(table)
+        )
+
+    def quote(self, name: str):
+        return self.dialect.identifier_preparer.quote(name)
+
+    # Changes
+    def execute(self, sql: str, params: dict = None):
+        self.statements.append(sql)
+        if self.dry_run:
+            self.log(f"  would run: {sql}")
+            return None
+        self.log(f"  {sql}")
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def create_table(self, model):
+        if not self.has_table(model.__tablename__):
+            self.execute(str(CreateTable(model.__table__).compile(dialect=self.dialect)).strip())
+
+    def add_column(self, model, column: str, default_sql: str = None):
+        table = model.__tablename__
+        if not self.has_table(table) or self.has_column(table, column):
+            return False
+        col = model.__table__.c[column]
+        ddl = f"ALTER TABLE {table} ADD COLUMN {self.quote(column)} {col.type.compile(dialect=self.dialect)}"
+        if default_sql is not None:
+            ddl += f" DEFAULT {default_sql}"
+        self.execute(ddl)
+        return True
+
+    def create_index(self, index):
+        """Creates a models.py Index (or index=True column index) if no index covers it."""
+        columns = [c.name for c in index.columns]
+        table = index.table.name
+        if table in self.created_tables or not self.has_table(table) or self.has_index(table, columns):
+            return
+        self.execute(str(CreateIndex(index).compile(dialect=self.dialect)))
+
+    def drop_index(self, table: str, name: str):
+        if table in self.created_tables or not self.has_table(table):
+            return
+        if name not in {ix["name"] for ix in inspect(self.engine).get_indexes(table)}:
+            return
+        ddl = f"DROP INDEX {self.quote(name)}"
+        if self.dialect.name == "mysql":
+            ddl += f" ON {table}"
+        self.execute(ddl)
+
+    def backfill(self, table: str, assignments: str, where: str, params: dict = None, key: str = "id"):
+        """
+        UPDATE table SET assignments WHERE where, in batches of key ranges
+        (:batch_lo <= key < :batch_hi, also usable in where).
+        """
+        if table in self.created_tables or not self.has_table(table):
+            return
+        with self.engine.connect() as conn:
+            lo, hi = conn.execute(text(f"SELECT MIN({key}), MAX({key}) FROM {table}")).one()
+        if lo is None:
+            return
+        sql = f"UPDATE {table} SET {assignments} WHERE {key} >= :batch_lo AND {key} < :batch_hi AND ({where})"
+        batches = (hi - lo) // self.batch_size + 1
+        if self.dry_run:
+            self.statements.append(sql)
+            self.log(f"  would run in {batches} batch(es) of {self.batch_size}: {sql}")
+            return
+        self.log(f"  {sql}  [{batches} batch(es)]")
+        updated = 0
+        for start in range(lo, hi + 1, self.batch_size):
+            with self.engine.begin() as conn:
+                result = conn.execute(text(sql), {**(params or {}), "batch_lo": start, "batch_hi": start + self.batch_size})
+                updated += result.rowcount
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+        self.log(f"  updated {updated} row(s)")
+
+def _index(model, name):
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+# Steps. Versions 1-8 replace the scripts that used to live in backend/
+# (add_columns.py, add_note_column.py, add_order_column.py,
+# migrate_category_template.py, app/migrate_db.py,
+# app/migrate_subtask_start_time.py, migrate_fractional_order.py,
+# add_sha256_column.py, add_pagination_indexes.py, add_fulltext_indexes.py).
+
+@migration(1, "memo categories and templates")
+def _categories_and_templates(ctx: MigrationContext):
+    ctx.add_column(models.Memo, "category", "'work'")
+    ctx.create_table(models.Template)
+    ctx.create_table(models.TemplateSubTask)
+
+@migration(2, "subtask timestamps, note and order")
+def _subtask_columns(ctx: MigrationContext):
+    ctx.add_column(models.SubTask, "created_at")
+    ctx.add_column(models.SubTask, "completed_at")
+    ctx.add_column(models.SubTask, "note")
+    ctx.add_column(models.SubTask, "order", "0")
+    ctx.add_column(models.SubTask, "start_time")
+
+@migration(3, "consumable current_mileage")
+def _current_mileage(ctx: MigrationContext):
+    ctx.add_column(models.Consumable, "current_mileage", "0")
+    # An odometer never reads below the last replacement mileage, so a 0 or
+    # NULL current_mileage next to a known mileage is always unset
+    ctx.backfill(
+        "consumables", "current_mileage = mileage",
+        "mileage IS NOT NULL AND (current_mileage IS NULL OR current_mileage < mileage)",
+    )
+
+def _rescale_dense_orders(ctx: MigrationContext, table: str, parent: str):
+    """
+    Renumbers dense keys (0..n-1 per parent, or the all-0 lists left by the
+    old column default) to ORDER_STEP, 2 * ORDER_STEP, ... in (order, id)
+    order, so ties get distinct keys. Runs in batches of parent ids so each
+    list is renumbered in one transaction. Only lists whose keys all lie in
+    [0, n) are touched, so a rerun after an interruption skips the lists
+    already done. (A sparse list matching that keeps its order.)
+    """
+    order = ctx.quote("order")
+    in_batch = f"{parent} >= :batch_lo AND {parent} < :batch_hi"
+    dense = (
+        f"SELECT {parent} FROM {table} WHERE {in_batch} "
+        f"GROUP BY {parent} HAVING MIN({order}) >= 0 AND MAX({order}) < COUNT(*)"
+    )
+    ranked = (
+        f"SELECT id, ROW_NUMBER() OVER (PARTITION BY {parent} ORDER BY {order}, id) AS position "
+        f"FROM {table} WHERE {in_batch}"
+    )
+    # The derived tables let MySQL read the table it is updating
+    ctx.backfill(
+        table, f"{order} = (SELECT position FROM ({ranked}) AS ranked WHERE ranked.id = {table}.id) * :step",
+        f"{parent} IN (SELECT {parent} FROM ({dense}) AS dense_lists)",
+        {"step": ORDER_STEP}, key=parent,
+    )
+
+@migration(4, "sparse float subtask order keys")
+def _fractional_order(ctx: MigrationContext):
+    # Databases created by create_all already have DOUBLE keys; only MySQL
+    # databases from before ordering.py carry dense integers
+    for table, parent in (("subtasks", "memo_id"), ("template_subtasks", "template_id")):
+        if table in ctx.created_tables or not ctx.has_column(table, "order"):
+            continue
+        if ctx.dialect.name != "mysql":
+            if not isinstance(ctx.column_type(table, "order"), Float):
+                ctx.log(f"  {table}.order is not DOUBLE; rebuild this {ctx.dialect.name} table by hand")
+            continue
+        if not isinstance(ctx.column_type(table, "order"), Float):
+            ctx.execute(f"ALTER TABLE {table} MODIFY COLUMN `order` DOUBLE DEFAULT 0")
+        # Also runs when the ALTER (which auto-commits) happened in an
+        # earlier, interrupted run
+        _rescale_dense_orders(ctx, table, parent)
+
+@migration(5, "content-addressed attachment blobs")
+def _attachment_blobs(ctx: MigrationContext):
+    ctx.add_column(models.SubtaskAttachment, "sha256")
+    ctx.create_index(_index(models.SubtaskAttachment, "ix_subtask_attachments_sha256"))
+    ctx.create_table(models.AttachmentBlob)
+
+@migration(6, "keyset pagination indexes")
+def _pagination_indexes(ctx: MigrationContext):
+    ctx.create_index(_index(models.Memo, "ix_memos_category_deadline_id"))
+    # The consumables index this step used to add, on (status, id), is
+    # replaced by ix_consumables_status_rank_id in step 12
+
+@migration(7, "foreign key indexes")
+def _foreign_key_indexes(ctx: MigrationContext):
+    # InnoDB indexes foreign keys itself; SQLite does not, so every
+    # selectinload(... IN (...)) of children scanned the child table
+    ctx.create_index(_index(models.SubTask, "ix_subtasks_memo_id"))
+    ctx.create_index(_index(models.SubtaskAttachment, "ix_subtask_attachments_subtask_id"))
+    ctx.create_index(_index(models.TemplateSubTask, "ix_template_subtasks_template_id"))
+    ctx.create_index(_index(models.ConsumableLog, "ix_consumable_logs_consumable_id"))
+
+@migration(8, "full-text search")
+def _full_text_search(ctx: MigrationContext):
+    if ctx.dialect.name == "mysql":
+        ctx.create_index(_index(models.Memo, "ft_memos_title_content"))
+        ctx.create_index(_index(models.SubTask, "ft_subtasks_content"))
+        ctx.create_index(_index(models.SubTask, "ft_subtasks_note"))
+    elif ctx.dialect.name == "sqlite":
+        # search_fts itself comes with create_all; fill it for existing memos
+        if ctx.dry_run:
+            ctx.log("  would rebuild search_fts")
+            return
+        with Session(ctx.engine) as db:
+            indexed = db.execute(text("SELECT 1 FROM search_fts LIMIT 1")).first()
+            if indexed is None and db.query(models.Memo.id).first() is not None:
+                ctx.log(f"  indexed {search.rebuild(db)} memo(s)")
+
+@migration(9, "consumable due columns")
+def _consumable_due(ctx: MigrationContext):
+    ctx.add_column(models.Consumable, "lifespan_km")
+    ctx.add_column(models.Consumable, "next_due_at")
+    ctx.add_column(models.Consumable, "next_due_km")
+    # The refresh below loads and sets it; step 12 indexes it
+    ctx.add_column(models.Consumable, "status_rank", default_sql="0")
+    ctx.create_index(_index(models.Consumable, "ix_consumables_next_due_at"))
+    ctx.create_index(_index(models.Consumable, "ix_consumables_category_next_due_km"))
+    # Dates need Python to add lifespans portably, so refresh through the ORM
+    if ctx.dry_run:
+        ctx.log("  would compute next_due_at / next_due_km and status for every consumable")
+        return
+    refreshed, last_id = 0, 0
+    while True:
+        with Session(ctx.engine) as db:
+            rows = consumable_status.refresh_batch(db, last_id, ctx.batch_size)
+            if not rows:
+                break
+            last_id = rows[-1].id
+            db.commit()
+        refreshed += len(rows)
+        if ctx.batch_pause:
+            time.sleep(ctx.batch_pause)
+    if refreshed:
+        ctx.log(f"  refreshed {refreshed} consumable(s)")
+
+@migration(10, "scheduler state and deadline index")
+def _scheduler(ctx: MigrationContext):
+    ctx.create_table(models.SchedulerState)
+    ctx.create_index(_index(models.Memo, "ix_memos_deadline"))
+
+@migration(11, "consumable replacement statistics")
+def _consumable_stats(ctx: MigrationContext):
+    ctx.create_table(models.ConsumableStats)
+    ctx.create_index(_index(models.ConsumableLog, "ix_consumable_logs_consumable_replaced_at"))
+    if ctx.dry_run:
+        ctx.log("  would compute consumable_stats from consumable_logs")
+        return
+    with Session(ctx.engine) as db:
+        if db.query(models.ConsumableStats.consumable_id).first() is None:
+            rebuilt = consumable_analytics.rebuild(db)
+            db.commit()
+            if rebuilt:
+                ctx.log(f"  computed statistics for {rebuilt} consumable(s)")
+
+@migration(12, "consumable status rank")
+def _consumable_status_rank(ctx: MigrationContext):
+    ctx.add_column(models.Consumable, "status_rank", default_sql="0")
+    rank = " ".join(f"WHEN '{status}' THEN {r}" for status, r in consumable_status.STATUS_RANK.items())
+    rank = f"CASE status {rank} ELSE 0 END"
+    ctx.backfill("consumables", f"status_rank = {rank}", f"status_rank IS NULL OR status_rank <> {rank}")
+    ctx.create_index(_index(models.Consumable, "ix_consumables_status_rank_id"))
+    ctx.drop_index("consumables", "ix_consumables_status_id")
+
+# Runner
+def applied_versions(engine):
+    if not inspect(engine).has_table(models.SchemaVersion.__tablename__):
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(select(models.SchemaVersion.version)).scalars())
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+def head_version():
+    return MIGRATIONS[-1][0]
+
+def is_up_to_date(engine):
+    return not pending_migrations(engine)
+
+def migrate(engine, dry_run: bool = False, batch_size: int = BACKFILL_BATCH_SIZE,
+            batch_pause: float = 0.0, log=print):
+    """
+    Creates missing tables, then applies pending migrations in order.
+    Returns the versions applied (or, with dry_run, that would be).
+    """
+    ctx = MigrationContext(engine, dry_run=dry_run, batch_size=batch_size, batch_pause=batch_pause, log=log)
+    missing = [t.name for t in models.Base.metadata.sorted_tables if not ctx.has_table(t.name)]
+    if missing:
+        log(f"{'[dry run] would create' if dry_run else 'Creating'} tables: {', '.join(missing)}")
+    if dry_run:
+        ctx.created_tables.update(missing)
+    else:
+        models.Base.metadata.create_all(bind=engine)
+
+    done = []
+    for version, name, step in pending_migrations(engine):
+        log(f"{'[dry run] ' if dry_run else ''}{version:03d} {name}")
+        step(ctx)
+        if not dry_run:
+            with engine.begin() as conn:
+                conn.execute(insert(models.SchemaVersion), {"version": version, "name": name})
+        done.append(version)
+    return done
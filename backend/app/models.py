@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date, Index, Double, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -15,7 +15,16 @@ class Memo(Base):
     deadline = Column(DateTime(timezone=True), nullable=True)
     category = Column(String(50), default="work") # work, life
 
-    subtasks = relationship("SubTask", back_populates="memo", cascade="all, delete-orphan")
+    subtasks = relationship("SubTask", back_populates="memo", cascade="all, delete-orphan", order_by="SubTask.order, SubTask.id")
+
+    __table_args__ = (
+        # Backs keyset pagination in crud.get_memos_page
+        Index("ix_memos_category_deadline_id", "category", "deadline", "id"),
+        # Deadline windows swept by scheduler.py
+        Index("ix_memos_deadline", "deadline"),
+        # Full-text search on MySQL; SQLite uses search_fts below
+        Index("ft_memos_title_content", "title", "content", mysql_prefix="FULLTEXT", mysql_with_parser="ngram").ddl_if(dialect="mysql"),
+    )
 
 class Template(Base):
     __tablename__ = "templates"
@@ -26,15 +35,15 @@ class Template(Base):
     category = Column(String(50), default="work")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    subtasks = relationship("TemplateSubTask", back_populates="template", cascade="all, delete-orphan")
+    subtasks = relationship("TemplateSubTask", back_populates="template", cascade="all, delete-orphan", order_by="TemplateSubTask.order, TemplateSubTask.id")
 
 class TemplateSubTask(Base):
     __tablename__ = "template_subtasks"
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String(255))
-    order = Column(Integer, default=0)
-    template_id = Column(Integer, ForeignKey("templates.id"))
+    order = Column(Double, default=0) # sparse key, see ordering.py
+    template_id = Column(Integer, ForeignKey("templates.id"), index=True)
     
     template = relationship("Template", back_populates="subtasks")
 
@@ -45,15 +54,20 @@ class SubTask(Base):
     content = Column(String(255))
     note = Column(Text, nullable=True)
     is_completed = Column(Boolean, default=False)
-    order = Column(Integer, default=0)
+    order = Column(Double, default=0) # sparse key, see ordering.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     start_time = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
-    memo_id = Column(Integer, ForeignKey("memos.id"))
+    memo_id = Column(Integer, ForeignKey("memos.id"), index=True)
 
     memo = relationship("Memo", back_populates="subtasks")
     attachments = relationship("SubtaskAttachment", back_populates="subtask", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ft_subtasks_content", "content", mysql_prefix="FULLTEXT", mysql_with_parser="ngram").ddl_if(dialect="mysql"),
+        Index("ft_subtasks_note", "note", mysql_prefix="FULLTEXT", mysql_with_parser="ngram").ddl_if(dialect="mysql"),
+    )
+
 class SubtaskAttachment(Base):
     __tablename__ = "subtask_attachments"
 
@@ -62,11 +76,22 @@ class SubtaskAttachment(Base):
     file_path = Column(String(512))
     file_size = Column(Integer)
     content_type = Column(String(100))
+    sha256 = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    subtask_id = Column(Integer, ForeignKey("subtasks.id"))
+    subtask_id = Column(Integer, ForeignKey("subtasks.id"), index=True)
 
     subtask = relationship("SubTask", back_populates="attachments")
 
+class AttachmentBlob(Base):
+    __tablename__ = "attachment_blobs"
+
+    # Content-addressed file shared by every attachment with the same sha256
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String(512))
+    file_size = Column(Integer)
+    ref_count = Column(Integer, default=0) # number of SubtaskAttachment rows using it
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Consumable(Base):
     __tablename__ = "consumables"
 
@@ -75,23 +100,37 @@ class Consumable(Base):
     tag = Column(String(50), default="耗材") # 耗材, 食物
     category = Column(String(50), default="家") # 家, 车, 其他
     model_spec = Column(String(255), nullable=True) # 规格型号
-    status = Column(String(50), default="正常") # 正常, 即将到期, 已过期 (can be computed but storing for cache/override)
+    status = Column(String(50), default="正常") # 正常, 即将到期, 已过期; derived from the due columns by consumable_status.py
+    status_rank = Column(Integer, default=0, nullable=False) # list sort key; kept in step with status by consumable_status.py
     last_replaced = Column(DateTime(timezone=True), nullable=True)
     lifespan = Column(Integer, default=30) # days
     expiry_date = Column(DateTime(timezone=True), nullable=True)
     mileage = Column(Integer, nullable=True) # for Car category (Last Replaced Mileage)
     current_mileage = Column(Integer, nullable=True, default=0) # Latest known mileage
+    lifespan_km = Column(Integer, nullable=True) # km between replacements
+    # Maintained on every write (consumable_status.refresh)
+    next_due_at = Column(DateTime(timezone=True), nullable=True)
+    next_due_km = Column(Integer, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    logs = relationship("ConsumableLog", back_populates="consumable", cascade="all, delete-orphan")
+    logs = relationship("ConsumableLog", back_populates="consumable", cascade="all, delete-orphan", order_by="desc(ConsumableLog.replaced_at)")
+    stats = relationship("ConsumableStats", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Backs keyset pagination in crud.get_consumables_page
+        Index("ix_consumables_status_rank_id", "status_rank", "id"),
+        # Range scans for due-soon / overdue lists and consumable_status.sweep
+        Index("ix_consumables_next_due_at", "next_due_at"),
+        Index("ix_consumables_category_next_due_km", "category", "next_due_km"),
+    )
 
 class ConsumableLog(Base):
     __tablename__ = "consumable_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    consumable_id = Column(Integer, ForeignKey("consumables.id"))
+    consumable_id = Column(Integer, ForeignKey("consumables.id"), index=True)
     replaced_at = Column(DateTime(timezone=True), nullable=False)
     mileage = Column(Integer, nullable=True)
     days_since_last = Column(Integer, default=0)
@@ -100,3 +139,46 @@ class ConsumableLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     consumable = relationship("Consumable", back_populates="logs")
+
+    __table_args__ = (
+        # Newest-first log slices (consumable_analytics.load_latest_logs)
+        Index("ix_consumable_logs_consumable_replaced_at", "consumable_id", "replaced_at"),
+    )
+
+class ConsumableStats(Base):
+    __tablename__ = "consumable_stats"
+
+    # Running sums over ConsumableLog intervals, kept by consumable_analytics.py
+    consumable_id = Column(Integer, ForeignKey("consumables.id"), primary_key=True)
+    log_count = Column(Integer, default=0)
+    days_count = Column(Integer, default=0)
+    days_sum = Column(Integer, default=0)
+    days_weighted_sum = Column(Integer, default=0) # sum of ordinal * interval, for the trend
+    km_count = Column(Integer, default=0)
+    km_sum = Column(BigInteger, default=0)
+    km_weighted_sum = Column(BigInteger, default=0)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    # One row per applied step of app/migrations.py
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(255))
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SchedulerState(Base):
+    __tablename__ = "scheduler_state"
+
+    # Where each scheduler.py job's last completed window ended
+    job = Column(String(50), primary_key=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+
+# SQLite full-text index over memos and subtasks, kept in sync by search.py.
+# Text is stored pre-split into bigrams (like MySQL's ngram parser) so Chinese
+# substrings match; refs holds "m<memo_id>" (plus "s<subtask_id>" on subtask
+# rows) so the rows to replace are found through the index, not a scan.
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, memo_id UNINDEXED, refs, title, body)"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS search_fts").execute_if(dialect="sqlite"))
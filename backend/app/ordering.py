@@ -0,0 +1,80 @@
+from bisect import bisect_left
+
+# Sparse ordering keys for subtasks and template subtasks. New lists are
+# spaced ORDER_STEP apart so an item can be moved by giving it a key between
+# its new neighbours, touching a single row. When two neighbours get closer
+# than MIN_GAP the list is renumbered (rebalanced).
+ORDER_STEP = 1024.0
+MIN_GAP = 1e-3
+
+def initial_keys(count: int):
+    return [(i + 1) * ORDER_STEP for i in range(count)]
+
+def key_between(lo, hi):
+    if lo is None and hi is None:
+        return ORDER_STEP
+    if lo is None:
+        return hi - ORDER_STEP
+    if hi is None:
+        return lo + ORDER_STEP
+    return (lo + hi) / 2
+
+def is_dense(lo, hi):
+    return lo is not None and hi is not None and hi - lo < MIN_GAP
+
+def _increasing_run(keys):
+    """Positions of a longest strictly increasing subsequence of keys (None skipped)."""
+    tails, tail_pos, prev = [], [], {}
+    for pos, key in enumerate(keys):
+        if key is None:
+            continue
+        i = bisect_left(tails, key)
+        prev[pos] = tail_pos[i - 1] if i else None
+        if i == len(tails):
+            tails.append(key)
+            tail_pos.append(pos)
+        else:
+            tails[i] = key
+            tail_pos[i] = pos
+    kept = set()
+    pos = tail_pos[-1] if tail_pos else None
+    while pos is not None:
+        kept.add(pos)
+        pos = prev[pos]
+    return kept
+
+def plan_keys(current):
+    """
+    Given the current key (or None for new items) of each item in its desired
+    position, returns the keys to store. Items already in increasing order keep
+    their key; the rest get keys between their neighbours. Falls back to a full
+    renumbering when a gap is too dense.
+    """
+    kept = _increasing_run(current)
+    keys = [current[pos] if pos in kept else None for pos in range(len(current))]
+
+    pos = 0
+    while pos < len(keys):
+        if keys[pos] is not None:
+            pos += 1
+            continue
+        end = pos
+        while end < len(keys) and keys[end] is None:
+            end += 1
+        lo = keys[pos - 1] if pos else None
+        hi = keys[end] if end < len(keys) else None
+        count = end - pos
+        if lo is not None and hi is not None:
+            step = (hi - lo) / (count + 1)
+            if step < MIN_GAP:
+                return initial_keys(len(keys))
+            fill = [lo + step * (i + 1) for i in range(count)]
+        elif lo is not None:
+            fill = [lo + ORDER_STEP * (i + 1) for i in range(count)]
+        elif hi is not None:
+            fill = [hi - ORDER_STEP * (count - i) for i in range(count)]
+        else:
+            fill = initial_keys(count)
+        keys[pos:end] = fill
+        pos = end
+    return keys
@@ -0,0 +1,31 @@
+import base64
+import json
+from datetime import datetime
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(data, dict) or not isinstance(data.get("id"), int):
+        raise InvalidCursor("Invalid cursor")
+    return data
+
+def dump_datetime(dt):
+    return dt.isoformat() if dt else None
+
+def load_datetime(value):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
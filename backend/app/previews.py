@@ -0,0 +1,116 @@
+import importlib.util
+import logging
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from .storage import preview_path
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails for images and first-page previews for PDFs, generated in a
+# process pool so uploads never wait on decoding. Pillow and PyMuPDF are
+# optional: without them the matching content types simply get no preview.
+
+PREVIEW_MAX_SIZE = 320
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "1"))
+PREVIEWS_ENABLED = os.getenv("PREVIEWS_ENABLED", "1") != "0"
+
+_executor = None
+_pending = set()
+_lock = Lock()
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+HAS_PIL = _has_module("PIL")
+HAS_PYMUPDF = _has_module("pymupdf")
+
+def guess_content_type(path, content_type=None):
+    if content_type and content_type != "application/octet-stream":
+        return content_type
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def is_previewable(content_type):
+    if not content_type:
+        return False
+    if content_type.startswith("image/"):
+        return HAS_PIL
+    if content_type == "application/pdf":
+        return HAS_PYMUPDF
+    return False
+
+def _save_image_preview(src, tmp):
+    from PIL import Image, ImageOps
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE))
+        im.convert("RGB").save(tmp, "JPEG", quality=80)
+
+def _save_pdf_preview(src, tmp):
+    import pymupdf
+    with pymupdf.open(src) as doc:
+        page = doc[0]
+        zoom = PREVIEW_MAX_SIZE / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        pix.save(tmp, output="jpeg")
+
+def generate_preview(src, content_type):
+    """
+    Writes the preview next to src (see storage.preview_path). Runs in a
+    worker process; returns the preview path, or None if not previewable.
+    """
+    dest = preview_path(src)
+    if os.path.exists(dest):
+        return dest
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    try:
+        if content_type.startswith("image/"):
+            _save_image_preview(src, tmp)
+        elif content_type == "application/pdf":
+            _save_pdf_preview(src, tmp)
+        else:
+            return None
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dest
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PREVIEW_WORKERS)
+        return _executor
+
+def _done(src, future):
+    with _lock:
+        _pending.discard(src)
+    error = future.exception()
+    if error is not None:
+        # The error was raised in a worker process; log it with its traceback
+        logger.error("Generating preview for %s failed", src, exc_info=error)
+
+def schedule_preview(file_path, content_type):
+    """Queues preview generation for an attachment file; never blocks on it."""
+    content_type = guess_content_type(file_path, content_type)
+    if not PREVIEWS_ENABLED or not file_path or not is_previewable(content_type):
+        return None
+    if os.path.exists(preview_path(file_path)):
+        return None
+    with _lock:
+        # Deduplicated blobs share one preview; don't queue it twice
+        if file_path in _pending:
+            return None
+        _pending.add(file_path)
+    future = _get_executor().submit(generate_preview, file_path, content_type)
+    future.add_done_callback(lambda f: _done(file_path, f))
+    return future
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,44 @@
+import calendar
+from datetime import datetime, timedelta
+
+# Occurrence dates for template instantiation (crud.instantiate_template).
+# Monthly occurrences keep the start's day of month, clamped to the last day
+# of shorter months (Jan 31 -> Feb 28 -> Mar 31).
+
+RULES = ("daily", "weekly", "monthly")
+MAX_OCCURRENCES = 366
+
+def _add_months(start: datetime, months: int):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+def occurrences(rule: str, start: datetime, until: datetime = None, count: int = None):
+    """
+    Dates from start (inclusive) following rule, up to until (inclusive) or
+    count occurrences. Raises ValueError for an unknown rule, an unbounded
+    range, or more than MAX_OCCURRENCES dates.
+    """
+    if rule not in RULES:
+        raise ValueError(f"Unknown recurrence {rule!r}; expected one of {', '.join(RULES)}")
+    if until is None and count is None:
+        raise ValueError("Recurrence needs an end date or a count")
+    limit = min(count, MAX_OCCURRENCES + 1) if count is not None else MAX_OCCURRENCES + 1
+
+    dates = []
+    n = 0
+    while len(dates) < limit:
+        if rule == "daily":
+            current = start + timedelta(days=n)
+        elif rule == "weekly":
+            current = start + timedelta(weeks=n)
+        else:
+            current = _add_months(start, n)
+        if until is not None and current > until:
+            break
+        dates.append(current)
+        n += 1
+    if len(dates) > MAX_OCCURRENCES:
+        raise ValueError(f"Recurrence produces more than {MAX_OCCURRENCES} memos")
+    return dates
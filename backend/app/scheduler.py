@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from . import models, consumable_status
+from .database import BACKEND_DIR, SessionLocal
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# In-process scheduler, started by the app lifespan.
+#
+# Every worker runs the loop, but a tick only runs in the worker holding an
+# exclusive lock on SCHEDULER_LOCK_PATH; the others retry every interval,
+# so one takes over when the leader exits. The lock is per host, so run
+# the scheduler (SCHEDULER_ENABLED) on one host only.
+#
+# Each job sweeps the window (last run, now]: scheduler_state stores the
+# last run per job, and that row commits in the same transaction as the
+# job's changes, so an interrupted tick reruns its window and a restart
+# resumes from where the last tick ended. Jobs return events, which are
+# passed to the hooks registered with on() after the commit.
+#
+# Events (each hook receives the list of ids):
+#   consumable.due_soon   consumables that entered the due-soon window
+#   consumable.overdue    consumables that became overdue
+#   memo.overdue          open memos whose deadline passed
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "60"))
+SCHEDULER_LOCK_PATH = os.path.join(BACKEND_DIR, os.getenv("SCHEDULER_LOCK_PATH", ".scheduler.lock"))
+
+JOBS = []
+_hooks = defaultdict(list)
+
+def job(name: str):
+    def register(fn):
+        JOBS.append((name, fn))
+        return fn
+    return register
+
+def on(event: str):
+    """Decorator registering fn(ids) to be called when event is emitted."""
+    def register(fn):
+        _hooks[event].append(fn)
+        return fn
+    return register
+
+def emit(event: str, ids):
+    for hook in _hooks[event]:
+        try:
+            hook(ids)
+        except Exception:
+            logger.exception("Hook %r for %s failed", hook, event)
+
+CONSUMABLE_EVENTS = {
+    consumable_status.STATUS_DUE_SOON: "consumable.due_soon",
+    consumable_status.STATUS_OVERDUE: "consumable.overdue",
+}
+
+@job("consumables")
+def _consumable_statuses(db, since, now):
+    by_event = defaultdict(list)
+    for consumable_id, status in consumable_status.sweep(db, now, since=since):
+        by_event[CONSUMABLE_EVENTS[status]].append(consumable_id)
+    return list(by_event.items())
+
+@job("memo_deadlines")
+def _memo_deadlines(db, since, now):
+    if since is None:
+        # First run: start the window here rather than reporting every
+        # deadline that ever passed
+        return []
+    ids = [
+        memo_id for (memo_id,) in db.query(models.Memo.id)
+        .filter(models.Memo.deadline > since, models.Memo.deadline <= now, models.Memo.completed_at.is_(None))
+        .order_by(models.Memo.deadline, models.Memo.id)
+    ]
+    return [("memo.overdue", ids)] if ids else []
+
+def run_tick(now: datetime = None):
+    """Runs every job over its window ending at now. Returns the events emitted."""
+    now = now or datetime.now()
+    events = []
+    db = SessionLocal()
+    try:
+        for name, fn in JOBS:
+            state = db.get(models.SchedulerState, name)
+            if state is None:
+                state = models.SchedulerState(job=name)
+                db.add(state)
+            elif state.last_run_at is not None and state.last_run_at >= now:
+                continue
+            since = state.last_run_at
+            state.last_run_at = now
+            events.extend(fn(db, since, now))
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for event, ids in events:
+        emit(event, ids)
+    return events
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, held until release() or exit."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:  # pragma: no cover - Windows
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class Scheduler:
+    def __init__(self, interval: float = SCHEDULER_INTERVAL, lock_path: str = SCHEDULER_LOCK_PATH):
+        self.interval = interval
+        self.lock = LeaderLock(lock_path)
+        self._task = None
+        # The tick running in a worker thread, if any
+        self._tick = None
+
+    async def _run(self):
+        while True:
+            if self.lock.acquire():
+                # Shielded so cancelling the loop leaves the tick running; stop() waits for it
+                self._tick = asyncio.ensure_future(run_in_threadpool(run_tick))
+                try:
+                    await asyncio.shield(self._tick)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Scheduler tick failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._tick is not None:
+            # A tick in progress finishes before the engine is disposed
+            try:
+                await self._tick
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            self._tick = None
+        self.lock.release()
+
+scheduler = Scheduler()
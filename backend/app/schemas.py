@@ -6,7 +6,7 @@ class SubTaskBase(BaseModel):
     content: str
     note: Optional[str] = None
     is_completed: bool = False
-    order: int = 0
+    order: float = 0
 
 class SubtaskAttachmentBase(BaseModel):
     filename: str
@@ -15,6 +15,12 @@ class SubtaskAttachmentBase(BaseModel):
 
 class SubtaskAttachmentCreate(SubtaskAttachmentBase):
     file_path: str
+    sha256: Optional[str] = None
+
+class AttachmentUploadStart(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    size: int
 
 class SubtaskAttachment(SubtaskAttachmentBase):
     id: int
@@ -41,6 +47,15 @@ class SubTaskUpdate(BaseModel):
     start_time: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
+class SubTaskBatchItem(SubTaskUpdate):
+    id: int
+    order: Optional[float] = None
+
+class SubTaskMove(BaseModel):
+    # New neighbours: the subtask is placed after `after_id` and before `before_id`
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+
 
 class SubTask(SubTaskBase):
     id: int
@@ -86,7 +101,7 @@ class Memo(MemoBase):
 
 class TemplateSubTaskBase(BaseModel):
     content: str
-    order: int = 0
+    order: float = 0
 
 class TemplateSubTaskCreate(TemplateSubTaskBase):
     pass
@@ -114,6 +129,17 @@ class Template(TemplateBase):
     class Config:
         from_attributes = True
 
+class TemplateInstantiate(BaseModel):
+    # Without recurrence: one memo, titled title or the template's title
+    title: Optional[str] = None
+    deadline: Optional[datetime] = None
+    # daily / weekly / monthly: one memo per date from start until `until`
+    # (or `count` dates), each with that date as its deadline
+    recurrence: Optional[str] = None
+    start: Optional[datetime] = None
+    until: Optional[datetime] = None
+    count: Optional[int] = None
+
 # Consumables
 class ConsumableLogBase(BaseModel):
     replaced_at: datetime
@@ -127,6 +153,11 @@ class ConsumableReplace(BaseModel):
     mileage: Optional[int] = None
     note: Optional[str] = None
 
+class ConsumableMileage(BaseModel):
+    # One odometer reading for every consumable in the category
+    mileage: int
+    category: str = "车"
+
 class ConsumableLogCreate(ConsumableLogBase):
     pass
 
@@ -149,6 +180,7 @@ class ConsumableBase(BaseModel):
     expiry_date: Optional[datetime] = None
     mileage: Optional[int] = None
     current_mileage: Optional[int] = None
+    lifespan_km: Optional[int] = None
 
 class ConsumableCreate(ConsumableBase):
     pass
@@ -160,6 +192,8 @@ class Consumable(ConsumableBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    next_due_at: Optional[datetime] = None
+    next_due_km: Optional[int] = None
     logs: List[ConsumableLog] = []
 
     class Config:
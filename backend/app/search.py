@@ -0,0 +1,216 @@
+import html
+import re
+from typing import Iterable, List
+from sqlalchemy import literal, select, text, union_all
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+from . import models
+
+# Full-text search over memo titles and content, subtask content and notes.
+#
+# MySQL:  FULLTEXT indexes with the ngram parser on the source columns (see
+#         models.py). InnoDB maintains them, so the index_* hooks are no-ops.
+# SQLite: the search_fts FTS5 table. crud writers call the index_* hooks
+#         before committing, so the index changes in the same transaction.
+#
+# Both split text into overlapping character bigrams, so any substring of
+# two or more characters matches, Chinese included. One-character terms are
+# prefix searches.
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SNIPPET_CHARS = 60
+INDEX_BATCH_SIZE = 500
+
+_WORD = re.compile(r"[^\W_]+")
+
+def _uses_fts(db: Session):
+    return db.get_bind().dialect.name == "sqlite"
+
+def _terms(q: str):
+    return list(dict.fromkeys(_WORD.findall((q or "").lower())))
+
+def bigrams(value: str):
+    tokens = []
+    for word in _WORD.findall((value or "").lower()):
+        if len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return " ".join(tokens)
+
+def _fts_query(terms):
+    phrases = [f'"{term}" *' if len(term) == 1 else f'"{bigrams(term)}"' for term in terms]
+    return "{title body} : (" + " AND ".join(phrases) + ")"
+
+def _boolean_query(terms):
+    return " ".join(f"+{term}*" if len(term) == 1 else f'+"{term}"' for term in terms)
+
+# Index maintenance (SQLite only)
+def _ref_query(refs):
+    return " OR ".join(f'"{ref}"' for ref in refs)
+
+def _delete_refs(db: Session, refs):
+    db.execute(
+        text("DELETE FROM search_fts WHERE rowid IN (SELECT rowid FROM search_fts WHERE refs MATCH :refs)"),
+        {"refs": _ref_query(refs)}
+    )
+
+def _subtask_docs(st):
+    refs = f"m{st.memo_id} s{st.id}"
+    docs = [{"kind": "subtask", "ref_id": st.id, "memo_id": st.memo_id, "refs": refs,
+             "title": "", "body": bigrams(st.content)}]
+    if st.note:
+        docs.append({"kind": "note", "ref_id": st.id, "memo_id": st.memo_id, "refs": refs,
+                     "title": "", "body": bigrams(st.note)})
+    return docs
+
+def _insert_docs(db: Session, docs):
+    if docs:
+        db.execute(text(
+            "INSERT INTO search_fts (kind, ref_id, memo_id, refs, title, body) "
+            "VALUES (:kind, :ref_id, :memo_id, :refs, :title, :body)"
+        ), docs)
+
+def _chunks(ids, size=INDEX_BATCH_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def index_memos(db: Session, memo_ids: Iterable[int]):
+    """Re-indexes memos and all of their subtasks; missing memos are dropped."""
+    if not _uses_fts(db):
+        return
+    db.flush()
+    for chunk in _chunks(memo_ids):
+        _delete_refs(db, [f"m{memo_id}" for memo_id in chunk])
+        docs = [
+            {"kind": "memo", "ref_id": memo.id, "memo_id": memo.id, "refs": f"m{memo.id}",
+             "title": bigrams(memo.title), "body": bigrams(memo.content)}
+            for memo in db.query(models.Memo.id, models.Memo.title, models.Memo.content)
+            .filter(models.Memo.id.in_(chunk))
+        ]
+        for st in db.query(
+            models.SubTask.id, models.SubTask.memo_id, models.SubTask.content, models.SubTask.note
+        ).filter(models.SubTask.memo_id.in_(chunk)):
+            docs.extend(_subtask_docs(st))
+        _insert_docs(db, docs)
+
+def index_memo(db: Session, memo_id: int):
+    index_memos(db, [memo_id])
+
+def index_subtasks(db: Session, subtask_ids: Iterable[int]):
+    """Re-indexes single subtasks, e.g. after their content or note changed."""
+    if not _uses_fts(db):
+        return
+    db.flush()
+    for chunk in _chunks(subtask_ids):
+        _delete_refs(db, [f"s{st_id}" for st_id in chunk])
+        docs = []
+        for st in db.query(
+            models.SubTask.id, models.SubTask.memo_id, models.SubTask.content, models.SubTask.note
+        ).filter(models.SubTask.id.in_(chunk)):
+            docs.extend(_subtask_docs(st))
+        _insert_docs(db, docs)
+
+def remove_memo(db: Session, memo_id: int):
+    if _uses_fts(db):
+        _delete_refs(db, [f"m{memo_id}"])
+
+def rebuild(db: Session):
+    """Rebuilds the SQLite index from the tables and commits. Returns memos indexed."""
+    if not _uses_fts(db):
+        return 0
+    db.execute(text("DELETE FROM search_fts"))
+    memo_ids = [memo_id for (memo_id,) in db.query(models.Memo.id).order_by(models.Memo.id)]
+    index_memos(db, memo_ids)
+    db.commit()
+    return len(memo_ids)
+
+# Querying
+def _search_fts(db: Session, terms, limit: int):
+    # bm25 weights follow the column order; titles count ten times the body
+    return db.execute(text(
+        "SELECT kind, ref_id, memo_id, -bm25(search_fts, 0, 0, 0, 0, 10.0, 1.0) AS score "
+        "FROM search_fts WHERE search_fts MATCH :q ORDER BY score DESC LIMIT :limit"
+    ), {"q": _fts_query(terms), "limit": limit}).all()
+
+def _search_fulltext(db: Session, terms, limit: int):
+    against = _boolean_query(terms)
+    memo_match = mysql.match(models.Memo.title, models.Memo.content, against=against).in_boolean_mode()
+    content_match = mysql.match(models.SubTask.content, against=against).in_boolean_mode()
+    note_match = mysql.match(models.SubTask.note, against=against).in_boolean_mode()
+    stmt = union_all(
+        select(literal("memo").label("kind"), models.Memo.id.label("ref_id"),
+               models.Memo.id.label("memo_id"), memo_match.label("score")).where(memo_match),
+        select(literal("subtask"), models.SubTask.id, models.SubTask.memo_id, content_match).where(content_match),
+        select(literal("note"), models.SubTask.id, models.SubTask.memo_id, note_match).where(note_match),
+    ).order_by(text("score DESC")).limit(limit)
+    return db.execute(stmt).all()
+
+def highlight(value: str, terms: List[str], width: int = None):
+    """
+    HTML-escapes value and wraps matches of terms in <mark>. With width, cuts
+    a window of that many characters around the first match.
+    """
+    if not value:
+        return ""
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    start, end = 0, len(value)
+    if width is not None and len(value) > width:
+        first = pattern.search(value)
+        start = max(0, min(first.start() - width // 3 if first else 0, len(value) - width))
+        end = start + width
+
+    window = value[start:end]
+    parts, pos = [], 0
+    for m in pattern.finditer(window):
+        parts.append(html.escape(window[pos:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group())}</mark>")
+        pos = m.end()
+    parts.append(html.escape(window[pos:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(value) else "")
+
+def search(db: Session, q: str, limit: int = DEFAULT_LIMIT):
+    """
+    Ranked hits across memos, subtasks and subtask notes, best first. Each
+    hit carries the memo title and a snippet with matches in <mark>.
+    """
+    terms = _terms(q)
+    if not terms:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    hits = _search_fts(db, terms, limit) if _uses_fts(db) else _search_fulltext(db, terms, limit)
+
+    memo_ids = {hit.memo_id for hit in hits}
+    subtask_ids = {hit.ref_id for hit in hits if hit.kind != "memo"}
+    memos = {
+        row.id: row for row in
+        db.query(models.Memo.id, models.Memo.title, models.Memo.content).filter(models.Memo.id.in_(memo_ids))
+    } if memo_ids else {}
+    subtasks = {
+        row.id: row for row in
+        db.query(models.SubTask.id, models.SubTask.content, models.SubTask.note).filter(models.SubTask.id.in_(subtask_ids))
+    } if subtask_ids else {}
+
+    results = []
+    for hit in hits:
+        memo = memos.get(hit.memo_id)
+        if memo is None:
+            continue
+        if hit.kind == "memo":
+            body = memo.content
+        else:
+            st = subtasks.get(hit.ref_id)
+            if st is None:
+                continue
+            body = st.content if hit.kind == "subtask" else st.note
+        results.append({
+            "type": hit.kind,
+            "memo_id": hit.memo_id,
+            "subtask_id": hit.ref_id if hit.kind != "memo" else None,
+            "title": highlight(memo.title, terms),
+            "snippet": highlight(body, terms, SNIPPET_CHARS),
+            "score": round(float(hit.score), 6),
+        })
+    return results
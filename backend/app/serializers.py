@@ -0,0 +1,124 @@
+from datetime import timezone, timedelta
+from functools import lru_cache
+from fastapi.responses import Response
+from . import previews, consumable_analytics
+
+# Response payloads. Endpoints that return many objects encode these dicts
+# straight to JSON bytes (dumps) and wrap them in JSONBytesResponse, which
+# skips FastAPI's response_model validation and jsonable_encoder pass.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+    import json
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+class JSONBytesResponse(Response):
+    """Response for a body that is already encoded JSON."""
+    media_type = "application/json"
+
+CN_TZ = timezone(timedelta(hours=8))
+
+@lru_cache(maxsize=65536)
+def _format_cn_time(dt):
+    # Timestamps repeat heavily across list pages (bulk-created subtasks,
+    # shared created_at defaults), so cache the conversion per value
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(CN_TZ)
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
+
+def to_cn_time(dt):
+    if not dt:
+        return None
+    return _format_cn_time(dt)
+
+def attachment_url(att):
+    return f"/attachments/{att.id}/content"
+
+def attachment_to_dict(att):
+    return {
+        "id": att.id,
+        "filename": att.filename,
+        "url": attachment_url(att),
+        "preview_url": f"/attachments/{att.id}/preview" if previews.is_previewable(att.content_type) else None,
+        "file_size": att.file_size,
+        "content_type": att.content_type,
+        "created_at": to_cn_time(att.created_at)
+    }
+
+# Memos
+def memo_to_dict(memo):
+    return {
+        "id": memo.id,
+        "title": memo.title,
+        "content": memo.content,
+        "category": memo.category,
+        "created_at": to_cn_time(memo.created_at),
+        "updated_at": to_cn_time(memo.updated_at),
+        "completed_at": to_cn_time(memo.completed_at),
+        "deadline": to_cn_time(memo.deadline),
+        "subtasks": [
+            {
+                "id": st.id,
+                "content": st.content,
+                "is_completed": st.is_completed,
+                "order": st.order,
+                "created_at": to_cn_time(st.created_at),
+                "start_time": to_cn_time(st.start_time),
+                "completed_at": to_cn_time(st.completed_at),
+                "note": st.note,
+                "attachments": [attachment_to_dict(att) for att in st.attachments]
+            } for st in memo.subtasks
+        ]
+    }
+
+# Consumables
+def consumable_to_dict(c):
+    return {
+        "id": c.id,
+        "name": c.name,
+        "tag": c.tag,
+        "category": c.category,
+        "model_spec": c.model_spec,
+        "status": c.status,
+        "last_replaced": c.last_replaced.isoformat() if c.last_replaced else None,
+        "lifespan": c.lifespan,
+        "expiry_date": c.expiry_date.isoformat() if c.expiry_date else None,
+        "mileage": c.mileage,
+        "current_mileage": c.current_mileage,
+        "lifespan_km": c.lifespan_km,
+        "next_due_at": c.next_due_at.isoformat() if c.next_due_at else None,
+        "next_due_km": c.next_due_km,
+        "created_at": to_cn_time(c.created_at),
+        "updated_at": to_cn_time(c.updated_at),
+        # Newest CONSUMABLE_LOG_LIMIT logs; the full history is at /consumables/{id}/logs
+        "logs": [consumable_log_to_dict(l) for l in _latest_logs(c)],
+        "log_summary": consumable_analytics.summary(c),
+    }
+
+def _latest_logs(c):
+    logs = getattr(c, "latest_logs", None)
+    if logs is None:
+        logs = c.logs[:consumable_analytics.CONSUMABLE_LOG_LIMIT]
+    return logs
+
+def consumable_log_to_dict(l):
+    return {
+        "id": l.id,
+        "replaced_at": l.replaced_at.isoformat(),
+        "mileage": l.mileage,
+        "days_since_last": l.days_since_last,
+        "km_since_last": l.km_since_last,
+        "note": l.note,
+        "created_at": to_cn_time(l.created_at)
+    }
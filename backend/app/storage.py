@@ -0,0 +1,482 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from . import models
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+# Content-addressed blobs: blobs/<sha[:2]>/<sha[2:4]>/<sha><ext> (<sha>-<suffix><ext>
+# when a deleted blob's file may still be at the usual path)
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+# Single-request uploads land here before being moved into BLOB_DIR
+TMP_DIR = os.path.join(UPLOAD_DIR, ".tmp")
+# In-progress resumable uploads: <upload_id>.part (data) + <upload_id>.json (state)
+PARTIAL_DIR = os.path.join(UPLOAD_DIR, ".partial")
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(200 * 1024 * 1024)))
+# Resumable uploads untouched for this many seconds are removed by collect_garbage
+UPLOAD_TTL = int(os.getenv("UPLOAD_TTL", str(24 * 3600)))
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadNotFound(Exception):
+    pass
+
+class UploadBusy(Exception):
+    pass
+
+class InvalidUpload(Exception):
+    pass
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+def new_temp_path():
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return os.path.join(TMP_DIR, uuid.uuid4().hex)
+
+def blob_path(sha256: str, filename: str, suffix: str = ""):
+    file_extension = os.path.splitext(filename or "")[1]
+    name = f"{sha256}-{suffix}" if suffix else sha256
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], f"{name}{file_extension}")
+
+def preview_path(file_path: str):
+    # Previews live next to the original: <name>.preview.jpg
+    return os.path.splitext(file_path)[0] + ".preview.jpg"
+
+def _take_reference(db: Session, sha256: str):
+    """Counts one more reference on a stored blob; returns its file_path, or None if there is no blob."""
+    Blob = models.AttachmentBlob
+    taken = db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {Blob.ref_count: Blob.ref_count + 1}, synchronize_session=False
+    )
+    return db.query(Blob.file_path).filter(Blob.sha256 == sha256).scalar() if taken else None
+
+def _move_into_place(data_path: str, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(data_path, path)
+
+def commit_blob(db: Session, data_path: str, sha256: str, filename: str, file_size: int):
+    """
+    Takes a reference on the blob holding a fully written upload, moving the
+    upload into the blob store unless the content is already stored, and
+    commits. Returns the blob's file_path for the attachment row, which
+    crud.create_subtask_attachment does not count again.
+
+    The reference is counted before the upload is discarded: blobs are only
+    deleted once their count reaches zero, so a concurrent delete of the last
+    other reference cannot unlink the file reused here.
+    """
+    while True:
+        path = _take_reference(db, sha256)
+        if path is not None:
+            break
+        # A blob deleted just now may still have its file awaiting unlink at
+        # the usual path, so a new blob never reuses an existing file
+        path = blob_path(sha256, filename)
+        if os.path.exists(path):
+            path = blob_path(sha256, filename, suffix=uuid.uuid4().hex[:8])
+        db.add(models.AttachmentBlob(sha256=sha256, file_path=path, file_size=file_size, ref_count=1))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another upload stored the same content first; reference that
+            db.rollback()
+            continue
+        _move_into_place(data_path, path)
+        return path
+
+    if os.path.exists(path):
+        os.remove(data_path)
+    else:
+        # The stored file went missing; the upload has the same content
+        _move_into_place(data_path, path)
+    db.commit()
+    return path
+
+class _HashingWriter:
+    """Blocking file writer that hashes as it goes; only used from worker threads."""
+
+    def __init__(self, path: str, mode: str = "wb", hasher=None):
+        self.path = path
+        self.file = open(path, mode)
+        self.hasher = hasher
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.file.write(chunk)
+        if self.hasher is not None:
+            self.hasher.update(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+async def _copy_stream(chunks, writer: _HashingWriter, limit: int):
+    """
+    Copies an async byte stream into writer, batching small network chunks
+    into CHUNK_SIZE writes on the thread pool. Raises UploadTooLarge as soon
+    as more than `limit` bytes have arrived.
+    """
+    received = 0
+    buffer = bytearray()
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+        buffer += chunk
+        if len(buffer) >= CHUNK_SIZE:
+            await run_in_threadpool(writer.write, bytes(buffer))
+            buffer.clear()
+    if buffer:
+        await run_in_threadpool(writer.write, bytes(buffer))
+
+async def save_stream(chunks, dest_path: str, max_size: int = MAX_UPLOAD_SIZE):
+    """
+    Streams chunks to dest_path off the event loop. Returns (size, sha256),
+    with size taken from the bytes written. The partial file is removed on
+    failure.
+    """
+    writer = await run_in_threadpool(_HashingWriter, dest_path, "wb", hashlib.sha256())
+    try:
+        await _copy_stream(chunks, writer, max_size)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    await run_in_threadpool(writer.close)
+    return writer.size, writer.hasher.hexdigest()
+
+async def multipart_file(chunks, content_type: str, field: str, info: dict):
+    """
+    Yields the data of the `field` file part of a multipart/form-data body
+    as it arrives, so save_stream can enforce its limit without the body
+    being spooled first. Fills info with the part's filename and
+    content_type. Raises InvalidUpload for a malformed body or a missing part.
+    """
+    kind, options = parse_options_header(content_type)
+    if kind != b"multipart/form-data" or b"boundary" not in options:
+        raise InvalidUpload("Expected a multipart/form-data body")
+
+    headers, header = {}, [b"", b""]
+    data, found, current = [], [], [False]
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(buf, start, end):
+        header[0] += buf[start:end]
+
+    def on_header_value(buf, start, end):
+        header[1] += buf[start:end]
+
+    def on_header_end():
+        headers[header[0].lower()] = header[1]
+        header[:] = [b"", b""]
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        current[0] = not found and disposition.get(b"name") == field.encode() and b"filename" in disposition
+        if current[0]:
+            found.append(True)
+            info["filename"] = disposition[b"filename"].decode()
+            info["content_type"] = headers.get(b"content-type", b"").decode() or None
+
+    def on_part_data(buf, start, end):
+        if current[0]:
+            data.append(buf[start:end])
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    try:
+        async for chunk in chunks:
+            parser.write(chunk)
+            if data:
+                yield b"".join(data)
+                data.clear()
+        parser.finalize()
+    except ValueError as e:  # the parser's errors
+        raise InvalidUpload(f"Malformed multipart body: {e}") from e
+    if not found:
+        raise InvalidUpload(f"Missing file field {field!r}")
+
+# Resumable uploads
+def _partial_paths(upload_id: str):
+    try:
+        upload_id = uuid.UUID(upload_id).hex
+    except (ValueError, AttributeError):
+        raise UploadNotFound(upload_id)
+    base = os.path.join(PARTIAL_DIR, upload_id)
+    return base + ".part", base + ".json"
+
+def start_upload(subtask_id: int, filename: str, content_type: str, size: int):
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_SIZE} bytes")
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+
+    state = {
+        "upload_id": uuid.uuid4().hex,
+        "subtask_id": subtask_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+    }
+    data_path, state_path = _partial_paths(state["upload_id"])
+    open(data_path, "wb").close()
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    state["offset"] = 0
+    return state
+
+def get_upload(upload_id: str):
+    data_path, state_path = _partial_paths(upload_id)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        state["offset"] = os.path.getsize(data_path)
+    except FileNotFoundError:
+        raise UploadNotFound(upload_id)
+    return state
+
+@contextmanager
+def upload_lock(upload_id: str):
+    """
+    Holds an exclusive lock on an upload (a non-blocking flock on its state
+    file, like scheduler.LeaderLock) across append_upload, finish_upload and
+    cancel_upload. Raises UploadBusy while another request holds it.
+    """
+    _, state_path = _partial_paths(upload_id)
+    try:
+        # Not "a+": that would recreate the state file of a finished upload
+        f = open(state_path, "rb")
+    except FileNotFoundError:
+        raise UploadNotFound(upload_id)
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:  # pragma: no cover - Windows
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise UploadBusy(upload_id)
+        yield
+    finally:
+        f.close()
+
+async def append_upload(upload_id: str, offset: int, chunks):
+    """
+    Appends a chunk stream at `offset`. The offset must equal the bytes
+    already received, so a client that lost a response can ask for the
+    current offset (get_upload) and resend from there. Call it under
+    upload_lock.
+    """
+    state = await run_in_threadpool(get_upload, upload_id)
+    if offset != state["offset"]:
+        raise UploadOffsetMismatch(state["offset"])
+
+    data_path, _ = _partial_paths(upload_id)
+    writer = await run_in_threadpool(_HashingWriter, data_path, "ab")
+    try:
+        await _copy_stream(chunks, writer, state["size"] - offset)
+    finally:
+        await run_in_threadpool(writer.close)
+    state["offset"] = offset + writer.size
+    return state
+
+def _hash_file(path: str):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def finish_upload(state: dict):
+    """
+    Hashes a complete upload and drops its state file. Returns
+    (data_path, size, sha256); pass data_path to commit_blob. Returns None
+    if the upload was already finished. Call it under upload_lock.
+    """
+    data_path, state_path = _partial_paths(state["upload_id"])
+    if not os.path.exists(state_path):
+        return None
+    sha256 = _hash_file(data_path)
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        return None
+    return data_path, state["size"], sha256
+
+def cancel_upload(upload_id: str):
+    for path in _partial_paths(upload_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+# Garbage collection
+def remove_file(path: str):
+    """Best-effort unlink; failures are left for collect_garbage."""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception:
+            logger.exception("Deleting %s failed", path)
+
+def remove_attachment_file(path: str):
+    """Best-effort unlink of an attachment file and its preview."""
+    if path:
+        remove_file(path)
+        remove_file(preview_path(path))
+
+def storage_stats(db: Session):
+    blobs, stored, references, logical = db.query(
+        func.count(models.AttachmentBlob.sha256),
+        func.coalesce(func.sum(models.AttachmentBlob.file_size), 0),
+        func.coalesce(func.sum(models.AttachmentBlob.ref_count), 0),
+        func.coalesce(func.sum(models.AttachmentBlob.file_size * models.AttachmentBlob.ref_count), 0),
+    ).one()
+    return {
+        "blobs": blobs,
+        "references": references,
+        "bytes_stored": stored,
+        "bytes_saved": max(logical - stored, 0),
+    }
+
+def _expire_uploads(report: dict, ttl: int, dry_run: bool):
+    """
+    Removes resumable uploads (PARTIAL_DIR/<id>.part and .json) whose files
+    are all older than ttl seconds, under the upload's lock so a request
+    resuming it at the same moment wins. A .part without state, left when
+    the process died while completing the upload, expires the same way.
+    """
+    if not os.path.isdir(PARTIAL_DIR):
+        return
+    uploads = {}
+    for name in os.listdir(PARTIAL_DIR):
+        uploads.setdefault(os.path.splitext(name)[0], []).append(os.path.join(PARTIAL_DIR, name))
+    cutoff = time.time() - ttl
+
+    def expired(paths):
+        stats = [os.stat(p) for p in paths if os.path.exists(p)]
+        return stats if stats and all(st.st_mtime <= cutoff for st in stats) else None
+
+    for upload_id, paths in uploads.items():
+        if not expired(paths):
+            continue
+        try:
+            with upload_lock(upload_id):
+                stats = expired(paths)
+                if stats and not dry_run:
+                    cancel_upload(upload_id)
+        except UploadBusy:
+            continue
+        except UploadNotFound:
+            # No state file (or not an upload id): nothing can resume it
+            stats = expired(paths)
+            if stats and not dry_run:
+                for path in paths:
+                    remove_file(path)
+        if stats:
+            report["uploads_expired"] += 1
+            report["bytes_freed"] += sum(st.st_size for st in stats)
+
+def collect_garbage(db: Session, grace_seconds: int = 3600, dry_run: bool = False, upload_ttl: int = None):
+    """
+    Reconciles the blob store with the database:
+    - resets each blob's ref_count to the number of attachments using it
+    - removes blobs nobody references
+    - removes files under UPLOAD_DIR that no attachment or blob points to
+      (e.g. left behind when a file deletion failed)
+    - removes resumable uploads idle for upload_ttl seconds (UPLOAD_TTL)
+    Files younger than grace_seconds are kept so in-flight uploads survive.
+    """
+    report = {"ref_counts_fixed": 0, "blobs_removed": 0, "files_removed": 0, "uploads_expired": 0, "bytes_freed": 0}
+    _expire_uploads(report, UPLOAD_TTL if upload_ttl is None else upload_ttl, dry_run)
+
+    counts = dict(
+        db.query(models.SubtaskAttachment.sha256, func.count(models.SubtaskAttachment.id))
+        .filter(models.SubtaskAttachment.sha256.isnot(None))
+        .group_by(models.SubtaskAttachment.sha256)
+    )
+    Blob = models.AttachmentBlob
+    unused = []
+    for sha256, ref_count in db.query(Blob.sha256, Blob.ref_count).all():
+        actual = counts.get(sha256, 0)
+        if actual == 0:
+            unused.append(sha256)
+        elif ref_count != actual:
+            report["ref_counts_fixed"] += 1
+        if ref_count != actual and not dry_run:
+            # Compare-and-set, so a reference taken since the count is not lost
+            db.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count == ref_count).update(
+                {Blob.ref_count: actual}, synchronize_session=False
+            )
+    if not dry_run:
+        db.commit()
+    for sha256 in unused:
+        if dry_run:
+            report["blobs_removed"] += 1
+            continue
+        # Re-checked in the DELETE's own transaction: a blob that gained a
+        # reference meanwhile stays, and so does its file
+        report["blobs_removed"] += db.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count == 0).delete(
+            synchronize_session=False
+        )
+        db.commit()
+
+    live_blobs = db.query(Blob.file_path)
+    if dry_run:
+        live_blobs = live_blobs.filter(Blob.sha256.notin_(unused))
+    live_blob_paths = {os.path.normpath(p) for (p,) in live_blobs}
+    referenced = {os.path.normpath(p) for (p,) in db.query(models.SubtaskAttachment.file_path) if p}
+    referenced |= live_blob_paths
+    referenced |= {os.path.normpath(preview_path(p)) for p in referenced}
+    cutoff = time.time() - grace_seconds
+    for root, dirs, files in os.walk(UPLOAD_DIR):
+        if os.path.normpath(root) == os.path.normpath(UPLOAD_DIR):
+            dirs[:] = [d for d in dirs if d != os.path.basename(PARTIAL_DIR)]
+        for name in files:
+            path = os.path.normpath(os.path.join(root, name))
+            if path in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            report["files_removed"] += 1
+            report["bytes_freed"] += stat.st_size
+            if not dry_run:
+                remove_file(path)
+
+    report.update(storage_stats(db))
+    return report
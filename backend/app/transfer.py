@@ -0,0 +1,255 @@
+from datetime import datetime
+from sqlalchemy import DateTime, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from . import models, search, consumable_status, consumable_analytics
+from .cache import cache
+from .serializers import dumps, loads
+
+# NDJSON export / import of all memos, templates and consumables.
+#
+# One JSON object per line. The first line is a header; every other line is a
+# top-level record carrying its children inline:
+#   {"type": "header", "version": 1, "exported_at": "..."}
+#   {"type": "memo", ...columns, "subtasks": [{...columns, "attachments": [...]}]}
+#   {"type": "template", ...columns, "subtasks": [...]}
+#   {"type": "consumable", ...columns, "logs": [...]}
+# Attachments are exported as metadata only; files are copied separately.
+
+FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 5000
+
+class InvalidImport(ValueError):
+    pass
+
+class ImportConflict(Exception):
+    """A concurrent write collided with the import; retrying it is safe."""
+
+def _row_to_dict(obj):
+    data = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        data[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+def _export_query(db: Session, model, *options):
+    # Keyset pages of EXPORT_BATCH_SIZE parents, each fully fetched before
+    # selectinload fetches its children with one IN query. (A server-side
+    # cursor would still be open during those queries, which PyMySQL cannot
+    # interleave on one connection.)
+    last_id = 0
+    while True:
+        page = (
+            db.query(model).options(*options)
+            .filter(model.id > last_id).order_by(model.id)
+            .limit(EXPORT_BATCH_SIZE).all()
+        )
+        if not page:
+            return
+        yield from page
+        last_id = page[-1].id
+
+def export_records(db: Session):
+    """Yields every record as a dict, with memory bounded by EXPORT_BATCH_SIZE."""
+    yield {"type": "header", "version": FORMAT_VERSION, "exported_at": datetime.now().isoformat()}
+
+    memos = _export_query(
+        db, models.Memo,
+        selectinload(models.Memo.subtasks).selectinload(models.SubTask.attachments),
+    )
+    for memo in memos:
+        record = _row_to_dict(memo)
+        record["subtasks"] = []
+        for st in memo.subtasks:
+            st_record = _row_to_dict(st)
+            st_record["attachments"] = [_row_to_dict(att) for att in st.attachments]
+            record["subtasks"].append(st_record)
+        yield {"type": "memo", **record}
+
+    for template in _export_query(db, models.Template, selectinload(models.Template.subtasks)):
+        record = _row_to_dict(template)
+        record["subtasks"] = [_row_to_dict(st) for st in template.subtasks]
+        yield {"type": "template", **record}
+
+    for consumable in _export_query(db, models.Consumable, selectinload(models.Consumable.logs)):
+        record = _row_to_dict(consumable)
+        record["logs"] = [_row_to_dict(log) for log in consumable.logs]
+        yield {"type": "consumable", **record}
+
+def export_ndjson(db: Session):
+    for record in export_records(db):
+        yield dumps(record) + b"\n"
+
+class _Importer:
+    """
+    Buffers rows per table and writes them with multi-row INSERTs. New ids
+    are allocated up front from each table's current MAX(id), so children
+    can be remapped to their parent's new id without a RETURNING round-trip
+    (MySQL has none). The tables stay locked against inserts until the
+    import commits, so those ids cannot be taken meanwhile.
+    """
+
+    # Parent tables first so foreign keys resolve within a flush
+    TABLES = (
+        models.Memo, models.SubTask, models.SubtaskAttachment,
+        models.Template, models.TemplateSubTask,
+        models.Consumable, models.ConsumableLog,
+    )
+
+    def __init__(self, db: Session, batch_size: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.next_id = self._lock_ids()
+        self.pending = {model: [] for model in self.TABLES}
+        self.buffered = 0
+        self.counts = {model.__tablename__: 0 for model in self.TABLES}
+        # sha256 -> the first imported attachment record with that content
+        self.blobs = {}
+        self._datetime_columns = {
+            model: {c.key for c in model.__table__.columns if isinstance(c.type, DateTime)}
+            for model in self.TABLES
+        }
+        self._columns = {model: {c.key for c in model.__table__.columns} for model in self.TABLES}
+
+    def _lock_ids(self):
+        if self.db.get_bind().dialect.name == "sqlite":
+            # A no-op write takes SQLite's database write lock up front
+            self.db.execute(text("UPDATE memos SET id = id WHERE 0 = 1"))
+        # On MySQL the locking read holds the next-key lock above each
+        # table's last row, which auto-increment inserts wait for
+        return {
+            model: (self.db.execute(
+                select(model.id).order_by(model.id.desc()).limit(1).with_for_update()
+            ).scalar() or 0) + 1
+            for model in self.TABLES
+        }
+
+    def add(self, model, data: dict, **parent):
+        row = {}
+        for key, value in data.items():
+            if key not in self._columns[model]:
+                continue
+            if value is not None and key in self._datetime_columns[model]:
+                try:
+                    value = datetime.fromisoformat(value)
+                except (TypeError, ValueError):
+                    raise InvalidImport(f"Invalid datetime for {model.__tablename__}.{key}: {value!r}")
+            row[key] = value
+        row.update(parent)
+        row["id"] = self.next_id[model]
+        self.next_id[model] += 1
+
+        self.pending[model].append(row)
+        self.counts[model.__tablename__] += 1
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+        return row["id"]
+
+    def flush(self):
+        for model in self.TABLES:
+            rows = self.pending[model]
+            if rows:
+                self.db.execute(insert(model), rows)
+                self.pending[model] = []
+        self.buffered = 0
+
+    def add_record(self, record: dict):
+        kind = record.get("type")
+        if kind == "header":
+            if record.get("version") != FORMAT_VERSION:
+                raise InvalidImport(f"Unsupported export version: {record.get('version')!r}")
+        elif kind == "memo":
+            memo_id = self.add(models.Memo, record)
+            for st in record.get("subtasks") or []:
+                subtask_id = self.add(models.SubTask, st, memo_id=memo_id)
+                for att in st.get("attachments") or []:
+                    self.add(models.SubtaskAttachment, att, subtask_id=subtask_id)
+                    if att.get("sha256"):
+                        self.blobs.setdefault(att["sha256"], att)
+        elif kind == "template":
+            template_id = self.add(models.Template, record)
+            for st in record.get("subtasks") or []:
+                self.add(models.TemplateSubTask, st, template_id=template_id)
+        elif kind == "consumable":
+            consumable_id = self.add(models.Consumable, record)
+            for log in record.get("logs") or []:
+                self.add(models.ConsumableLog, log, consumable_id=consumable_id)
+        else:
+            raise InvalidImport(f"Unknown record type: {kind!r}")
+
+    def index_memos(self, first_memo_id: int):
+        search.index_memos(self.db, range(first_memo_id, self.next_id[models.Memo]))
+
+    def refresh_consumables(self, first_consumable_id: int):
+        # Older exports carry no due columns; derive them like any write does
+        last_id = first_consumable_id - 1
+        while True:
+            rows = consumable_status.refresh_batch(self.db, last_id, EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            last_id = rows[-1].id
+        consumable_analytics.rebuild(self.db, after_id=first_consumable_id - 1)
+
+    def recount_blobs(self):
+        # Imported attachments may share blobs already stored here; the rest
+        # get a blob row of their own (their files are copied separately)
+        Blob, Attachment = models.AttachmentBlob, models.SubtaskAttachment
+        hashes = list(self.blobs)
+        for start in range(0, len(hashes), self.batch_size):
+            batch = hashes[start:start + self.batch_size]
+            counts = dict(
+                self.db.query(Attachment.sha256, func.count(Attachment.id))
+                .filter(Attachment.sha256.in_(batch)).group_by(Attachment.sha256)
+            )
+            existing = set(self.db.scalars(select(Blob.sha256).where(Blob.sha256.in_(batch))))
+            if existing:
+                self.db.execute(update(Blob), [{"sha256": h, "ref_count": counts[h]} for h in existing])
+            new = [
+                {"sha256": h, "file_path": self.blobs[h].get("file_path"),
+                 "file_size": self.blobs[h].get("file_size"), "ref_count": counts[h]}
+                for h in batch if h not in existing
+            ]
+            if new:
+                self.db.execute(insert(Blob), new)
+
+def import_ndjson(db: Session, lines, batch_size: int = IMPORT_BATCH_SIZE):
+    """
+    Imports records from an iterable of NDJSON lines in one transaction.
+    Records get new ids; references between them are remapped. Returns the
+    number of rows inserted per table. Raises InvalidImport on bad input and
+    ImportConflict if a concurrent write collided with it.
+    """
+    importer = _Importer(db, batch_size)
+    first_memo_id = importer.next_id[models.Memo]
+    first_consumable_id = importer.next_id[models.Consumable]
+    try:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except ValueError:
+                raise InvalidImport(f"Line {number}: invalid JSON")
+            if not isinstance(record, dict):
+                raise InvalidImport(f"Line {number}: expected an object")
+            try:
+                importer.add_record(record)
+            except InvalidImport as e:
+                raise InvalidImport(f"Line {number}: {e}")
+        importer.flush()
+        importer.recount_blobs()
+        importer.refresh_consumables(first_consumable_id)
+        importer.index_memos(first_memo_id)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise ImportConflict("Import conflicted with a concurrent write") from e
+    except Exception:
+        db.rollback()
+        raise
+
+    cache.invalidate_memo(None)
+    cache.invalidate_consumables()
+    return importer.counts
@@ -0,0 +1,40 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app.database import SessionLocal
+from app import models, previews, storage
+
+def backfill_previews():
+    parser = argparse.ArgumentParser(description="Generate missing previews for existing attachments")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = db.query(models.SubtaskAttachment.file_path, models.SubtaskAttachment.content_type).distinct().all()
+    finally:
+        db.close()
+
+    jobs = {}
+    for file_path, content_type in rows:
+        content_type = previews.guess_content_type(file_path, content_type)
+        if not file_path or not previews.is_previewable(content_type):
+            continue
+        if os.path.exists(file_path) and not os.path.exists(storage.preview_path(file_path)):
+            jobs[file_path] = content_type
+    print(f"Generating {len(jobs)} previews...")
+
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {path: pool.submit(previews.generate_preview, path, ct) for path, ct in jobs.items()}
+        for path, future in futures.items():
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"Error generating preview for {path}: {e}")
+    print(f"Done: {done} generated, {failed} failed.")
+
+if __name__ == "__main__":
+    backfill_previews()
@@ -0,0 +1,103 @@
+"""
+Cost of encoding a GET /memos/ response: 1,000 memos x 20 subtasks.
+
+before: hand-built dicts with strftime per timestamp, then FastAPI's
+        response_model=List[dict] validation, jsonable_encoder and json.dumps
+after:  serializers.memo_to_dict (cached time formatting) + serializers.dumps
+
+Run from backend/:  python -m benchmarks.bench_serialization [memos] [subtasks]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import serializers
+
+CN_TZ = timezone(timedelta(hours=8))
+
+def legacy_to_cn_time(dt):
+    if not dt:
+        return None
+    if dt.tzinfo is None:
+        return dt.strftime("%Y-%m-%d %H:%M")
+    return dt.astimezone(CN_TZ).strftime("%Y-%m-%d %H:%M")
+
+def legacy_memo_to_dict(memo):
+    return {
+        "id": memo.id,
+        "title": memo.title,
+        "content": memo.content,
+        "category": memo.category,
+        "created_at": legacy_to_cn_time(memo.created_at),
+        "updated_at": legacy_to_cn_time(memo.updated_at),
+        "completed_at": legacy_to_cn_time(memo.completed_at),
+        "deadline": legacy_to_cn_time(memo.deadline),
+        "subtasks": [
+            {
+                "id": st.id,
+                "content": st.content,
+                "is_completed": st.is_completed,
+                "order": st.order,
+                "created_at": legacy_to_cn_time(st.created_at),
+                "start_time": legacy_to_cn_time(st.start_time),
+                "completed_at": legacy_to_cn_time(st.completed_at),
+                "note": st.note,
+                "attachments": []
+            } for st in sorted(memo.subtasks, key=lambda x: x.order)
+        ]
+    }
+
+def make_memos(n_memos, n_subtasks):
+    base = datetime(2026, 1, 1, 9, 0)
+    memos = []
+    for i in range(n_memos):
+        created = base + timedelta(minutes=i)
+        subtasks = [
+            SimpleNamespace(
+                id=i * n_subtasks + j, content=f"步骤 {j}", note=None, is_completed=j % 2 == 0,
+                order=(j + 1) * 1024.0, created_at=created, start_time=None,
+                completed_at=created + timedelta(hours=j) if j % 2 == 0 else None, attachments=[],
+            )
+            for j in range(n_subtasks)
+        ]
+        memos.append(SimpleNamespace(
+            id=i, title=f"备忘 {i}", content="内容", category="work", created_at=created,
+            updated_at=None, completed_at=None, deadline=created + timedelta(days=3), subtasks=subtasks,
+        ))
+    return memos
+
+def before(memos):
+    payload = [legacy_memo_to_dict(m) for m in memos]
+    payload = TypeAdapter(List[dict]).validate_python(payload)
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+
+def after(memos):
+    return serializers.dumps([serializers.memo_to_dict(m) for m in memos])
+
+def best_of(fn, memos, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(memos)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+def run(n_memos=1000, n_subtasks=20):
+    memos = make_memos(n_memos, n_subtasks)
+    assert json.loads(before(memos)) == json.loads(after(memos))
+
+    t_before, size = best_of(before, memos)
+    t_after, _ = best_of(after, memos)
+    print(f"{n_memos} memos x {n_subtasks} subtasks, {size / 1024:.0f} KiB response")
+    print(f"  before: {t_before * 1000:8.1f} ms")
+    print(f"  after:  {t_after * 1000:8.1f} ms  ({t_before / t_after:.1f}x)")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
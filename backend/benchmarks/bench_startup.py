@@ -0,0 +1,80 @@
+"""
+Worker cold start: interpreter + `import app.main`, lifespan startup, and the
+first request, per SCHEMA_CHECK mode, against a migrated SQLite database.
+
+Each mode runs in fresh interpreters; the median of `runs` is reported and
+compared with the budget below. Exits non-zero if a budget is exceeded so
+this can gate CI. With MySQL (DATABASE_URL=...) the create / verify rows
+also include the first connection and the schema round trips that used to
+happen at import.
+
+Run from backend/:  python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Milliseconds
+BUDGET = {
+    "process": int(os.getenv("BUDGET_PROCESS_MS", "1500")),
+    "import": int(os.getenv("BUDGET_IMPORT_MS", "1200")),
+    "startup": int(os.getenv("BUDGET_STARTUP_MS", "150")),
+    "first_request": int(os.getenv("BUDGET_FIRST_REQUEST_MS", "250")),
+}
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+before_startup = time.perf_counter()
+client.__enter__()
+started = time.perf_counter()
+assert client.get("/memos/?limit=20").status_code == 200
+served = time.perf_counter()
+client.__exit__(None, None, None)
+print(json.dumps({
+    "import": (imported - start) * 1000,
+    "startup": (started - before_startup) * 1000,
+    "first_request": (served - started) * 1000,
+}))
+"""
+
+def probe(env):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = (time.perf_counter() - start) * 1000
+    return result
+
+def run(runs=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ, PREVIEWS_ENABLED="0", CACHE_BACKEND="none")
+        if "DATABASE_URL" not in os.environ:
+            base_env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        subprocess.run([sys.executable, "migrate.py"], env=base_env, check=True, capture_output=True)
+
+        over = False
+        print(f"median of {runs} cold starts (ms)      process   import  startup  first request")
+        for mode in ("create", "verify", "skip"):
+            samples = [probe(dict(base_env, SCHEMA_CHECK=mode)) for _ in range(runs)]
+            median = {k: statistics.median(s[k] for s in samples) for k in BUDGET}
+            flags = [k for k in BUDGET if median[k] > BUDGET[k]]
+            over |= bool(flags)
+            print(f"  SCHEMA_CHECK={mode:7}            {median['process']:8.0f} {median['import']:8.0f} "
+                  f"{median['startup']:8.1f} {median['first_request']:14.1f}"
+                  + (f"  OVER: {', '.join(flags)}" if flags else ""))
+        print("  budget                          " + " ".join(
+            f"{BUDGET[k]:8d}" if k != "first_request" else f"{BUDGET[k]:14d}"
+            for k in ("process", "import", "startup", "first_request")
+        ))
+    sys.exit(1 if over else 0)
+
+if __name__ == "__main__":
+    run(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,78 @@
+"""
+NDJSON export / import of 100,000 memos x 5 subtasks on SQLite.
+
+export: transfer.export_ndjson reads keyset pages of EXPORT_BATCH_SIZE
+        memos (id > last ORDER BY id), so peak memory stays flat as the
+        table grows
+import: transfer.import_ndjson into an empty database, IMPORT_BATCH_SIZE
+        rows per multi-row INSERT
+
+Run from backend/:  python -m benchmarks.bench_transfer [memos] [subtasks]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models, transfer
+
+def make_session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False)()
+
+def seed(db, n_memos, n_subtasks):
+    base = datetime(2026, 1, 1, 9, 0)
+    for start in range(0, n_memos, 10000):
+        ids = range(start + 1, min(start + 10000, n_memos) + 1)
+        db.execute(insert(models.Memo), [
+            {"id": i, "title": f"备忘 {i}", "content": "内容", "category": "work",
+             "created_at": base + timedelta(minutes=i), "deadline": base + timedelta(days=i % 30)}
+            for i in ids
+        ])
+        db.execute(insert(models.SubTask), [
+            {"memo_id": i, "content": f"步骤 {j}", "order": (j + 1) * 1024.0,
+             "is_completed": j % 2 == 0, "created_at": base}
+            for i in ids for j in range(n_subtasks)
+        ])
+    db.commit()
+
+def run(n_memos=100000, n_subtasks=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = make_session(os.path.join(tmp, "src.db"))
+        seed(src, n_memos, n_subtasks)
+        export_path = os.path.join(tmp, "export.ndjson")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(export_path, "wb") as f:
+            for line in transfer.export_ndjson(src):
+                f.write(line)
+        t_export = time.perf_counter() - start
+        _, peak_export = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        dest = make_session(os.path.join(tmp, "dest.db"))
+        start = time.perf_counter()
+        with open(export_path, "rb") as f:
+            counts = transfer.import_ndjson(dest, f)
+        t_import = time.perf_counter() - start
+        _, peak_import = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        size = os.path.getsize(export_path)
+        rows = sum(counts.values())
+        print(f"{n_memos} memos x {n_subtasks} subtasks, {size / 1024 / 1024:.1f} MiB export")
+        print(f"  export: {t_export:6.2f} s  peak {peak_export / 1024 / 1024:6.1f} MiB")
+        print(f"  import: {t_import:6.2f} s  peak {peak_import / 1024 / 1024:6.1f} MiB  ({rows / t_import:,.0f} rows/s)")
+        src.close()
+        dest.close()
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
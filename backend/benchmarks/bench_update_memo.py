@@ -0,0 +1,55 @@
+"""
+Statement counts for PUT /memos/{id} on a large memo with a single edit.
+
+Run from backend/:  python -m benchmarks.bench_update_memo [subtasks]
+"""
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models, schemas
+
+def run(n_subtasks: int = 500):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    memo = crud.create_memo(db, schemas.MemoCreate(
+        title="Big checklist",
+        content="",
+        subtasks=[schemas.SubTaskCreate(content=f"Item {i}") for i in range(n_subtasks)],
+    ))
+    payload = [
+        schemas.SubTaskCreate(
+            id=st.id, content=st.content, note=st.note, is_completed=st.is_completed,
+            created_at=st.created_at, start_time=st.start_time, completed_at=st.completed_at,
+        )
+        for st in memo.subtasks
+    ]
+    payload[n_subtasks // 2].content = "Edited"
+
+    statements = Counter()
+    rows = Counter()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.split(None, 1)[0].upper()
+        statements[verb] += 1
+        rows[verb] += len(parameters) if executemany else 1
+
+    start = time.perf_counter()
+    crud.update_memo(db, memo.id, schemas.MemoUpdate(subtasks=payload))
+    elapsed = time.perf_counter() - start
+
+    print(f"update_memo with {n_subtasks} subtasks, 1 edited: {elapsed * 1000:.1f} ms")
+    for verb in sorted(statements):
+        print(f"  {verb:<7} statements={statements[verb]:<4} rows={rows[verb]}")
+    db.close()
+    return statements, rows
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,111 @@
+"""
+Read-endpoint load test: sync (thread pool) vs async (DB_ASYNC=1) sessions.
+
+Starts uvicorn once per mode with the same worker count against the same
+seeded database, with the payload cache off so every request reaches the
+database, then keeps `concurrency` requests in flight against /memos/,
+/consumables/ and /templates/ and reports throughput and latency.
+
+Defaults to a temporary SQLite database; set DATABASE_URL to load-test
+MySQL (it must already hold data).
+
+Run from backend/:
+    python -m benchmarks.load_test [concurrency] [seconds] [workers]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PORT = 8765
+PATHS = ["/memos/?limit=20", "/consumables/?limit=20", "/templates/?limit=20"]
+
+def seed(url):
+    from datetime import datetime
+    from sqlalchemy import insert
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+    from app.database import create_db_engine
+
+    engine = create_db_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime(2026, 1, 1)
+    db.execute(insert(models.Memo), [{"id": i, "title": f"备忘 {i}", "content": "", "created_at": now} for i in range(1, 501)])
+    db.execute(insert(models.SubTask), [
+        {"memo_id": i, "content": f"步骤 {j}", "order": (j + 1) * 1024.0, "created_at": now}
+        for i in range(1, 501) for j in range(5)
+    ])
+    db.execute(insert(models.Consumable), [{"name": f"耗材 {i}", "status": "正常"} for i in range(200)])
+    db.execute(insert(models.Template), [{"id": i, "title": f"模板 {i}", "content": ""} for i in range(1, 51)])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+def start_server(url, async_mode, workers):
+    env = dict(os.environ, DATABASE_URL=url, DB_ASYNC="1" if async_mode else "0",
+               CACHE_BACKEND="none", PREVIEWS_ENABLED="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/debug/pool").status_code == 200:
+                return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+async def hammer(concurrency, seconds):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        stop_at = time.monotonic() + seconds
+
+        async def user(n):
+            nonlocal errors
+            i = n
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                response = await client.get(PATHS[i % len(PATHS)])
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+                i += 1
+
+        await asyncio.gather(*(user(n) for n in range(concurrency)))
+    return latencies, errors
+
+def report(label, latencies, errors, seconds):
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"  {label:6} {len(latencies) / seconds:8.1f} req/s  p50 {p(0.5):7.1f} ms  "
+          f"p99 {p(0.99):7.1f} ms  mean {statistics.mean(latencies) * 1000:7.1f} ms  errors {errors}")
+
+def run(concurrency=200, seconds=10, workers=1):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.getenv("DATABASE_URL")
+        if not url:
+            url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            seed(url)
+        print(f"{concurrency} concurrent clients, {workers} worker(s), {seconds}s per mode")
+        for label, async_mode in (("sync", False), ("async", True)):
+            proc = start_server(url, async_mode, workers)
+            try:
+                latencies, errors = asyncio.run(hammer(concurrency, seconds))
+            finally:
+                proc.terminate()
+                proc.wait()
+            report(label, latencies, errors, seconds)
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*args)
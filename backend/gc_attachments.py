@@ -0,0 +1,23 @@
+import argparse
+from app.database import SessionLocal
+from app import storage
+
+def gc_attachments():
+    parser = argparse.ArgumentParser(description="Reconcile attachment blobs with the database")
+    parser.add_argument("--dry-run", action="store_true", help="report without deleting anything")
+    parser.add_argument("--grace", type=int, default=3600, help="keep files younger than this many seconds")
+    parser.add_argument("--upload-ttl", type=int, default=storage.UPLOAD_TTL,
+                        help="remove resumable uploads idle for this many seconds")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = storage.collect_garbage(db, grace_seconds=args.grace, dry_run=args.dry_run, upload_ttl=args.upload_ttl)
+    finally:
+        db.close()
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    gc_attachments()
@@ -0,0 +1,34 @@
+import argparse
+from app import migrations
+from app.database import get_engine
+
+# Brings the database schema up to date. Run on every deploy, before the
+# new code starts serving:
+#   python migrate.py             apply pending migrations
+#   python migrate.py --status    list applied / pending versions
+#   python migrate.py --dry-run   print what would run
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--dry-run", action="store_true", help="print the statements without running them")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--batch-size", type=int, default=migrations.BACKFILL_BATCH_SIZE,
+                        help="rows per backfill transaction")
+    parser.add_argument("--batch-pause", type=float, default=0.0,
+                        help="seconds to sleep between backfill batches")
+    args = parser.parse_args()
+
+    if args.status:
+        applied = migrations.applied_versions(get_engine())
+        for version, name, _ in migrations.MIGRATIONS:
+            print(f"{'applied' if version in applied else 'pending'}  {version:03d} {name}")
+        return
+
+    done = migrations.migrate(get_engine(), dry_run=args.dry_run, batch_size=args.batch_size, batch_pause=args.batch_pause)
+    if not done:
+        print("Schema is up to date.")
+    elif not args.dry_run:
+        print(f"Applied {len(done)} migration(s); now at version {migrations.head_version()}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from app import models, search
+from app.database import SessionLocal, get_engine
+
+# Rebuilds the SQLite search_fts index from the memo and subtask tables, e.g.
+# for a database created before search existed. MySQL needs
+# no rebuild: its FULLTEXT indexes are maintained by InnoDB (see migrate.py).
+
+def rebuild_search_index():
+    models.Base.metadata.create_all(bind=get_engine())
+    db = SessionLocal()
+    try:
+        count = search.rebuild(db)
+        print(f"Indexed {count} memos")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_search_index()
@@ -0,0 +1,15 @@
+from app.database import SessionLocal
+from app import consumable_status
+
+# The app's scheduler (app/scheduler.py) runs this sweep every interval;
+# run this from cron instead when it is disabled (SCHEDULER_ENABLED=0).
+def sweep_consumables():
+    db = SessionLocal()
+    try:
+        changed = consumable_status.sweep(db)
+    finally:
+        db.close()
+    print(f"updated {len(changed)} consumable(s)")
+
+if __name__ == "__main__":
+    sweep_consumables()
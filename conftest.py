@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+# Tests never need the MySQL server
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Tests that want the scheduler call scheduler.run_tick themselves
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+
+from app import models  # noqa: E402
+from app.database import create_db_engine  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    engine = create_db_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def query_counter(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def app_engine(monkeypatch, tmp_path):
+    from app import database
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(database, "_engine", engine)
+    # The app writes uploads/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(app_engine):
+    from app import main
+    with TestClient(main.app) as client:
+        client.engine = app_engine
+        yield client
@@ -0,0 +1,47 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud, models, schemas
+from app.cache import LRUBackend, PayloadCache
+from app.database import create_async_db_engine, to_async_url
+
+
+def test_async_urls():
+    assert to_async_url("mysql+pymysql://u:p@db/memo_db").drivername == "mysql+aiomysql"
+    assert to_async_url("sqlite:///notebook.db").drivername == "sqlite+aiosqlite"
+
+
+def test_sync_crud_runs_on_async_session(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        Session = async_sessionmaker(bind=engine, autoflush=False)
+        async with Session() as session:
+            await session.run_sync(crud.create_memo, schemas.MemoCreate(
+                title="async", content="", subtasks=[schemas.SubTaskCreate(content="a")]
+            ))
+            memos = await session.run_sync(crud.get_memos)
+            journal = (await session.execute(text("PRAGMA journal_mode"))).scalar()
+        await engine.dispose()
+        return memos, journal
+
+    memos, journal = asyncio.run(scenario())
+    assert [(m.title, [st.content for st in m.subtasks]) for m in memos] == [("async", ["a"])]
+    assert journal == "wal"
+
+
+def test_aget_or_set_caches_async_loader():
+    cache = PayloadCache(LRUBackend())
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    first = asyncio.run(cache.aget_or_set("k", loader))
+    second = asyncio.run(cache.aget_or_set("k", loader))
+    assert first == second and len(calls) == 1
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,118 @@
+import hashlib
+import os
+from email.utils import formatdate
+
+from sqlalchemy.orm import Session
+
+from app import crud, schemas, storage
+
+DATA = b"0123456789" * 10
+
+
+def _attachment(engine, sha256=None, name="doc.txt"):
+    path = os.path.join("uploads", name)
+    with open(path, "wb") as f:
+        f.write(DATA)
+    with Session(engine) as db:
+        memo = crud.create_memo(db, schemas.MemoCreate(
+            title="t", content="", subtasks=[schemas.SubTaskCreate(content="s")]
+        ))
+        attachment = crud.create_subtask_attachment(db, schemas.SubtaskAttachmentCreate(
+            filename=name, file_path=path, file_size=len(DATA), content_type="text/plain", sha256=sha256,
+        ), memo.subtasks[0].id)
+        return attachment.id, path
+
+
+def test_etag_is_the_content_hash(client):
+    sha256 = hashlib.sha256(DATA).hexdigest()
+    attachment_id, _ = _attachment(client.engine, sha256=sha256)
+
+    response = client.get(f"/attachments/{attachment_id}/content")
+
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["etag"] == f'"{sha256}"'
+    assert response.headers["cache-control"] == "private, max-age=31536000, immutable"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_legacy_etag_falls_back_to_mtime_and_size(client):
+    attachment_id, path = _attachment(client.engine)
+    stat = os.stat(path)
+
+    response = client.get(f"/attachments/{attachment_id}/content")
+
+    assert response.headers["etag"] == f'"{int(stat.st_mtime)}-{stat.st_size}"'
+
+
+def test_if_none_match_returns_304(client):
+    attachment_id, _ = _attachment(client.engine, sha256=hashlib.sha256(DATA).hexdigest())
+    etag = client.get(f"/attachments/{attachment_id}/content").headers["etag"]
+
+    response = client.get(f"/attachments/{attachment_id}/content", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    changed = client.get(f"/attachments/{attachment_id}/content", headers={"If-None-Match": '"other"'})
+    assert changed.status_code == 200
+
+
+def test_if_modified_since_returns_304(client):
+    attachment_id, path = _attachment(client.engine)
+    mtime = os.stat(path).st_mtime
+
+    response = client.get(f"/attachments/{attachment_id}/content",
+                          headers={"If-Modified-Since": formatdate(mtime, usegmt=True)})
+    assert response.status_code == 304
+
+    older = client.get(f"/attachments/{attachment_id}/content",
+                       headers={"If-Modified-Since": formatdate(mtime - 60, usegmt=True)})
+    assert older.status_code == 200
+
+
+def test_range_request_returns_206(client):
+    attachment_id, _ = _attachment(client.engine, sha256=hashlib.sha256(DATA).hexdigest())
+
+    response = client.get(f"/attachments/{attachment_id}/content", headers={"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.content == DATA[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+
+
+def test_head_sends_headers_only(client):
+    attachment_id, _ = _attachment(client.engine, sha256=hashlib.sha256(DATA).hexdigest())
+
+    response = client.head(f"/attachments/{attachment_id}/content")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(DATA))
+    assert response.headers["etag"] == f'"{hashlib.sha256(DATA).hexdigest()}"'
+
+
+def test_missing_file_is_404(client):
+    attachment_id, path = _attachment(client.engine)
+    os.remove(path)
+
+    response = client.get(f"/attachments/{attachment_id}/content")
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Attachment file missing"
+    assert client.get("/attachments/999/content").status_code == 404
+
+
+def test_upload_then_download(client, monkeypatch):
+    memo = client.post("/memos/", json={"title": "t", "content": "", "subtasks": [{"content": "s"}]}).json()
+    subtask_id = memo["subtasks"][0]["id"]
+
+    uploaded = client.post(f"/subtasks/{subtask_id}/attachments", files={"file": ("doc.txt", DATA, "text/plain")})
+    assert uploaded.status_code == 200
+    attachment = uploaded.json()
+    assert (attachment["filename"], attachment["file_size"]) == ("doc.txt", len(DATA))
+    assert client.get(f"/attachments/{attachment['id']}/content").content == DATA
+
+    monkeypatch.setattr(storage, "MAX_UPLOAD_SIZE", len(DATA) - 1)
+    too_large = client.post(f"/subtasks/{subtask_id}/attachments", files={"file": ("doc.txt", DATA, "text/plain")})
+    assert too_large.status_code == 413
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+from app import crud, models, schemas, storage
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(storage.UPLOAD_DIR)
+    return tmp_path / storage.UPLOAD_DIR
+
+
+def test_save_stream_hashes_and_counts_bytes():
+    data = os.urandom(storage.CHUNK_SIZE + 123)
+    path = storage.new_temp_path()
+
+    size, sha256 = asyncio.run(storage.save_stream(_chunks(data[:1000], data[1000:]), path))
+
+    assert size == len(data)
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_save_stream_enforces_limit_mid_stream():
+    path = storage.new_temp_path()
+    with pytest.raises(storage.UploadTooLarge):
+        asyncio.run(storage.save_stream(_chunks(b"x" * 10, b"x" * 10), path, max_size=15))
+    assert not os.path.exists(path)
+
+
+def test_resumable_upload_roundtrip():
+    state = storage.start_upload(1, "doc.pdf", "application/pdf", 8)
+
+    state = asyncio.run(storage.append_upload(state["upload_id"], 0, _chunks(b"1234")))
+    assert state["offset"] == 4
+    with pytest.raises(storage.UploadOffsetMismatch) as exc:
+        asyncio.run(storage.append_upload(state["upload_id"], 0, _chunks(b"1234")))
+    assert exc.value.offset == 4
+    with pytest.raises(storage.UploadTooLarge):
+        asyncio.run(storage.append_upload(state["upload_id"], 4, _chunks(b"567890")))
+
+    state = asyncio.run(storage.append_upload(state["upload_id"], 4, _chunks(b"5678")))
+    data_path, size, sha256 = storage.finish_upload(state)
+
+    assert (size, sha256) == (8, hashlib.sha256(b"12345678").hexdigest())
+    with open(data_path, "rb") as f:
+        assert f.read() == b"12345678"
+    with pytest.raises(storage.UploadNotFound):
+        storage.get_upload(state["upload_id"])
+
+
+def test_upload_lock_serializes_requests():
+    state = storage.start_upload(1, "doc.pdf", "application/pdf", 4)
+    upload_id = state["upload_id"]
+
+    with storage.upload_lock(upload_id):
+        with pytest.raises(storage.UploadBusy):
+            with storage.upload_lock(upload_id):
+                pass
+        state = asyncio.run(storage.append_upload(upload_id, 0, _chunks(b"1234")))
+        assert storage.finish_upload(state) is not None
+        # A second completion finds the upload already finished
+        assert storage.finish_upload(state) is None
+
+    with pytest.raises(storage.UploadNotFound):
+        with storage.upload_lock(upload_id):
+            pass
+
+
+def test_garbage_collector_expires_idle_uploads(db):
+    idle = storage.start_upload(1, "old.pdf", "application/pdf", 4)
+    live = storage.start_upload(1, "new.pdf", "application/pdf", 4)
+    busy = storage.start_upload(1, "busy.pdf", "application/pdf", 4)
+    # Left by a crash between finish_upload and the commit
+    orphan = os.path.join(storage.PARTIAL_DIR, "0" * 32 + ".part")
+    open(orphan, "wb").close()
+    old = time.time() - 7200
+    for upload in (idle, busy):
+        for path in storage._partial_paths(upload["upload_id"]):
+            os.utime(path, (old, old))
+    os.utime(orphan, (old, old))
+
+    with storage.upload_lock(busy["upload_id"]):
+        report = storage.collect_garbage(db, upload_ttl=3600)
+
+    assert report["uploads_expired"] == 2
+    with pytest.raises(storage.UploadNotFound):
+        storage.get_upload(idle["upload_id"])
+    assert not os.path.exists(orphan)
+    assert storage.get_upload(live["upload_id"])["offset"] == 0
+    assert storage.get_upload(busy["upload_id"])["offset"] == 0
+
+
+def _multipart(*parts, boundary="b0undary"):
+    body = b""
+    for headers, data in parts:
+        body += f"--{boundary}\r\n{headers}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def test_multipart_file_streams_the_file_part():
+    data = os.urandom(5000)
+    body, content_type = _multipart(
+        ('Content-Disposition: form-data; name="note"', b"not the file"),
+        ('Content-Disposition: form-data; name="file"; filename="pic.png"\r\nContent-Type: image/png', data),
+    )
+    info = {}
+    path = storage.new_temp_path()
+    chunks = _chunks(*(body[i:i + 700] for i in range(0, len(body), 700)))
+
+    size, sha256 = asyncio.run(storage.save_stream(storage.multipart_file(chunks, content_type, "file", info), path))
+
+    assert (size, sha256) == (len(data), hashlib.sha256(data).hexdigest())
+    assert info == {"filename": "pic.png", "content_type": "image/png"}
+
+
+def test_multipart_file_enforces_limit_and_needs_the_part():
+    body, content_type = _multipart(('Content-Disposition: form-data; name="file"; filename="a"', b"x" * 100))
+    path = storage.new_temp_path()
+    with pytest.raises(storage.UploadTooLarge):
+        asyncio.run(storage.save_stream(
+            storage.multipart_file(_chunks(body[:60], body[60:]), content_type, "file", {}), path, max_size=50
+        ))
+    assert not os.path.exists(path)
+
+    body, content_type = _multipart(('Content-Disposition: form-data; name="other"', b"x"))
+    with pytest.raises(storage.InvalidUpload):
+        asyncio.run(storage.save_stream(storage.multipart_file(_chunks(body), content_type, "file", {}), path))
+    with pytest.raises(storage.InvalidUpload):
+        asyncio.run(storage.save_stream(storage.multipart_file(_chunks(b"{}"), "application/json", "file", {}), path))
+
+
+def test_upload_id_cannot_escape_partial_dir():
+    with pytest.raises(storage.UploadNotFound):
+        storage.get_upload("../../etc/passwd")
+
+
+def _attach(db, subtask_id, data, filename="doc.pdf"):
+    tmp = storage.new_temp_path()
+    size, sha256 = asyncio.run(storage.save_stream(_chunks(data), tmp))
+    file_path = storage.commit_blob(db, tmp, sha256, filename, size)
+    return crud.create_subtask_attachment(db, schemas.SubtaskAttachmentCreate(
+        filename=filename, file_path=file_path, file_size=size,
+        content_type="application/pdf", sha256=sha256,
+    ), subtask_id)
+
+
+def _subtasks(db, n):
+    memo = crud.create_memo(db, schemas.MemoCreate(
+        title="t", content="", subtasks=[schemas.SubTaskCreate(content=str(i)) for i in range(n)]
+    ))
+    return memo.id, [st.id for st in memo.subtasks]
+
+
+def test_duplicate_content_is_stored_once(db):
+    _, (a, b) = _subtasks(db, 2)
+    first = _attach(db, a, b"same pdf")
+    second = _attach(db, b, b"same pdf", filename="copy.pdf")
+
+    assert first.file_path == second.file_path
+    assert crud.get_blob(db, first.sha256).ref_count == 2
+    assert storage.storage_stats(db)["bytes_saved"] == len(b"same pdf")
+    assert os.listdir(storage.TMP_DIR) == []
+
+    _, unused = crud.delete_subtask_attachment(db, first.id)
+    assert unused is None
+    assert os.path.exists(second.file_path)
+
+    _, unused = crud.delete_subtask_attachment(db, second.id)
+    assert unused == second.file_path
+    assert crud.get_blob(db, second.sha256) is None
+
+
+def test_upload_takes_its_reference_before_reusing_a_blob(db):
+    _, (a, b) = _subtasks(db, 2)
+    first = _attach(db, a, b"racy")
+    path, sha256 = first.file_path, first.sha256
+
+    # The second upload counts its reference before the first one goes away
+    tmp = storage.new_temp_path()
+    size, _ = asyncio.run(storage.save_stream(_chunks(b"racy"), tmp))
+    assert storage.commit_blob(db, tmp, sha256, "doc.pdf", size) == path
+    _, unused = crud.delete_subtask_attachment(db, first.id)
+
+    assert unused is None
+    assert crud.get_blob(db, sha256).ref_count == 1
+    assert os.path.exists(path)
+
+
+def test_commit_blob_restores_a_missing_file(db):
+    _, (a, b) = _subtasks(db, 2)
+    first = _attach(db, a, b"lost")
+    os.remove(first.file_path)
+
+    second = _attach(db, b, b"lost")
+
+    assert second.file_path == first.file_path
+    with open(second.file_path, "rb") as f:
+        assert f.read() == b"lost"
+
+
+def test_new_blob_never_reuses_a_file_awaiting_unlink(db):
+    _, (a, b) = _subtasks(db, 2)
+    first = _attach(db, a, b"again")
+    path = first.file_path
+    # Deleted, but its file not unlinked yet
+    crud.delete_subtask_attachment(db, first.id)
+
+    second = _attach(db, b, b"again")
+
+    assert second.file_path != path
+    storage.remove_attachment_file(path)
+    with open(second.file_path, "rb") as f:
+        assert f.read() == b"again"
+
+
+def test_deleting_memo_or_subtask_unlinks_released_blobs(db):
+    memo_id, (a, b) = _subtasks(db, 2)
+    shared = _attach(db, a, b"shared")
+    _attach(db, b, b"shared")
+    only = _attach(db, b, b"only")
+    only_path, only_sha256 = only.file_path, only.sha256
+    shared_path, shared_sha256 = shared.file_path, shared.sha256
+    preview = storage.preview_path(only_path)
+    open(preview, "w").close()
+
+    crud.update_memo(db, memo_id, schemas.MemoUpdate(subtasks=[schemas.SubTaskCreate(id=a, content="0")]))
+    assert not os.path.exists(only_path)
+    assert not os.path.exists(preview)
+    assert crud.get_blob(db, only_sha256) is None
+    assert crud.get_blob(db, shared_sha256).ref_count == 1
+
+    crud.delete_memo(db, memo_id)
+    assert not os.path.exists(shared_path)
+    assert crud.get_blob(db, shared_sha256) is None
+
+
+def test_garbage_collector_reconciles(db):
+    memo_id, (a,) = _subtasks(db, 1)
+    kept = _attach(db, a, b"kept")
+    # A blob whose reference count missed a release
+    _, (b,) = _subtasks(db, 1)
+    dropped = _attach(db, b, b"dropped")
+    dropped_path = dropped.file_path
+    db.query(models.SubtaskAttachment).filter(models.SubtaskAttachment.id == dropped.id).delete()
+    db.commit()
+    orphan = os.path.join(storage.UPLOAD_DIR, "legacy-orphan.txt")
+    with open(orphan, "w") as f:
+        f.write("left behind")
+
+    dry = storage.collect_garbage(db, grace_seconds=0, dry_run=True)
+    assert os.path.exists(orphan)
+    assert dry["files_removed"] == 2
+    assert dry["blobs_removed"] == 1
+
+    report = storage.collect_garbage(db, grace_seconds=0)
+
+    assert report["blobs_removed"] == 1
+    assert report["files_removed"] == 2
+    assert not os.path.exists(orphan)
+    assert not os.path.exists(dropped_path)
+    assert os.path.exists(kept.file_path)
+    assert report["blobs"] == 1
+
+
+def test_garbage_collector_keeps_blob_referenced_meanwhile(db, monkeypatch):
+    _, (a,) = _subtasks(db, 1)
+    sha256 = _attach(db, a, b"contended").sha256
+    db.query(models.SubtaskAttachment).delete()
+    db.commit()
+
+    # Another request attaches the same content after the collector counted
+    # references but before it deletes the blob
+    real_commit = db.commit
+    def commit():
+        real_commit()
+        if crud.get_blob(db, sha256).ref_count == 0 and not reattached:
+            reattached.append(_attach(db, a, b"contended"))
+    reattached = []
+    monkeypatch.setattr(db, "commit", commit)
+
+    report = storage.collect_garbage(db, grace_seconds=0)
+
+    assert report["blobs_removed"] == 0
+    assert crud.get_blob(db, sha256).ref_count == 1
+    assert os.path.exists(reattached[0].file_path)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from app import consumable_analytics, crud, models, schemas
+from app.serializers import consumable_to_dict
+
+
+def _replace_history(db, name, intervals, category="家", km=None):
+    start = datetime(2025, 1, 1)
+    c = crud.create_consumable(db, schemas.ConsumableCreate(
+        name=name, category=category, last_replaced=start, mileage=0 if km else None
+    ))
+    when, mileage = start, 0
+    for i, days in enumerate(intervals):
+        when += timedelta(days=days)
+        if km:
+            mileage += km[i]
+        crud.replace_consumable(db, c.id, when, mileage=mileage if km else None)
+    return c
+
+
+def test_incremental_sums_match_rebuild(db):
+    _replace_history(db, "a", [30, 28, 26, 24])
+    _replace_history(db, "b", [10, 10], km=[5000, 6000])
+    crud.create_consumable(db, schemas.ConsumableCreate(name="never replaced"))
+
+    def snapshot():
+        return sorted(
+            tuple(getattr(s, c.key) for c in models.ConsumableStats.__table__.columns)
+            for s in db.query(models.ConsumableStats)
+        )
+
+    incremental = snapshot()
+    consumable_analytics.rebuild(db)
+    db.commit()
+    db.expire_all()
+    assert snapshot() == incremental
+
+
+def test_summary_trend_and_prediction(db):
+    c = _replace_history(db, "filter", [30, 28, 26, 24])
+    summary = consumable_analytics.summary(c)
+    assert summary["replacements"] == 4
+    assert summary["days"]["mean"] == 27.0
+    assert (summary["days"]["trend"], summary["days"]["direction"]) == (-2.0, "shorter")
+    assert summary["days"]["predicted_interval"] == 22
+    assert summary["predicted_next_at"] == (c.last_replaced + timedelta(days=22)).isoformat()
+    assert summary["km"]["intervals"] == 0
+
+
+def test_analytics_medians_and_categories(db):
+    _replace_history(db, "oil", [90, 100, 200], category="车", km=[5000, 5200, 9000])
+    _replace_history(db, "wipers", [300], category="车", km=[8000])
+    _replace_history(db, "filter", [30, 40], category="家")
+
+    result = consumable_analytics.analytics(db)
+    oil = result["consumables"][0]
+    assert (oil["days"]["median"], oil["km"]["median"]) == (100.0, 5200.0)
+    assert oil["predicted_next_km"] == 19200 + oil["km"]["predicted_interval"]
+
+    by_category = {c["category"]: c for c in result["categories"]}
+    assert by_category["车"]["km"] == {"intervals": 4, "mean": 6800.0, "median": 6600.0}
+    assert by_category["家"]["days"]["median"] == 35.0
+
+    only_home = consumable_analytics.analytics(db, category="家")
+    assert [c["name"] for c in only_home["consumables"]] == ["filter"]
+
+
+def test_list_payload_is_bounded(db):
+    c = _replace_history(db, "filter", [10] * (consumable_analytics.CONSUMABLE_LOG_LIMIT + 3))
+    db.expunge_all()
+    [loaded] = crud.get_consumables(db)
+    payload = consumable_to_dict(loaded)
+    assert len(payload["logs"]) == consumable_analytics.CONSUMABLE_LOG_LIMIT
+    assert payload["logs"][0]["replaced_at"] > payload["logs"][-1]["replaced_at"]
+    assert payload["log_summary"]["replacements"] == consumable_analytics.CONSUMABLE_LOG_LIMIT + 3
+    assert len(crud.get_consumable_logs(db, c.id)) == consumable_analytics.CONSUMABLE_LOG_LIMIT + 3
+
+
+def test_backdated_log_matches_rebuild(db):
+    c = _replace_history(db, "oil", [30, 20, 10], km=[3000, 4000, 5000])
+    # Logged late: an older date, but a km interval that counts
+    crud.replace_consumable(db, c.id, datetime(2025, 1, 15), mileage=14000)
+    db.expire_all()
+    incremental = consumable_analytics.summary(crud.get_consumable(db, c.id))
+
+    consumable_analytics.rebuild(db)
+    db.commit()
+    db.expire_all()
+    assert consumable_analytics.summary(crud.get_consumable(db, c.id)) == incremental
+    assert incremental["replacements"] == 4
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from app import consumable_status, crud, schemas
+from app.consumable_status import STATUS_DUE_SOON, STATUS_NORMAL, STATUS_OVERDUE
+
+
+def _create(db, **fields):
+    fields.setdefault("name", "c")
+    return crud.create_consumable(db, schemas.ConsumableCreate(**fields))
+
+
+def test_status_derived_on_write(db):
+    now = datetime.now()
+    fresh = _create(db, last_replaced=now, lifespan=30)
+    soon = _create(db, last_replaced=now - timedelta(days=25), lifespan=30)
+    late = _create(db, last_replaced=now - timedelta(days=40), lifespan=30, status=STATUS_NORMAL)
+    expiring = _create(db, last_replaced=now, lifespan=30, expiry_date=now + timedelta(days=2))
+    assert [c.status for c in (fresh, soon, late, expiring)] == [
+        STATUS_NORMAL, STATUS_DUE_SOON, STATUS_OVERDUE, STATUS_DUE_SOON
+    ]
+    assert expiring.next_due_at.date() == (now + timedelta(days=2)).date()
+
+    crud.replace_consumable(db, late.id, now)
+    assert crud.get_consumable(db, late.id).status == STATUS_NORMAL
+
+
+def test_km_status(db):
+    car = _create(db, category="车", mileage=10000, current_mileage=14700, lifespan_km=5000, lifespan=3650,
+                  last_replaced=datetime.now())
+    assert (car.next_due_km, car.status) == (15000, STATUS_DUE_SOON)
+
+    crud.update_consumable(db, car.id, schemas.ConsumableUpdate(
+        name="c", category="车", mileage=10000, current_mileage=15100, lifespan_km=5000, lifespan=3650,
+        last_replaced=car.last_replaced,
+    ))
+    assert crud.get_consumable(db, car.id).status == STATUS_OVERDUE
+
+
+def test_no_due_data_keeps_manual_status(db):
+    assert _create(db, status="自定义").status == "自定义"
+
+
+def test_sweep_only_moves_rows_crossing_a_threshold(db):
+    now = datetime.now()
+    ids = [_create(db, last_replaced=now - timedelta(days=age), lifespan=30).id for age in (0, 20, 28)]
+    assert consumable_status.sweep(db, now) == []
+
+    later = now + timedelta(days=5)
+    assert consumable_status.sweep(db, later) == [(ids[1], STATUS_DUE_SOON), (ids[2], STATUS_OVERDUE)]
+    statuses = [crud.get_consumable(db, i).status for i in ids]
+    assert statuses == [STATUS_NORMAL, STATUS_DUE_SOON, STATUS_OVERDUE]
+    assert consumable_status.sweep(db, later) == []
+
+
+def test_due_list_is_ordered_by_due_date(db):
+    now = datetime.now()
+    _create(db, last_replaced=now, lifespan=300)
+    a = _create(db, last_replaced=now - timedelta(days=27), lifespan=30)
+    b = _create(db, last_replaced=now - timedelta(days=31), lifespan=30)
+    assert [c.id for c in crud.get_due_consumables(db)] == [b.id, a.id]
+
+
+def test_sweep_uses_due_index(db):
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN SELECT id FROM consumables WHERE next_due_at <= ? AND status != ?",
+        (datetime.now(), STATUS_OVERDUE),
+    ).fetchall()
+    assert any("ix_consumables_next_due_at" in row[-1] for row in plan)
+
+
+def test_record_mileage_updates_category_in_one_statement(db, query_counter):
+    now = datetime.now()
+    fields = dict(category="车", mileage=10000, lifespan_km=5000, lifespan=3650, last_replaced=now)
+    oil = _create(db, name="oil", **fields)
+    tyres = _create(db, name="tyres", **{**fields, "lifespan_km": 40000})
+    manual = _create(db, name="manual", category="车", status="自定义")
+    home = _create(db, name="filter", mileage=0, lifespan_km=100)
+
+    query_counter.clear()
+    updated, changed = crud.record_mileage(db, "车", 14600)
+    assert sum(s.lstrip().upper().startswith("UPDATE") for s in query_counter) == 1
+    assert updated == 3
+    assert [(c.id, c.status) for c in changed] == [(oil.id, STATUS_DUE_SOON)]
+
+    db.expire_all()
+    assert [crud.get_consumable(db, i).current_mileage for i in (oil.id, tyres.id, manual.id)] == [14600] * 3
+    assert crud.get_consumable(db, manual.id).status == "自定义"
+    assert crud.get_consumable(db, home.id).current_mileage == 0
+
+    _, changed = crud.record_mileage(db, "车", 15000)
+    assert [(c.id, c.status) for c in changed] == [(oil.id, STATUS_OVERDUE)]
+    assert crud.record_mileage(db, "车", 15000)[1] == []
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from app import crud, models, schemas
+
+
+def _seed_memos(db, count):
+    for i in range(count):
+        memo = crud.create_memo(db, schemas.MemoCreate(
+            title=f"Memo {i}",
+            content="content",
+            subtasks=[schemas.SubTaskCreate(content=f"Step {j}") for j in range(3)],
+        ))
+        for st in memo.subtasks:
+            crud.create_subtask_attachment(db, schemas.SubtaskAttachmentCreate(
+                filename="a.txt", file_path="uploads/a.txt", file_size=1, content_type="text/plain"
+            ), st.id)
+    db.expunge_all()
+
+
+def _seed_consumables(db, count):
+    for i in range(count):
+        c = crud.create_consumable(db, schemas.ConsumableCreate(name=f"Filter {i}"))
+        for days in (30, 10):
+            crud.replace_consumable(db, c.id, datetime.now() - timedelta(days=days))
+    db.expunge_all()
+
+
+def _walk_memos(memos):
+    for memo in memos:
+        for st in memo.subtasks:
+            list(st.attachments)
+
+
+def test_memo_page_query_count_is_constant(db, query_counter):
+    _seed_memos(db, 30)
+
+    counts = []
+    for limit in (5, 30):
+        db.expunge_all()
+        query_counter.clear()
+        _walk_memos(crud.get_memos(db, limit=limit))
+        counts.append(len(query_counter))
+
+    # memos + subtasks + attachments
+    assert counts == [3, 3]
+
+
+def test_memo_subtasks_ordered_in_sql(db):
+    memo_id = crud.create_memo(db, schemas.MemoCreate(
+        title="Ordered",
+        content="",
+        subtasks=[schemas.SubTaskCreate(content=c) for c in ("a", "b", "c")],
+    )).id
+    db.query(models.SubTask).filter(models.SubTask.content == "a").update({"order": 5000})
+    db.commit()
+    db.expunge_all()
+
+    memo = crud.get_memo(db, memo_id, eager=True)
+    assert [st.content for st in memo.subtasks] == ["b", "c", "a"]
+
+
+def test_consumable_page_query_count_is_constant(db, query_counter):
+    _seed_consumables(db, 20)
+
+    counts = []
+    for limit in (3, 20):
+        db.expunge_all()
+        query_counter.clear()
+        for c in crud.get_consumables(db, limit=limit):
+            assert c.latest_logs[0].replaced_at > c.latest_logs[1].replaced_at
+            assert c.stats.log_count == 2
+        counts.append(len(query_counter))
+
+    # consumables + stats + latest logs
+    assert counts == [3, 3]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.pagination import InvalidCursor
+
+
+def _collect(fetch, limit):
+    items, cursor = fetch(cursor="", limit=limit)
+    pages = [items]
+    while cursor:
+        items, cursor = fetch(cursor=cursor, limit=limit)
+        pages.append(items)
+    return [x.id for page in pages for x in page]
+
+
+def test_memo_cursor_pages_match_offset_order(db):
+    base = datetime(2026, 1, 1)
+    for i in range(23):
+        # Duplicate deadlines and a run of NULLs exercise the id tiebreaker
+        deadline = None if i % 4 == 0 else base + timedelta(days=i % 5)
+        crud.create_memo(db, schemas.MemoCreate(title=f"m{i}", content="", deadline=deadline))
+
+    expected = [m.id for m in crud.get_memos(db, limit=1000)]
+    got = _collect(lambda **kw: crud.get_memos_page(db, **kw), limit=4)
+    assert got == expected
+
+
+def test_memo_cursor_respects_category(db):
+    for i in range(6):
+        crud.create_memo(db, schemas.MemoCreate(title=f"m{i}", content="", category="work" if i % 2 else "life"))
+
+    got = _collect(lambda **kw: crud.get_memos_page(db, category="life", **kw), limit=2)
+    assert got == [m.id for m in crud.get_memos(db, category="life")]
+
+
+def test_consumable_cursor_pages_match_offset_order(db):
+    for i, status in enumerate(["已过期", "正常", "即将到期", "自定义", "正常", "已过期", "正常"]):
+        crud.create_consumable(db, schemas.ConsumableCreate(name=f"c{i}", status=status))
+
+    expected = [c.id for c in crud.get_consumables(db)]
+    got = _collect(lambda **kw: crud.get_consumables_page(db, **kw), limit=2)
+    assert got == expected
+
+
+def test_invalid_cursor(db):
+    with pytest.raises(InvalidCursor):
+        crud.get_memos_page(db, cursor="not-a-cursor")
+
+
+def _plans(db, fetch):
+    """EXPLAIN QUERY PLAN of every SELECT fetch() runs on the consumables or memos list."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "LIMIT" in statement:
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        fetch()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert statements
+    return [
+        " | ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params))
+        for sql, params in statements
+    ]
+
+
+def test_pages_are_range_seeks(db):
+    for i in range(6):
+        deadline = None if i % 2 else datetime(2026, 1, 1) + timedelta(days=i)
+        crud.create_memo(db, schemas.MemoCreate(title=f"m{i}", content="", category="work", deadline=deadline))
+        crud.create_consumable(db, schemas.ConsumableCreate(name=f"c{i}", status="正常"))
+
+    def memo_pages(**kw):
+        # First page, a page crossing into the NULL segment, a NULL-segment page
+        items, cursor = crud.get_memos_page(db, limit=2, **kw)
+        items, cursor = crud.get_memos_page(db, cursor=cursor, limit=2, **kw)
+        crud.get_memos_page(db, cursor=cursor, limit=2, **kw)
+
+    plans = _plans(db, memo_pages) + _plans(db, lambda: memo_pages(category="work"))
+    plans += _plans(db, lambda: crud.get_consumables_page(db, cursor=crud.get_consumables_page(db, limit=2)[1], limit=2))
+    for plan in plans:
+        assert "TEMP B-TREE" not in plan
+        assert "INDEX" in plan, plan
+
+
+def test_status_rank_follows_status_changes(db):
+    car = schemas.ConsumableCreate(name="tyre", category="车", mileage=0, lifespan_km=1000)
+    tyre = crud.create_consumable(db, car)
+    crud.create_consumable(db, schemas.ConsumableCreate(name="filter", status="即将到期"))
+    assert tyre.status_rank == 1
+
+    crud.record_mileage(db, "车", 1200)
+    db.refresh(tyre)
+    assert (tyre.status, tyre.status_rank) == ("已过期", 3)
+    assert [c.name for c in crud.get_consumables_page(db)[0]] == ["filter", "tyre"]
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, schemas
+
+
+def _memo(db, n):
+    return crud.create_memo(db, schemas.MemoCreate(
+        title="t", content="", subtasks=[schemas.SubTaskCreate(content=str(i)) for i in range(n)]
+    ))
+
+
+def test_memo_completes_when_all_subtasks_done(db):
+    memo = _memo(db, 3)
+    memo_id = memo.id
+    ids = [st.id for st in memo.subtasks]
+
+    for st_id in ids[:-1]:
+        crud.update_subtask_status(db, st_id, True)
+    assert crud.get_memo(db, memo_id).completed_at is None
+
+    last = crud.update_subtask_status(db, ids[-1], True)
+    db.expire_all()
+    assert crud.get_memo(db, memo_id).completed_at == last.completed_at
+
+    crud.update_subtask_status(db, ids[0], False)
+    db.expire_all()
+    assert crud.get_memo(db, memo_id).completed_at is None
+
+
+def test_update_subtask_uses_latest_completion_time(db):
+    memo = _memo(db, 2)
+    memo_id = memo.id
+    a, b = [st.id for st in memo.subtasks]
+
+    crud.update_subtask(db, a, schemas.SubTaskUpdate(is_completed=True, completed_at=datetime(2026, 3, 1, 9, 0)))
+    crud.update_subtask(db, b, schemas.SubTaskUpdate(is_completed=True, completed_at=datetime(2026, 3, 2, 9, 0)))
+    db.expire_all()
+    assert crud.get_memo(db, memo_id).completed_at == datetime(2026, 3, 2, 9, 0)
+
+
+def test_toggle_commits_once_without_loading_siblings(db, engine, query_counter):
+    memo = _memo(db, 200)
+    subtask_id = memo.subtasks[0].id
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    query_counter.clear()
+
+    crud.update_subtask_status(db, subtask_id, True)
+
+    assert len(commits) == 1
+    # subtask lookup, subtask UPDATE, aggregate, refresh
+    assert len(query_counter) == 4
+    assert crud.get_memo(db, memo.id).completed_at is None
+
+
+def test_batch_update_applies_changes_and_syncs_once(db, engine):
+    memo = _memo(db, 4)
+    memo_id = memo.id
+    ids = [st.id for st in memo.subtasks]
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    changes = [schemas.SubTaskBatchItem(id=i, is_completed=True) for i in ids[1:]]
+    changes.append(schemas.SubTaskBatchItem(id=ids[0], is_completed=True, content="renamed", order=99999))
+    updated = crud.batch_update_subtasks(db, memo_id, changes)
+
+    assert len(commits) == 1
+    assert [st.id for st in updated.subtasks] == ids[1:] + ids[:1]
+    assert updated.subtasks[-1].content == "renamed"
+    assert all(st.is_completed and st.completed_at for st in updated.subtasks)
+    assert updated.completed_at is not None
+
+
+def test_batch_update_rejects_foreign_subtasks(db):
+    mine = _memo(db, 1)
+    other = _memo(db, 1)
+    with pytest.raises(ValueError):
+        crud.batch_update_subtasks(db, mine.id, [schemas.SubTaskBatchItem(id=other.subtasks[0].id, is_completed=True)])
+    assert crud.batch_update_subtasks(db, 9999, []) is None
@@ -0,0 +1,40 @@
+def test_server_timing_counts_queries(client):
+    response = client.post("/memos/", json={"title": "m", "content": "", "subtasks": [{"content": "a"}]})
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    queries = int(timing.split('desc="')[1].split(" ")[0])
+    assert queries > 0
+
+
+def test_metrics_exposition_uses_route_templates(client):
+    memo_id = client.post("/memos/", json={"title": "m", "content": ""}).json()["id"]
+    client.get(f"/memos/{memo_id}")
+    client.get("/no-such-page")
+
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/memos/{memo_id}",status="200"} 1' in text
+    assert 'route="unmatched",status="404"' in text
+    assert f"/memos/{memo_id}\"" not in text
+    assert "# TYPE db_queries_per_request histogram" in text
+    assert "cache_misses_total" in text
+
+
+def test_repeated_statement_is_flagged():
+    from app import metrics
+    stats = metrics.RequestStats()
+    for _ in range(metrics.N_PLUS_ONE_THRESHOLD + 1):
+        stats.statements["SELECT * FROM subtasks WHERE memo_id = ?"] += 1
+    stats.statements["SELECT * FROM memos"] += 1
+    assert [sql for sql, _ in stats.repeated_statements()] == ["SELECT * FROM subtasks WHERE memo_id = ?"]
+
+
+def test_profile_requires_opt_in(client, monkeypatch):
+    from app import metrics
+    response = client.get("/memos/?profile=1")
+    assert response.headers["content-type"].startswith("application/json")
+
+    monkeypatch.setattr(metrics, "PROFILING_ENABLED", True)
+    response = client.get("/memos/", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
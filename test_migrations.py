@@ -0,0 +1,93 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations, models
+
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE memos (id INTEGER PRIMARY KEY, title VARCHAR(255), content TEXT, created_at DATETIME, "
+    "updated_at DATETIME, completed_at DATETIME, deadline DATETIME)",
+    "CREATE TABLE subtasks (id INTEGER PRIMARY KEY, content VARCHAR(255), is_completed BOOLEAN, "
+    "memo_id INTEGER REFERENCES memos(id))",
+    "CREATE TABLE consumables (id INTEGER PRIMARY KEY, name VARCHAR(255), tag VARCHAR(50), category VARCHAR(50), "
+    "model_spec VARCHAR(255), status VARCHAR(50), last_replaced DATETIME, lifespan INTEGER, expiry_date DATETIME, "
+    "mileage INTEGER, created_at DATETIME, updated_at DATETIME)",
+    "INSERT INTO memos (id, title, content) VALUES (1, '旧备忘', '')",
+    "INSERT INTO subtasks (id, content, is_completed, memo_id) VALUES (1, 'step', 0, 1)",
+]
+
+
+def _legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for sql in LEGACY_SCHEMA:
+            conn.execute(text(sql))
+        for i, mileage in enumerate([None, 1000, 2000, 3000, 4000], start=1):
+            conn.execute(text("INSERT INTO consumables (id, name, mileage) VALUES (:id, 'part', :m)"), {"id": i, "m": mileage})
+    return engine
+
+
+def _columns(engine, table):
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_upgrades_legacy_database_in_batches(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    done = migrations.migrate(engine, batch_size=2, log=lambda msg: None)
+    assert done == [m[0] for m in migrations.MIGRATIONS]
+
+    assert {"category", "note", "order", "start_time", "created_at", "completed_at"} <= (
+        _columns(engine, "memos") | _columns(engine, "subtasks")
+    )
+    assert "ix_subtasks_memo_id" in {ix["name"] for ix in inspect(engine).get_indexes("subtasks")}
+    with engine.connect() as conn:
+        mileage = conn.execute(text("SELECT id, current_mileage FROM consumables ORDER BY id")).all()
+        assert [m for _, m in mileage] == [0, 1000, 2000, 3000, 4000]
+        assert conn.execute(text("SELECT COUNT(*) FROM search_fts")).scalar() == 2  # memo + subtask
+
+    assert migrations.is_up_to_date(engine)
+    assert migrations.migrate(engine, log=lambda msg: None) == []
+
+
+def test_dry_run_changes_nothing(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    lines = []
+    done = migrations.migrate(engine, dry_run=True, log=lines.append)
+
+    assert done == [m[0] for m in migrations.MIGRATIONS]
+    assert any("would run: ALTER TABLE subtasks ADD COLUMN note" in line for line in lines)
+    assert "note" not in _columns(engine, "subtasks")
+    assert not inspect(engine).has_table("schema_version")
+
+
+def test_fresh_database_needs_no_ddl(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    lines = []
+    migrations.migrate(engine, log=lines.append)
+    assert not [line for line in lines if line.startswith("  ")]
+    assert migrations.applied_versions(engine) == {m[0] for m in migrations.MIGRATIONS}
+
+
+def test_dense_order_rescale_is_batched_and_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    rows = [(1, 1, 0), (2, 1, 1), (3, 1, 2), (4, 2, 0), (5, 2, 1), (6, 3, 1024), (7, 3, 512),
+            # All 0, as the old column default left them
+            (10, 4, 0), (8, 4, 0), (9, 4, 0)]
+    with engine.begin() as conn:
+        for memo_id in (1, 2, 3, 4):
+            conn.execute(text("INSERT INTO memos (id, title, content) VALUES (:id, 'm', '')"), {"id": memo_id})
+        for id_, memo_id, order in rows:
+            conn.execute(text('INSERT INTO subtasks (id, content, memo_id, "order") VALUES (:id, :c, :m, :o)'),
+                         {"id": id_, "c": str(id_), "m": memo_id, "o": order})
+
+    ctx = migrations.MigrationContext(engine, batch_size=1, log=lambda msg: None)
+    migrations._rescale_dense_orders(ctx, "subtasks", "memo_id")
+    migrations._rescale_dense_orders(ctx, "subtasks", "memo_id")
+
+    with engine.connect() as conn:
+        orders = dict(conn.execute(text('SELECT id, "order" FROM subtasks')).all())
+    step = migrations.ORDER_STEP
+    assert orders == {1: step, 2: 2 * step, 3: 3 * step, 4: step, 5: 2 * step, 6: 1024, 7: 512,
+                      8: step, 9: 2 * step, 10: 3 * step}
+    assert all("batch_lo" in sql for sql in ctx.statements)
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from app import crud, schemas
+from app.cache import FakeRedis, LRUBackend, RedisBackend, cache
+from app.serializers import loads
+
+
+@pytest.fixture(params=["lru", "fakeredis"])
+def payload_cache(request):
+    backend = LRUBackend() if request.param == "lru" else RedisBackend(FakeRedis())
+    previous = cache.backend
+    cache.configure(backend)
+    yield cache
+    cache.configure(previous)
+
+
+def test_get_or_set_counts_hits_and_misses(payload_cache):
+    calls = []
+    loader = lambda: calls.append(1) or {"id": 1}
+
+    assert loads(payload_cache.get_or_set("memo:1", loader)) == {"id": 1}
+    assert loads(payload_cache.get_or_set("memo:1", loader)) == {"id": 1}
+    assert len(calls) == 1
+    assert payload_cache.stats()["hits"] == 1
+    assert payload_cache.stats()["misses"] == 1
+
+
+def test_missing_payload_is_not_cached(payload_cache):
+    assert payload_cache.get_or_set("memo:404", lambda: None) is None
+    assert loads(payload_cache.get_or_set("memo:404", lambda: {"id": 404})) == {"id": 404}
+
+
+def test_memo_writers_invalidate(payload_cache, db):
+    memo = crud.create_memo(db, schemas.MemoCreate(
+        title="t", content="", subtasks=[schemas.SubTaskCreate(content="a")]
+    ))
+    subtask_id = memo.subtasks[0].id
+    list_key = payload_cache.memo_list_key(skip=0, limit=100, category=None)
+    payload_cache.get_or_set(payload_cache.memo_key(memo.id), lambda: {"v": 1})
+    payload_cache.get_or_set(list_key, lambda: [{"v": 1}])
+
+    crud.update_subtask_status(db, subtask_id, True)
+
+    assert payload_cache.backend.get(payload_cache.memo_key(memo.id)) is None
+    assert payload_cache.memo_list_key(skip=0, limit=100, category=None) != list_key
+
+
+def test_consumable_writers_invalidate_lists(payload_cache, db):
+    key = payload_cache.consumable_list_key(skip=0, limit=100)
+    crud.create_consumable(db, schemas.ConsumableCreate(name="filter"))
+    assert payload_cache.consumable_list_key(skip=0, limit=100) != key
+
+
+def test_lru_ttl_and_eviction():
+    backend = LRUBackend(max_entries=2)
+    backend.set("a", "1", ttl=0.01)
+    backend.set("b", "2")
+    backend.set("c", "3")
+    assert backend.get("a") is None
+    time.sleep(0.02)
+    backend.set("d", "4", ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("d") is None
+    assert backend.get("c") == "3"
+
+
+def test_load_racing_a_write_is_not_served(payload_cache):
+    # The reader builds its key, then a write commits and invalidates while
+    # it is still loading the old row
+    key = payload_cache.memo_key(7)
+
+    def stale_loader():
+        payload_cache.invalidate_memo(7)
+        return {"v": "old"}
+
+    payload_cache.get_or_set(key, stale_loader)
+    assert loads(payload_cache.get_or_set(payload_cache.memo_key(7), lambda: {"v": "new"})) == {"v": "new"}
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+from sqlalchemy import exc, text
+
+from app.database import create_db_engine
+from app.pool import InstrumentedQueuePool, pool_status
+
+
+@pytest.fixture
+def small_engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0, pool_timeout=0.2)
+    yield engine
+    engine.dispose()
+
+
+def test_status_reports_configuration_and_checkouts(small_engine):
+    assert isinstance(small_engine.pool, InstrumentedQueuePool)
+    with small_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        status = pool_status(small_engine)
+        assert status["size"] == 1 and status["max_overflow"] == 0
+        assert status["checked_out"] == 1
+
+    status = pool_status(small_engine)
+    assert status["checked_out"] == 0 and status["checked_in"] == 1
+    assert status["checkouts"] == 1 and status["connects"] == 1 and status["timeouts"] == 0
+
+
+def test_exhausted_pool_counts_timeouts_and_waits(small_engine):
+    conn = small_engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        small_engine.connect()
+    assert pool_status(small_engine)["timeouts"] == 1
+
+    # A checkout that has to wait for another thread to return the connection
+    threading.Timer(0.02, conn.close).start()
+    with small_engine.connect():
+        pass
+    status = pool_status(small_engine)
+    assert status["checkouts"] == 2
+    assert status["wait_seconds_max"] >= 0.015
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from app import previews, storage
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield
+    previews.shutdown()
+
+
+def test_image_thumbnail_in_background():
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (2000, 1000), "red").save("photo.png")
+
+    future = previews.schedule_preview("photo.png", "image/png")
+    assert future.result(timeout=30) == storage.preview_path("photo.png")
+
+    with Image.open(storage.preview_path("photo.png")) as thumb:
+        assert max(thumb.size) == previews.PREVIEW_MAX_SIZE
+    # Already generated: nothing is queued
+    assert previews.schedule_preview("photo.png", "image/png") is None
+
+
+def test_pdf_first_page_preview():
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    doc.new_page()
+    doc.save("doc.pdf")
+
+    assert previews.generate_preview("doc.pdf", "application/pdf") == "doc.preview.jpg"
+    assert os.path.getsize("doc.preview.jpg") > 0
+
+
+def test_unpreviewable_types_are_skipped():
+    assert not previews.is_previewable("text/plain")
+    assert previews.schedule_preview("notes.txt", "text/plain") is None
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import consumable_status, crud, models, scheduler, schemas
+
+
+@pytest.fixture
+def app_db(monkeypatch, engine, db):
+    from app import database
+    monkeypatch.setattr(database, "_engine", engine)
+    return db
+
+
+@pytest.fixture
+def events(monkeypatch):
+    received = []
+    monkeypatch.setattr(scheduler, "_hooks", scheduler.defaultdict(list))
+    for name in ("consumable.due_soon", "consumable.overdue", "memo.overdue"):
+        scheduler.on(name)(lambda ids, name=name: received.append((name, ids)))
+    return received
+
+
+def test_ticks_sweep_only_the_new_window(app_db, events):
+    now = datetime.now()
+    soon = crud.create_consumable(app_db, schemas.ConsumableCreate(
+        name="filter", last_replaced=now - timedelta(days=20), lifespan=30))
+    memo = crud.create_memo(app_db, schemas.MemoCreate(title="m", content="", deadline=now + timedelta(hours=1)))
+    crud.create_memo(app_db, schemas.MemoCreate(title="old", content="", deadline=now - timedelta(days=1)))
+
+    # First tick only sets each job's starting point
+    assert scheduler.run_tick(now) == []
+
+    later = now + timedelta(days=4)
+    scheduler.run_tick(later)
+    assert events == [("consumable.due_soon", [soon.id]), ("memo.overdue", [memo.id])]
+
+    # Rerunning a window that already ended is a no-op
+    assert scheduler.run_tick(later) == []
+    assert app_db.get(models.SchedulerState, "memo_deadlines").last_run_at == later
+
+
+def test_failed_job_reruns_its_window(app_db, events, monkeypatch):
+    now = datetime.now()
+    consumable = crud.create_consumable(app_db, schemas.ConsumableCreate(
+        name="c", last_replaced=now - timedelta(days=29), lifespan=30))
+    scheduler.run_tick(now)
+
+    sweep = consumable_status.sweep
+    monkeypatch.setattr(consumable_status, "sweep", lambda *args, **kw: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        scheduler.run_tick(now + timedelta(days=2))
+    monkeypatch.setattr(consumable_status, "sweep", sweep)
+
+    # The failed window was not recorded, so the next tick covers it
+    scheduler.run_tick(now + timedelta(days=3))
+    assert events == [("consumable.overdue", [consumable.id])]
+    app_db.expire_all()
+    assert crud.get_consumable(app_db, consumable.id).status == consumable_status.STATUS_OVERDUE
+
+
+def test_single_leader(tmp_path):
+    path = str(tmp_path / "lock")
+    first, second = scheduler.LeaderLock(path), scheduler.LeaderLock(path)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_stop_waits_for_running_tick(monkeypatch, tmp_path):
+    started, finished = threading.Event(), []
+
+    def slow_tick():
+        started.set()
+        time.sleep(0.2)
+        finished.append(True)
+
+    monkeypatch.setattr(scheduler, "run_tick", slow_tick)
+
+    async def main():
+        s = scheduler.Scheduler(interval=60, lock_path=str(tmp_path / "lock"))
+        s.start()
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        await s.stop()
+        return finished
+
+    assert asyncio.run(main()) == [True]
@@ -0,0 +1,90 @@
+from sqlalchemy import event
+
+from app import crud, schemas, search
+from app.transfer import export_ndjson, import_ndjson
+
+
+def _memo(db, title, content="", subtasks=()):
+    return crud.create_memo(db, schemas.MemoCreate(
+        title=title, content=content, subtasks=[schemas.SubTaskCreate(**st) for st in subtasks]
+    ))
+
+
+def test_bigrams_match_chinese_substrings(db):
+    memo = _memo(db, "周末购物清单", "去超市买菜", [{"content": "买牛奶", "note": "记得带购物袋"}])
+    _memo(db, "工作周报", "整理本周进展")
+
+    hits = search.search(db, "购物")
+    assert {(h["type"], h["memo_id"]) for h in hits} == {("memo", memo.id), ("note", memo.id)}
+    assert hits[0]["type"] == "memo"  # title matches rank above notes
+    assert hits[0]["title"] == "周末<mark>购物</mark>清单"
+    note = next(h for h in hits if h["type"] == "note")
+    assert note["subtask_id"] == memo.subtasks[0].id
+    assert note["snippet"] == "记得带<mark>购物</mark>袋"
+
+    assert [h["type"] for h in search.search(db, "牛奶")] == ["subtask"]
+    assert search.search(db, "牛奶 超市") == []  # terms are ANDed per document
+    assert search.search(db, "  ") == []
+
+
+def test_writers_keep_index_in_sync(db):
+    memo = _memo(db, "Garden", "", [{"content": "water plants"}])
+    st = memo.subtasks[0]
+
+    crud.update_subtask(db, st.id, schemas.SubTaskUpdate(content="prune roses"))
+    assert search.search(db, "water") == []
+    assert [h["subtask_id"] for h in search.search(db, "roses")] == [st.id]
+
+    crud.batch_update_subtasks(db, memo.id, [schemas.SubTaskBatchItem(id=st.id, note="use gloves")])
+    assert [h["type"] for h in search.search(db, "gloves")] == ["note"]
+
+    crud.update_memo(db, memo.id, schemas.MemoUpdate(title="Backyard", subtasks=[]))
+    assert search.search(db, "garden") == []
+    assert search.search(db, "roses") == []
+    assert [h["type"] for h in search.search(db, "backyard")] == ["memo"]
+
+    crud.delete_memo(db, memo.id)
+    assert search.search(db, "backyard") == []
+
+
+def test_update_memo_reindexes_only_edited_subtasks(db, engine):
+    memo = _memo(db, "Trip", "", [{"content": f"item {i}"} for i in range(20)])
+    ids = [st.id for st in memo.subtasks]
+    edited = [schemas.SubTaskCreate(id=st_id, content=f"item {i}") for i, st_id in enumerate(ids)]
+    edited[3] = schemas.SubTaskCreate(id=ids[3], content="passport")
+    edited.append(schemas.SubTaskCreate(content="sunscreen"))
+
+    indexed = []
+
+    def count_docs(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO search_fts"):
+            indexed.extend(parameters if executemany else [parameters])
+
+    event.listen(engine, "before_cursor_execute", count_docs)
+    try:
+        crud.update_memo(db, memo.id, schemas.MemoUpdate(subtasks=edited))
+    finally:
+        event.remove(engine, "before_cursor_execute", count_docs)
+
+    assert len(indexed) == 2  # the edited and the new subtask, not all 22 documents
+    assert [h["subtask_id"] for h in search.search(db, "passport")] == [ids[3]]
+    assert len(search.search(db, "sunscreen")) == 1
+    assert search.search(db, "item 3") == []
+    assert len(search.search(db, "item")) == 19
+
+
+def test_snippet_window_and_escaping():
+    text = "x" * 100 + "<b>needle</b>" + "y" * 100
+    snippet = search.highlight(text, ["needle"], 30)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "&lt;b&gt;<mark>needle</mark>&lt;/b&gt;" in snippet
+
+
+def test_import_and_rebuild_index(db):
+    _memo(db, "Tax return", "", [{"content": "collect receipts"}])
+    lines = list(export_ndjson(db))
+    import_ndjson(db, lines)
+    assert len(search.search(db, "receipts")) == 2
+
+    assert search.rebuild(db) == 2
+    assert len(search.search(db, "tax")) == 2
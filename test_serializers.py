@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta, timezone
+
+from app.serializers import dumps, loads, to_cn_time
+
+
+def test_to_cn_time_matches_strftime():
+    naive = datetime(2026, 3, 5, 7, 9, 59)
+    aware = datetime(2026, 3, 4, 23, 9, tzinfo=timezone.utc)
+
+    assert to_cn_time(None) is None
+    assert to_cn_time(naive) == naive.strftime("%Y-%m-%d %H:%M")
+    assert to_cn_time(aware) == aware.astimezone(timezone(timedelta(hours=8))).strftime("%Y-%m-%d %H:%M")
+    assert to_cn_time(aware) == "2026-03-05 07:09"
+
+
+def test_dumps_keeps_unicode_and_roundtrips():
+    payload = [{"title": "备忘", "order": 1024.0, "done": True, "note": None}]
+    raw = dumps(payload)
+    assert isinstance(raw, bytes)
+    assert "备忘".encode() in raw
+    assert loads(raw) == payload
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.database import create_db_engine
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'notebook.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_pragmas_applied_per_connection(file_db):
+    pragma = lambda name: file_db.execute(text(f"PRAGMA {name}")).scalar()
+    assert pragma("journal_mode") == "wal"
+    assert pragma("synchronous") == 1  # NORMAL
+    assert pragma("foreign_keys") == 1
+    assert pragma("busy_timeout") == 5000
+
+
+def test_foreign_keys_enforced(file_db):
+    file_db.add(models.SubTask(content="orphan", memo_id=12345))
+    with pytest.raises(IntegrityError):
+        file_db.commit()
+
+
+def test_list_ordering_queries(file_db):
+    for title, deadline in [("none", None), ("late", datetime(2026, 6, 1)), ("early", datetime(2026, 1, 1))]:
+        crud.create_memo(file_db, schemas.MemoCreate(title=title, content="", deadline=deadline))
+    assert [m.title for m in crud.get_memos(file_db)] == ["early", "late", "none"]
+
+    for name, status in [("a", "正常"), ("b", "已过期"), ("c", "即将到期")]:
+        crud.create_consumable(file_db, schemas.ConsumableCreate(name=name, status=status))
+    assert [c.name for c in crud.get_consumables(file_db)] == ["a", "c", "b"]
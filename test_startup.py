@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+BACKEND = os.path.join(os.path.dirname(__file__), "backend")
+
+
+def test_import_opens_no_connection(tmp_path):
+    # A fresh interpreter, so nothing else has touched the engine yet
+    code = (
+        "import app.main\n"
+        "from app import database\n"
+        "assert database._engine is None, 'engine created at import'\n"
+    )
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'never.db'}")
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env, check=True)
+    assert not (tmp_path / "never.db").exists()
+
+
+def test_lifespan_creates_schema(app_engine):
+    from app import main
+    with TestClient(main.app) as client:
+        assert client.get("/memos/").json() == []
+    assert inspect(app_engine).has_table("memos")
+    assert os.path.isdir("uploads")
+
+
+def test_verify_mode_refuses_unmigrated_database(app_engine, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "SCHEMA_CHECK", "verify")
+    with pytest.raises(RuntimeError, match="migrate.py"):
+        with TestClient(main.app):
+            pass
+
+    from app import migrations
+    migrations.migrate(app_engine, log=lambda msg: None)
+    with TestClient(main.app) as client:
+        assert client.get("/memos/").status_code == 200
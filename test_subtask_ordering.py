@@ -0,0 +1,80 @@
+import pytest
+
+from app import crud, schemas
+from app.ordering import plan_keys
+
+
+def _memo(db, n):
+    return crud.create_memo(db, schemas.MemoCreate(
+        title="t", content="", subtasks=[schemas.SubTaskCreate(content=str(i)) for i in range(n)]
+    ))
+
+
+def _contents(db, memo_id):
+    db.expire_all()
+    return [st.content for st in crud.get_memo(db, memo_id).subtasks]
+
+
+def test_plan_keys_keeps_items_already_in_order():
+    assert plan_keys([1024.0, 3072.0, 2048.0]) == [1024.0, 1536.0, 2048.0]
+    assert plan_keys([None, None]) == [1024.0, 2048.0]
+
+
+def test_move_writes_one_row(db, query_counter):
+    memo = _memo(db, 10)
+    ids = [st.id for st in memo.subtasks]
+    query_counter.clear()
+
+    _, dense = crud.move_subtask(db, ids[8], after_id=ids[1])
+
+    updates = [s for s in query_counter if s.startswith("UPDATE")]
+    assert len(updates) == 1
+    assert not dense
+    assert _contents(db, memo.id) == ["0", "1", "8", "2", "3", "4", "5", "6", "7", "9"]
+
+
+def test_move_to_front_and_between(db):
+    memo = _memo(db, 3)
+    a, b, c = [st.id for st in memo.subtasks]
+
+    crud.move_subtask(db, c, before_id=a)
+    assert _contents(db, memo.id) == ["2", "0", "1"]
+    crud.move_subtask(db, c, after_id=a, before_id=b)
+    assert _contents(db, memo.id) == ["0", "2", "1"]
+
+    with pytest.raises(ValueError):
+        crud.move_subtask(db, c, after_id=b, before_id=a)
+    assert crud.move_subtask(db, 9999, after_id=a) is None
+
+
+def test_dense_moves_request_rebalance(db):
+    memo = _memo(db, 3)
+    a, b, c = [st.id for st in memo.subtasks]
+
+    dense = False
+    moving, anchor = c, a
+    for _ in range(40):
+        _, dense = crud.move_subtask(db, moving, after_id=anchor)
+        if dense:
+            break
+        moving, anchor = anchor, moving
+        crud.move_subtask(db, moving, after_id=anchor)
+    assert dense
+
+    before = _contents(db, memo.id)
+    assert crud.rebalance_subtask_order(db, memo.id) == 3
+    assert _contents(db, memo.id) == before
+    orders = [st.order for st in crud.get_memo(db, memo.id).subtasks]
+    assert orders == [1024.0, 2048.0, 3072.0]
+
+
+def test_update_memo_move_touches_one_row(db, query_counter):
+    memo = _memo(db, 20)
+    payload = [schemas.SubTaskCreate(id=st.id, content=st.content, created_at=st.created_at) for st in memo.subtasks]
+    payload.insert(2, payload.pop(15))
+    query_counter.clear()
+
+    memo = crud.update_memo(db, memo.id, schemas.MemoUpdate(subtasks=payload))
+
+    assert len([s for s in query_counter if s.startswith("UPDATE")]) == 1
+    assert [st.content for st in memo.subtasks][:4] == ["0", "1", "15", "2"]
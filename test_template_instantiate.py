@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from app import crud, models, recurrence, schemas
+
+
+@pytest.fixture
+def template(db):
+    return crud.create_template(db, schemas.TemplateCreate(
+        title="Weekly check", content="body", category="life",
+        subtasks=[schemas.TemplateSubTaskCreate(content=c) for c in ("tyres", "oil", "lights")],
+    ))
+
+
+def test_single_instance(db, template):
+    [memo] = crud.instantiate_template(db, template.id, schemas.TemplateInstantiate(deadline=datetime(2026, 5, 1)))
+    assert (memo.title, memo.content, memo.category, memo.deadline) == ("Weekly check", "body", "life", datetime(2026, 5, 1))
+    assert [st.content for st in memo.subtasks] == ["tyres", "oil", "lights"]
+    assert not any(st.is_completed for st in memo.subtasks)
+
+
+def test_weekly_instances_copy_subtasks_in_one_statement(db, template, query_counter):
+    query_counter.clear()
+    memos = crud.instantiate_template(db, template.id, schemas.TemplateInstantiate(
+        recurrence="weekly", start=datetime(2026, 1, 5), count=52,
+    ))
+    assert len(memos) == 52
+    assert memos[1].title == "Weekly check 2026-01-12"
+    assert memos[-1].deadline == datetime(2026, 12, 28)
+    assert db.query(models.SubTask).count() == 52 * 3
+    assert sum(s.lstrip().upper().startswith("INSERT INTO SUBTASKS") for s in query_counter) == 1
+
+
+def test_bad_requests(db, template):
+    assert crud.instantiate_template(db, 999, schemas.TemplateInstantiate()) is None
+    with pytest.raises(ValueError):
+        crud.instantiate_template(db, template.id, schemas.TemplateInstantiate(recurrence="hourly", count=2))
+    with pytest.raises(ValueError):
+        crud.instantiate_template(db, template.id, schemas.TemplateInstantiate(
+            recurrence="daily", start=datetime(2026, 1, 1), until=datetime(2028, 1, 1),
+        ))
+    assert db.query(models.Memo).count() == 0
+
+
+def test_monthly_clamps_to_month_end():
+    dates = recurrence.occurrences("monthly", datetime(2026, 1, 31), until=datetime(2026, 4, 30))
+    assert [d.day for d in dates] == [31, 28, 31, 30]
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import database, models, transfer
+from app.transfer import InvalidImport, export_ndjson, import_ndjson
+from app.serializers import dumps, loads
+
+
+def _seed(db):
+    memo = models.Memo(title="备忘", content="c", category="work", deadline=datetime(2026, 5, 1, 10))
+    memo.subtasks = [
+        models.SubTask(content="a", order=1024.0, completed_at=datetime(2026, 4, 1, 8)),
+        models.SubTask(content="b", order=2048.0),
+    ]
+    memo.subtasks[0].attachments = [
+        models.SubtaskAttachment(filename="f.txt", file_path="uploads/blobs/x.txt", sha256="ab" * 32)
+    ]
+    consumable = models.Consumable(name="filter")
+    consumable.logs = [models.ConsumableLog(replaced_at=datetime(2026, 1, 1))]
+    db.add_all([memo, consumable, models.AttachmentBlob(sha256="ab" * 32, file_path="uploads/blobs/x.txt", file_size=3, ref_count=1)])
+    db.commit()
+
+
+def test_export_import_roundtrip_remaps_ids(db):
+    _seed(db)
+    lines = list(export_ndjson(db))
+    assert loads(lines[0])["type"] == "header"
+    assert [loads(l)["type"] for l in lines[1:]] == ["memo", "consumable"]
+
+    counts = import_ndjson(db, lines, batch_size=2)
+    assert counts["memos"] == 1 and counts["subtasks"] == 2 and counts["consumable_logs"] == 1
+
+    db.expire_all()
+    copy = db.query(models.Memo).order_by(models.Memo.id.desc()).first()
+    assert copy.id == 2
+    assert [st.content for st in copy.subtasks] == ["a", "b"]
+    assert copy.subtasks[0].completed_at == datetime(2026, 4, 1, 8)
+    assert copy.subtasks[0].attachments[0].filename == "f.txt"
+    assert db.query(models.ConsumableLog).filter_by(consumable_id=2).count() == 1
+    assert db.get(models.AttachmentBlob, "ab" * 32).ref_count == 2
+
+
+def test_import_rolls_back_on_bad_line(db):
+    lines = [
+        b'{"type": "memo", "title": "ok", "subtasks": []}\n',
+        b'{"type": "memo", "title": "bad", "deadline": "not a date"}\n',
+    ]
+    with pytest.raises(InvalidImport, match="Line 2"):
+        import_ndjson(db, lines, batch_size=1)
+    assert db.query(models.Memo).count() == 0
+
+
+def test_export_pages_past_one_batch(db, monkeypatch):
+    monkeypatch.setattr(transfer, "EXPORT_BATCH_SIZE", 2)
+    for i in range(5):
+        memo = models.Memo(title=f"m{i}", content="")
+        memo.subtasks = [models.SubTask(content=f"s{i}", order=1024.0)]
+        db.add(memo)
+    db.commit()
+
+    records = [loads(line) for line in export_ndjson(db)][1:]
+
+    assert [r["title"] for r in records] == [f"m{i}" for i in range(5)]
+    assert [r["subtasks"][0]["content"] for r in records] == [f"s{i}" for i in range(5)]
+
+
+def test_import_creates_missing_blob_rows(db):
+    att = {"filename": "f.txt", "file_path": "uploads/blobs/y.txt", "file_size": 4, "sha256": "cd" * 32}
+    record = {"type": "memo", "title": "m", "subtasks": [{"content": "a", "attachments": [att, att]}]}
+
+    import_ndjson(db, [dumps(record)])
+
+    blob = db.get(models.AttachmentBlob, "cd" * 32)
+    assert (blob.file_path, blob.file_size, blob.ref_count) == ("uploads/blobs/y.txt", 4, 2)
+
+
+def test_import_holds_off_concurrent_inserts(tmp_path, monkeypatch):
+    monkeypatch.setitem(database.SQLITE_PRAGMAS, "busy_timeout", 0)
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'notebook.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    blocked = []
+
+    def lines():
+        yield dumps({"type": "memo", "title": "imported"})
+        # A write from another connection while the import is running
+        with Session(engine) as other:
+            other.add(models.Memo(title="concurrent", content=""))
+            try:
+                other.commit()
+            except OperationalError:
+                blocked.append(True)
+
+    with Session(engine) as db:
+        import_ndjson(db, lines())
+        assert blocked
+        assert [m.title for m in db.query(models.Memo)] == ["imported"]
+    engine.dispose()
@@ -0,0 +1,58 @@
+from app import crud, models, schemas
+
+
+def _payload(memo):
+    return [
+        schemas.SubTaskCreate(
+            id=st.id, content=st.content, note=st.note, is_completed=st.is_completed,
+            created_at=st.created_at, start_time=st.start_time, completed_at=st.completed_at,
+        )
+        for st in memo.subtasks
+    ]
+
+
+def _verbs(statements):
+    # Search index upkeep (search_fts) is covered in test_search.py
+    return [s.split(None, 1)[0].upper() for s in statements if "search_fts" not in s]
+
+
+def _memo(db, n):
+    return crud.create_memo(db, schemas.MemoCreate(
+        title="t", content="", subtasks=[schemas.SubTaskCreate(content=f"Item {i}") for i in range(n)]
+    ))
+
+
+def test_single_edit_emits_single_update(db, query_counter):
+    memo = _memo(db, 50)
+    payload = _payload(memo)
+    payload[10].content = "Edited"
+    query_counter.clear()
+
+    memo = crud.update_memo(db, memo.id, schemas.MemoUpdate(subtasks=payload))
+
+    assert _verbs(query_counter).count("UPDATE") == 1
+    assert "INSERT" not in _verbs(query_counter)
+    assert memo.subtasks[10].content == "Edited"
+
+
+def test_insert_delete_and_move(db, query_counter):
+    memo = _memo(db, 5)
+    first_id = memo.subtasks[0].id
+    crud.create_subtask_attachment(db, schemas.SubtaskAttachmentCreate(
+        filename="a.txt", file_path="uploads/a.txt", file_size=1, content_type="text/plain"
+    ), memo.subtasks[1].id)
+    memo = crud.get_memo(db, memo.id)
+    payload = _payload(memo)
+    # drop item 1, move item 0 to the end, add a new one in front
+    payload = [schemas.SubTaskCreate(content="New")] + payload[2:] + payload[:1]
+    query_counter.clear()
+
+    memo = crud.update_memo(db, memo.id, schemas.MemoUpdate(subtasks=payload))
+
+    verbs = _verbs(query_counter)
+    assert verbs.count("INSERT") == 1
+    assert verbs.count("DELETE") == 2  # attachments, subtasks
+    assert [st.content for st in memo.subtasks] == ["New", "Item 2", "Item 3", "Item 4", "Item 0"]
+    assert memo.subtasks[-1].id == first_id
+    assert memo.subtasks[0].created_at is not None
+    assert db.query(models.SubtaskAttachment).count() == 0